@@ -1,184 +1,601 @@
-from flask import Flask, render_template, request, jsonify, url_for
+# Record the import time and memory of every module for the start-up report (see startup_report.py)
+from startup_report import ImportProfiler
+startup_profiler = ImportProfiler()
+startup_profiler.install()
+
+from flask import Flask, Response, g, render_template, request, jsonify, stream_with_context, url_for
 import pickle
-import pandas as pd
+import hashlib
+import json
+import numpy as np
 import os
 import logging
 import random
-import graph  # Import the graph module
+import argparse
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from prediction_history import PredictionHistory
+from model_bundle import load_bundle
+from feature_encoder import FeatureEncoder, encoder_filename, numerical_features
+from prediction_cache import PredictionCache
+from telemetry import Telemetry, RequestTimer
+from serving import MicroBatcher, QueueFullError
+from load_rules import calculate_overload, suggest_vehicles
+from fleet_optimizer import parse_loads, parse_vehicles, assign_loads
+from stream_ingest import score_stream, format_ndjson, format_sse
+from retraining import DriftMonitor, RetrainJob, BundleWatcher
 
 app = Flask(__name__)
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 model_filename = "vehicle_load_model.pkl"
-scaler_filename = "vehicle_load_scaler.pkl"
 
-try:
-    with open(model_filename, "rb") as model_file, open(scaler_filename, "rb") as scaler_file:
-        model = pickle.load(model_file)
-        scaler = pickle.load(scaler_file)
-    logging.info(f"Model '{model_filename}' and Scaler '{scaler_filename}' loaded successfully.")
-except (FileNotFoundError, pickle.UnpicklingError) as e:
-    logging.error(f"Error loading model or scaler: {e}")
+# VLMS_PROFILE=slim is the lean serving profile for autoscaled workers: it only serves the
+# compiled model bundle (never importing pandas or scikit-learn) and leaves the chart
+# endpoints to other workers. Predictions are still recorded in the shared history log.
+serving_profile = os.environ.get("VLMS_PROFILE", "full")
+if serving_profile not in ("full", "slim"):
+    logging.error(f"Unknown VLMS_PROFILE '{serving_profile}'; expected 'full' or 'slim'.")
     exit()
 
-def preprocess_data(data):
+class ServedModel:
+    """The model being served, with the encoder and version it was trained with.
+
+    Hot swaps replace the whole object, so code that takes one reference sees
+    a consistent model and encoder even while a new version is swapped in.
+    """
+
+    def __init__(self, engine, model, encoder, version, formula_disagreement=None, sklearn_model_sha256=None):
+        self.engine = engine  # Compiled forest from the model bundle, or None
+        self.model = model  # Pickled model, used when there is no bundle
+        self.encoder = encoder
+        self.version = version
+        self.formula_disagreement = formula_disagreement
+        self.sklearn_model_sha256 = sklearn_model_sha256
+        self.batch_model = None  # The pickled forest behind the bundle, once loaded for large batches
+        self._batch_model_requested = False
+        self._batch_model_lock = threading.Lock()
+
+    def large_batch_model(self):
+        """Returns the pickled forest the bundle was compiled from, or None while it is not available.
+
+        sklearn walks large batches faster than the compiled forest. The pickle is
+        loaded on a background thread the first time it is asked for, and only in
+        the full profile and when it is the exact file the bundle was compiled from.
+        """
+        with self._batch_model_lock:
+            if self._batch_model_requested or not self.sklearn_model_sha256 or serving_profile != "full":
+                return self.batch_model
+            self._batch_model_requested = True
+        threading.Thread(target=self._load_batch_model, name="batch-model-loader", daemon=True).start()
+        return None
+
+    def _load_batch_model(self):
+        try:
+            with open(model_filename, "rb") as model_file:
+                data = model_file.read()
+            if hashlib.sha256(data).hexdigest() != self.sklearn_model_sha256:
+                logging.info(f"'{model_filename}' is not the forest behind bundle '{self.version}'; "
+                             f"large batches stay on the compiled forest.")
+                return
+            self.batch_model = pickle.loads(data)
+            logging.info(f"Pickled forest loaded for batches of {sklearn_batch_rows} rows or more.")
+        except (OSError, pickle.UnpicklingError) as e:
+            logging.error(f"Could not load the pickled forest for large batches: {e}")
+
+def load_bundle_model(version=None):
+    """Loads a model bundle version (the current one by default) with its encoder."""
+    engine, manifest = load_bundle(version=version)
+    encoder = FeatureEncoder.from_dict(manifest["encoder"])
+    encoder.check_feature_names(manifest["feature_names"])
+    return ServedModel(engine, None, encoder, manifest["version"], manifest.get("formula_disagreement"),
+                       manifest.get("sklearn_model_sha256"))
+
+def load_pickled_model():
+    """Loads the pickled model and the encoder saved next to it."""
+    with open(model_filename, "rb") as model_file:
+        model = pickle.load(model_file)
+    encoder = FeatureEncoder.load(encoder_filename)
+    return ServedModel(None, model, encoder, f"pickle-{int(os.path.getmtime(model_filename))}")
+
+# Prefer the versioned model bundle: its tree arrays are memory-mapped, so startup is
+# fast and forked workers share pages. Fall back to the pickles when it is absent.
+# Either way the feature encoder comes from the same training run as the model.
+served_model = None
+with startup_profiler.stage("load_model"):
     try:
-        df = pd.DataFrame([data])
-        logging.info(f"Dataframe before one-hot encoding: {df}")
-        df = pd.get_dummies(df, columns=["vehicle_type"])
-        logging.info(f"Dataframe after one-hot encoding: {df}")
-
-        # Ensure all required training columns are present
-        training_columns = ['vehicle_type_2-wheeler', 'vehicle_type_4-wheeler 5-seater',
-                            'vehicle_type_4-wheeler 7-seater', 'vehicle_type_delivery vehicle',
-                            'vehicle_type_heavy vehicle']
-        for col in training_columns:
-            if col not in df.columns:
-                df[col] = 0
-        logging.info(f"Dataframe after adding missing columns: {df}")
-
-        numerical_features = ['weight', 'max_load_capacity', 'passenger_count', 'cargo_weight']
-        numerical_data = df[numerical_features]
-        logging.info(f"Numerical Data before scaling: {numerical_data}")
+        served_model = load_bundle_model()
+        logging.info(f"Model bundle version '{served_model.version}' loaded successfully.")
+    except (OSError, ValueError, KeyError) as e:
+        if serving_profile == "slim":
+            logging.error(f"The slim profile needs the compiled model bundle: {e}")
+            exit()
+        logging.info(f"No usable model bundle ({e}); loading the pickled model instead.")
         try:
-            scaled_data = scaler.transform(numerical_data)
-            scaled_df = pd.DataFrame(scaled_data, columns=[f"{col}_scaled" for col in numerical_features])
-            logging.info(f"Scaled Data: {scaled_df}")
-        except Exception as e:
-            logging.error(f"Error during scaling: {e}")
-            return None
-        df = pd.concat([df, scaled_df], axis=1)
-        logging.info(f"Dataframe after concat scaled data: {df}")
-        df.drop(numerical_features, axis=1, inplace=True)
-        logging.info(f"Columns before reordering: {df.columns.tolist()}")
-
-        # Reorder columns
-        df = df[training_columns + [f"{col}_scaled" for col in numerical_features]]
-        return df
-    except KeyError as e:
-        logging.error(f"Missing key in input data: {e}")
-        return None
-    except Exception as e:
-        logging.error(f"Error in preprocessing: {e}")
-        return None
+            served_model = load_pickled_model()
+            logging.info(f"Model '{model_filename}' and Encoder '{encoder_filename}' loaded successfully.")
+        except (OSError, ValueError, KeyError, pickle.UnpicklingError) as e:
+            logging.error(f"Error loading model or encoder: {e}")
+            exit()
+
+max_batch_size = 10000
+# Opt-in: batches of at least this many rows are scored by the pickled forest behind the bundle (full
+# profile only). sklearn walks large batches faster, but loading it costs the memory and import time
+# that lean serving avoids, and the compiled forest gives the same results. 0 keeps it off.
+sklearn_batch_rows = int(os.environ.get("VLMS_SKLEARN_BATCH_ROWS", 0))
+max_fleet_items = 100000  # Loads plus vehicles accepted by /optimize/assignments
+
+# /predict/stream scores records in small batches; each open stream holds a reader thread
+stream_batch_size = int(os.environ.get("VLMS_STREAM_BATCH_SIZE", 32))
+stream_max_wait_ms = float(os.environ.get("VLMS_STREAM_MAX_WAIT_MS", 20.0))
+stream_max_line_bytes = 16384
+stream_heartbeat_seconds = 15.0  # Keep-alive comments on idle server-sent event streams
+stream_slots = threading.BoundedSemaphore(int(os.environ.get("VLMS_MAX_STREAMS", 16)))
+
+# Repeated vehicles are answered from a bounded LRU/TTL cache. Set VLMS_CACHE_STORE to a
+# SQLite file path to share cached results between worker processes on the same host.
+prediction_cache = PredictionCache(max_entries=int(os.environ.get("VLMS_CACHE_SIZE", 10000)),
+                                   ttl_seconds=float(os.environ.get("VLMS_CACHE_TTL", 300)),
+                                   store_path=os.environ.get("VLMS_CACHE_STORE"))
+
+# Per-stage request timings feed /metrics; a sample of requests is logged as one JSON line each
+telemetry = Telemetry(sample_rate=float(os.environ.get("VLMS_TELEMETRY_SAMPLE_RATE", 0.01)))
+
+# Largest accepted value per numerical field; far above any real vehicle, but it keeps every value
+# within the integer and float ranges used by encoding, the cache and the history log
+max_field_values = {"weight": 1_000_000, "max_load_capacity": 1_000_000, "passenger_count": 1000, "cargo_weight": 1_000_000}
+
+def validate_record(data):
+    """Validates a single vehicle record and returns a copy with numeric fields as integers."""
+    if not isinstance(data, dict):
+        raise ValueError("Record must be a JSON object")
+    missing = [key for key in ["vehicle_type"] + numerical_features if key not in data]
+    if missing:
+        raise ValueError(f"Missing fields: {', '.join(missing)}")
+    if not isinstance(data["vehicle_type"], str) or data["vehicle_type"] not in served_model.encoder.category_index:
+        raise ValueError(f"Unknown vehicle type: {data['vehicle_type']}")
+    record = {"vehicle_type": data["vehicle_type"]}
+    for key in numerical_features:
+        value = data[key]
+        # JSON true/false would otherwise pass as 1/0, and fractions would be silently truncated
+        if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+            raise ValueError(f"Field '{key}' must be a number")
+        if isinstance(value, float) and not value.is_integer():
+            raise ValueError(f"Field '{key}' must be a whole number")
+        try:
+            record[key] = int(value)
+        except ValueError:
+            raise ValueError(f"Field '{key}' must be a whole number")
+        if not 0 <= record[key] <= max_field_values[key]:
+            raise ValueError(f"Field '{key}' must be between 0 and {max_field_values[key]}")
+    return record
+
+def predict_records(records, timer=None, served=None):
+    """Predicts the overload class of validated records, using the compiled forest when it is available.
+
+    served is the ServedModel to score with (the current one by default); callers that
+    cache the results pass the one whose version they cache them under.
+    """
+    if timer is None:
+        timer = RequestTimer("internal")
+    # One reference for the whole call, so a hot swap cannot pair one model's encoder with another model
+    served = served or served_model
+    with timer.stage("preprocess"):
+        # Encoded straight into this thread's reusable buffer; no DataFrame is built
+        features = served.encoder.transform(records, out=served.encoder.buffer(len(records)))
+    with timer.stage("predict"):
+        if served.engine is not None:
+            batch_model = served.large_batch_model() if 0 < sklearn_batch_rows <= len(records) else None
+            if batch_model is not None:
+                return batch_model.predict(features)
+            return served.engine.predict(features)
+        return served.model.predict(features)
+
+# In the production serving mode, /predict requests are coalesced into micro-batches
+batcher = None
+prediction_timeout = float(os.environ.get("VLMS_PREDICTION_TIMEOUT", 5.0))
+
+def enable_microbatching():
+    """Routes /predict model calls through a bounded micro-batching queue."""
+    global batcher
+    if batcher is None:
+        batcher = MicroBatcher(predict_queued,
+                               max_batch_size=int(os.environ.get("VLMS_MAX_BATCH_SIZE", 64)),
+                               max_wait_ms=float(os.environ.get("VLMS_MAX_WAIT_MS", 2.0)),
+                               max_queue_size=int(os.environ.get("VLMS_QUEUE_SIZE", 1024)),
+                               workers=int(os.environ.get("VLMS_SCORING_WORKERS", 2)))
+        logging.info(f"Micro-batching enabled: {batcher.stats()}")
+    return batcher
+
+def predict_queued(items):
+    """Scores micro-batched (record, served model) pairs; pairs queued across a hot swap keep their own model."""
+    predictions = [None] * len(items)
+    groups = {}
+    for position, (_, served) in enumerate(items):
+        groups.setdefault(id(served), (served, []))[1].append(position)
+    for served, positions in groups.values():
+        scored = predict_records([items[position][0] for position in positions], served=served)
+        for position, prediction in zip(positions, scored):
+            predictions[position] = prediction
+    return predictions
+
+def cache_key(record):
+    """Builds the prediction cache key for a validated record."""
+    return PredictionCache.make_key([record["vehicle_type"]] + [record[key] for key in numerical_features])
+
+def parse_batch_payload():
+    """Reads a batch request body as a JSON array or as NDJSON (one record per line).
+
+    Returns the list of raw records (or None if the body is unusable) and a dict
+    of per-row errors for NDJSON lines that could not be decoded.
+    """
+    errors = {}
+    if request.mimetype in ("application/x-ndjson", "application/jsonl"):
+        records = []
+        for line in request.get_data(as_text=True).splitlines():
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                errors[len(records)] = f"Invalid JSON: {e.msg}"
+                records.append(None)
+        return records, errors
+    records = request.get_json(silent=True)
+    if not isinstance(records, list):
+        return None, errors
+    return records, errors
 
 @app.route("/")
 def index():
     background_image = get_random_background()
-    logging.info(f"Background image: {background_image}")
+    logging.debug("Background image: %s", background_image)
     return render_template("basic.html", background_image=background_image)
 
-def generate_sample_data(num_samples=100):
-    data = {
-        'vehicle_type': random.choices(['2-wheeler', '4-wheeler 5-seater', '4-wheeler 7-seater', 'delivery vehicle', 'heavy vehicle'], k=num_samples),
-        'weight': [random.randint(50, 20000) for _ in range(num_samples)],
-        'max_load_capacity': [random.randint(100, 25000) for _ in range(num_samples)],
-        'passenger_count': [random.randint(1, 7) for _ in range(num_samples)],
-        'cargo_weight': [random.randint(0, 10000) for _ in range(num_samples)]
-    }
-    return pd.DataFrame(data)
+def history_entry(record, result):
+    """Builds the prediction history line for a validated record and its result."""
+    return {**record, "predicted_status": result["predicted_status"], "overload_status": result["overload_status"]}
+
+# Every prediction is appended to the history log. A background thread folds it into running
+# aggregates, which /charts/<name>.json serves for the browser to draw.
+history = PredictionHistory(os.environ.get("VLMS_HISTORY_LOG", os.path.join("history", "predictions.ndjson")),
+                            max_bytes=int(os.environ.get("VLMS_HISTORY_MAX_BYTES", 256 * 1024 * 1024)))
+if serving_profile == "full":
+    history.follow(interval_seconds=float(os.environ.get("VLMS_CHART_REFRESH_SECONDS", 5)))
+
+# Every scored vehicle also feeds windowed drift statistics, compared against the served model's
+# training data. With VLMS_RETRAIN=1, a drifted window starts a background retrain on the prediction
+# history; a candidate at least as accurate on held-out rows is published and swapped into every
+# worker without a restart.
+retrain_enabled = os.environ.get("VLMS_RETRAIN", "0") == "1"
+retrain_job = RetrainJob(history.log_path, work_dir=os.environ.get("VLMS_RETRAIN_DIR", "retrain"),
+                         min_rows=int(os.environ.get("VLMS_RETRAIN_MIN_ROWS", 5000)),
+                         max_rows=int(os.environ.get("VLMS_RETRAIN_MAX_ROWS", 500000)),
+                         cooldown_seconds=float(os.environ.get("VLMS_RETRAIN_COOLDOWN_SECONDS", 3600)),
+                         reference_data=os.environ.get("VLMS_RETRAIN_HOLDOUT") or None)
+
+def handle_drift(report):
+    features = ", ".join(report["drifted_features"])
+    logging.warning(f"Drift detected over the last {report['rows']} predictions: {features}")
+    if retrain_enabled:
+        retrain_job.start(f"drift in {features}")
+
+drift_monitor = DriftMonitor(served_model.encoder, served_model.formula_disagreement,
+                             window=int(os.environ.get("VLMS_DRIFT_WINDOW", 5000)),
+                             mean_shift_threshold=float(os.environ.get("VLMS_DRIFT_MEAN_SHIFT", 0.5)),
+                             on_drift=handle_drift)
+
+def swap_model(version):
+    """Loads a newly published bundle version and serves it from the next request on.
+
+    Requests already scoring keep the model they started with, so none is dropped.
+    """
+    global served_model
+    replacement = load_bundle_model(version)
+    served_model = replacement
+    drift_monitor.reset(replacement.encoder, replacement.formula_disagreement)
+    logging.info(f"Model bundle version '{version}' swapped in.")
+
+bundle_watcher = BundleWatcher(swap_model, served_model.version,
+                               interval_seconds=float(os.environ.get("VLMS_MODEL_RELOAD_SECONDS", 5)))
+if bundle_watcher.interval_seconds > 0:
+    bundle_watcher.start()
+
+def record_predictions(entries):
+    """Appends scored history entries to the log and feeds them to the drift monitor."""
+    history.append(entries)
+    drift_monitor.observe(entries)
 
 @app.route("/predict", methods=["POST"])
 def predict():
+    timer = g.timer
     try:
-        data = request.get_json()
-        logging.info(f"Received data: {data}")
-        if data is None:
-            return jsonify({"error": "No data provided"}), 400
-        processed_data = preprocess_data(data)
-        logging.info(f"Processed data: {processed_data}")
-        if processed_data is None:
-            return jsonify({"error": "Preprocessing failed"}), 400
-        prediction = model.predict(processed_data)[0]
-        logging.info(f"Prediction (Model Output): {prediction}")
-
-        # Calculate overload amount based on the provided data
-        total_weight = int(data.get('weight', 0)) + int(data.get('passenger_count', 0)) * 75 + int(data.get('cargo_weight', 0))
-        max_load_capacity = int(data.get('max_load_capacity', 0))
-        overload_amount = max(0, total_weight - max_load_capacity)
-
-        # Determine overload status based on overload amount
-        if overload_amount > 0:
-            overload_status = "Overloaded"
+        with timer.stage("parse"):
+            # Malformed JSON or another content type is the client's error, not a server failure
+            data = request.get_json(silent=True)
+            if data is None:
+                return jsonify({"error": "Expected a JSON object"}), 400
+            try:
+                record = validate_record(data)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+
+        # Repeated inputs are served from the cache; entries are tied to the loaded model version.
+        # One model reference for the request, so a hot swap cannot cache one model's result under another's version
+        served = served_model
+        key = cache_key(record)
+        version = served.version
+        cached_result = prediction_cache.get(key, version)
+        timer.annotate(cache_hit=cached_result is not None)
+        if cached_result is not None:
+            result = dict(cached_result)
         else:
-            overload_status = "Not Overloaded"
-
-        result = {
-            "overload_status": overload_status,
-            "overload_amount": overload_amount,
-        }
-
-        vehicle_limits = {
-            "2-wheeler": {"maxCargo": 50},
-            "4-wheeler 5-seater": {"maxCargo": 500},
-            "4-wheeler 7-seater": {"maxCargo": 750},
-            "delivery vehicle": {"maxCargo": 1500},
-            "heavy vehicle": {"maxCargo": 10000}
-        }
-        suggested_vehicles = []
-        if data.get("vehicle_type") == "heavy vehicle":
-            cargo_weight = int(data.get("cargo_weight", 0))  # Convert to integer
-            if cargo_weight <= vehicle_limits["delivery vehicle"]["maxCargo"]:
-                suggested_vehicles.append("delivery vehicle")
-            if cargo_weight <= vehicle_limits["4-wheeler 7-seater"]["maxCargo"]:
-                suggested_vehicles.append("4-wheeler 7-seater")
-            if cargo_weight <= vehicle_limits["4-wheeler 5-seater"]["maxCargo"]:
-                suggested_vehicles.append("4-wheeler 5-seater")
-            if cargo_weight <= vehicle_limits["2-wheeler"]["maxCargo"]:
-                suggested_vehicles.append("2-wheeler")
-        result["suggested_vehicles"] = suggested_vehicles
-
-        logging.info(f"Overload Status: {overload_status}")
-        logging.info(f"Overload Amount: {overload_amount}")
-
-        # Generate graphs based on vehicle type from sample data (not user input)
-        df = generate_sample_data()
-
-        graphs_dir = os.path.join(app.static_folder, 'graphs')
-        if not os.path.exists(graphs_dir):
-            os.makedirs(graphs_dir)
-
-        # Generate all graphs
-        histogram_path = os.path.join(graphs_dir, 'histogram_weight.png')
-        graph.generate_histogram(df, 'weight', 'Histogram of Vehicle Weight', histogram_path)
-        histogram_url = url_for('static', filename='graphs/histogram_weight.png')
-
-        boxplot_path = os.path.join(graphs_dir, 'boxplot_weight.png')
-        graph.generate_boxplot(df, 'weight', 'Boxplot of Vehicle Weight', boxplot_path)
-        boxplot_url = url_for('static', filename='graphs/boxplot_weight.png')
-
-        scatter_path = os.path.join(graphs_dir, 'scatter_plot.png')
-        graph.generate_scatter_plot(df, 'weight', 'cargo_weight', 'Scatter Plot of Weight vs. Cargo Weight', scatter_path)
-        scatter_url = url_for('static', filename='graphs/scatter_plot.png')
-
-        heatmap_path = os.path.join(graphs_dir, 'heatmap.png')
-        heatmap_df = df.drop("vehicle_type", axis=1)  # Exclude vehicle type for heatmap
-        graph.generate_heatmap(heatmap_df, 'Heatmap of Vehicle Features', heatmap_path)
-        heatmap_url = url_for('static', filename='graphs/heatmap.png')
-
-        pair_plot_path = os.path.join(graphs_dir, 'pair_plot.png')
-        graph.generate_pair_plot(df.drop("vehicle_type", axis=1), 'Pair Plot of Vehicle Features', pair_plot_path)  # Exclude vehicle type for pairplot
-        pair_plot_url = url_for('static', filename='graphs/pair_plot.png')
-
-        count_plot_path = os.path.join(graphs_dir, 'count_plot.png')
-        graph.generate_count_plot(df, 'vehicle_type', 'Count Plot of Vehicle Types', count_plot_path)
-        count_plot_url = url_for('static', filename='graphs/count_plot.png')
-
-        # Add URLs to the response
-        result['histogram_url'] = histogram_url
-        result['boxplot_url'] = boxplot_url
-        result['scatter_url'] = scatter_url
-        result['heatmap_url'] = heatmap_url
-        result['pair_plot_url'] = pair_plot_url
-        result['count_plot_url'] = count_plot_url
-
-        return jsonify(result)
+            if batcher is not None:
+                with timer.stage("predict"):
+                    try:
+                        future = batcher.submit((record, served))
+                    except QueueFullError:
+                        return jsonify({"error": "Server is busy, try again shortly."}), 503, {"Retry-After": "1"}
+                    try:
+                        prediction = future.result(timeout=prediction_timeout)
+                    except FutureTimeoutError:
+                        # Skip the record if it has not been picked up for scoring yet
+                        future.cancel()
+                        return jsonify({"error": "Prediction timed out."}), 503, {"Retry-After": "1"}
+            else:
+                prediction = predict_records([record], timer, served)[0]
+
+            with timer.stage("suggest"):
+                # Calculate overload amount based on the provided data
+                overload_amount = int(calculate_overload(record['weight'], record['passenger_count'],
+                                                         record['cargo_weight'], record['max_load_capacity']))
+
+                # Determine overload status based on overload amount
+                if overload_amount > 0:
+                    overload_status = "Overloaded"
+                else:
+                    overload_status = "Not Overloaded"
+
+                result = {
+                    "overload_status": overload_status,
+                    "overload_amount": overload_amount,
+                    "predicted_status": str(prediction),
+                }
+
+                suggested_vehicles = suggest_vehicles(record["vehicle_type"], record["cargo_weight"])
+                result["suggested_vehicles"] = suggested_vehicles
+            prediction_cache.put(key, dict(result), version)
+
+        with timer.stage("record"):
+            record_predictions([history_entry(record, result)])
+
+        with timer.stage("render"):
+            timer.annotate(overload_status=result["overload_status"])
+            return jsonify(result)
 
     except Exception as e:
         logging.error(f"Prediction error: {e}")
         return jsonify({"error": "An error occurred during prediction."}), 500
     
+def score_validated_records(records, timer):
+    """Scores validated records, serving repeated vehicles from the cache.
+
+    Returns one result dict per record, in order, and the number of records that missed the cache.
+    """
+    results = [None] * len(records)
+    miss_positions = []
+    served = served_model
+    version = served.version
+    for position, record in enumerate(records):
+        cached_result = prediction_cache.get(cache_key(record), version)
+        if cached_result is not None:
+            results[position] = dict(cached_result)
+        else:
+            miss_positions.append(position)
+
+    if miss_positions:
+        # One encode and predict pass over every row that missed the cache
+        miss_records = [records[position] for position in miss_positions]
+        predictions = predict_records(miss_records, timer, served)
+        with timer.stage("suggest"):
+            values = {key: np.array([record[key] for record in miss_records]) for key in numerical_features}
+            overload_amounts = calculate_overload(values["weight"], values["passenger_count"],
+                                                  values["cargo_weight"], values["max_load_capacity"])
+            for offset, position in enumerate(miss_positions):
+                record = miss_records[offset]
+                overload_amount = int(overload_amounts[offset])
+                result = {
+                    "overload_status": "Overloaded" if overload_amount > 0 else "Not Overloaded",
+                    "overload_amount": overload_amount,
+                    "predicted_status": str(predictions[offset]),
+                    "suggested_vehicles": suggest_vehicles(record["vehicle_type"], record["cargo_weight"]),
+                }
+                prediction_cache.put(cache_key(record), result, version)
+                results[position] = dict(result)
+    return results, len(miss_positions)
+
+@app.route("/predict/batch", methods=["POST"])
+def predict_batch():
+    timer = g.timer
+    try:
+        with timer.stage("parse"):
+            records, errors = parse_batch_payload()
+            if records is None:
+                return jsonify({"error": "Expected a JSON array or NDJSON body"}), 400
+            if len(records) > max_batch_size:
+                return jsonify({"error": f"Batch exceeds the maximum of {max_batch_size} records"}), 413
+
+            valid_indices = []
+            valid_records = []
+            for index, data in enumerate(records):
+                if index in errors:
+                    continue
+                try:
+                    valid_records.append(validate_record(data))
+                    valid_indices.append(index)
+                except ValueError as e:
+                    errors[index] = str(e)
+
+        results = [None] * len(records)
+        scored, misses = score_validated_records(valid_records, timer)
+        for index, result in zip(valid_indices, scored):
+            results[index] = {"index": index, **result}
+        with timer.stage("record"):
+            record_predictions([history_entry(record, results[index]) for record, index in zip(valid_records, valid_indices)])
+        for index, message in errors.items():
+            results[index] = {"index": index, "error": message}
+
+        timer.annotate(rows=len(records), scored=misses, cached=len(valid_records) - misses, rejected=len(errors))
+        with timer.stage("render"):
+            return jsonify({"results": results, "count": len(records), "error_count": len(errors)})
+
+    except Exception as e:
+        logging.error(f"Batch prediction error: {e}")
+        return jsonify({"error": "An error occurred during batch prediction."}), 500
+
+def score_stream_batch(records):
+    """Scores one small batch of a /predict/stream body; rejected records get an "error" entry."""
+    timer = telemetry.start("predict_stream_batch")
+    results = [None] * len(records)
+    valid_positions = []
+    valid_records = []
+    with timer.stage("parse"):
+        for position, data in enumerate(records):
+            try:
+                valid_records.append(validate_record(data))
+                valid_positions.append(position)
+            except ValueError as e:
+                results[position] = {"error": str(e)}
+    scored, misses = score_validated_records(valid_records, timer)
+    for position, result in zip(valid_positions, scored):
+        results[position] = result
+    with timer.stage("record"):
+        record_predictions([history_entry(record, result) for record, result in zip(valid_records, scored)])
+    timer.annotate(rows=len(records), scored=misses, cached=len(valid_records) - misses,
+                   rejected=len(records) - len(valid_records))
+    telemetry.finish(timer, 200)
+    return results
+
+@app.route("/predict/stream", methods=["POST"])
+def predict_stream():
+    """Scores a long-lived NDJSON stream of vehicle records and streams back one verdict per record.
+
+    Verdicts are NDJSON lines, or server-sent events when the client accepts text/event-stream.
+    """
+    if not stream_slots.acquire(blocking=False):
+        return jsonify({"error": "Too many open streams, try again shortly."}), 503, {"Retry-After": "1"}
+    try:
+        use_sse = request.accept_mimetypes.best_match(["application/x-ndjson", "text/event-stream"]) == "text/event-stream"
+        events = score_stream(request.stream, score_stream_batch, batch_size=stream_batch_size,
+                              max_wait_ms=stream_max_wait_ms, max_line_bytes=stream_max_line_bytes,
+                              heartbeat_seconds=stream_heartbeat_seconds if use_sse else None)
+        formatter = format_sse if use_sse else format_ndjson
+
+        def generate():
+            try:
+                for event, payload in events:
+                    yield formatter(event, payload)
+            finally:
+                # Stops the reader thread when the client disconnects mid-stream
+                events.close()
+
+        response = Response(stream_with_context(generate()),
+                            mimetype="text/event-stream" if use_sse else "application/x-ndjson")
+    except Exception:
+        stream_slots.release()
+        raise
+    # Free the slot when the response is closed, whether or not the client read it to the end
+    response.call_on_close(stream_slots.release)
+    # Ask reverse proxies not to buffer the verdicts
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+@app.before_request
+def start_request_timer():
+    g.timer = telemetry.start(request.endpoint or "unknown")
+
+@app.after_request
+def record_request_telemetry(response):
+    timer = g.pop("timer", None)
+    if timer is not None:
+        telemetry.finish(timer, response.status_code)
+    return response
+
+@app.route("/metrics")
+def metrics():
+    cache = prediction_cache.stats()
+    extra_metrics = {
+        "vlms_prediction_cache_hits_total": ("counter", "Prediction cache hits.", cache["hits"]),
+        "vlms_prediction_cache_misses_total": ("counter", "Prediction cache misses.", cache["misses"]),
+        "vlms_prediction_cache_evictions_total": ("counter", "Prediction cache LRU evictions.", cache["evictions"]),
+        "vlms_prediction_cache_entries": ("gauge", "Entries in the local prediction cache.", cache["entries"]),
+        "vlms_drift_windows_total": ("counter", "Prediction windows checked for drift.", drift_monitor.windows_checked),
+        "vlms_drift_detected_total": ("counter", "Prediction windows that drifted.", drift_monitor.drifted_windows),
+        "vlms_retrains_total": ("counter", "Background retrains run by this worker.", retrain_job.runs),
+        "vlms_model_swaps_total": ("counter", "New model versions swapped in without a restart.", bundle_watcher.swaps),
+    }
+    if batcher is not None:
+        batching = batcher.stats()
+        extra_metrics.update({
+            "vlms_microbatch_batches_total": ("counter", "Micro-batches scored.", batching["batches"]),
+            "vlms_microbatch_items_total": ("counter", "Requests scored through micro-batches.", batching["items"]),
+            "vlms_microbatch_rejected_total": ("counter", "Requests rejected because the queue was full.", batching["rejected"]),
+            "vlms_microbatch_queue_depth": ("gauge", "Requests waiting in the micro-batching queue.", batching["queue_depth"]),
+        })
+    return Response(telemetry.render(extra_metrics), mimetype="text/plain; version=0.0.4")
+
+@app.route("/optimize/assignments", methods=["POST"])
+def optimize_assignments():
+    """Assigns cargo loads to the available vehicles without overloading any of them."""
+    timer = g.timer
+    with timer.stage("parse"):
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({"error": "Expected a JSON object with 'loads' and 'vehicles'"}), 400
+        for field in ("loads", "vehicles"):
+            if not isinstance(data.get(field), list):
+                return jsonify({"error": f"'{field}' must be a list"}), 400
+        if len(data["loads"]) + len(data["vehicles"]) > max_fleet_items:
+            return jsonify({"error": f"Request exceeds the maximum of {max_fleet_items} loads and vehicles"}), 413
+        try:
+            loads = parse_loads(data.get("loads"))
+            vehicles = parse_vehicles(data.get("vehicles"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    timer.annotate(loads=len(loads), vehicles=len(vehicles))
+    with timer.stage("optimize"):
+        result = assign_loads(loads, vehicles)
+    return jsonify(result)
+
+@app.route("/charts/<name>.json")
+def chart_json(name):
+    """Returns the numbers behind one chart; clients revalidate with If-None-Match."""
+    if serving_profile != "full":
+        return jsonify({"error": "Charts are not served by this worker"}), 404
+    payload = history.chart_payload(name)
+    if payload is None:
+        return jsonify({"error": f"Unknown chart: {name}"}), 404
+    body, version = payload
+    response = Response(body, mimetype="application/json")
+    response.set_etag(version)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+@app.route("/cache/stats")
+def cache_stats():
+    return jsonify(prediction_cache.stats())
+
+@app.route("/startup")
+def startup():
+    return jsonify(startup_report)
+
+@app.route("/drift")
+def drift():
+    """Returns the drift statistics, the retrain status and the model version this worker serves."""
+    return jsonify({"model_version": served_model.version, "model_swaps": bundle_watcher.swaps,
+                    "drift": drift_monitor.stats(), "retrain": {"enabled": retrain_enabled, **retrain_job.stats()}})
+
 def get_random_background():
     background_dir = os.path.join(app.static_folder, 'backgrounds')
     try:
@@ -192,5 +609,22 @@ def get_random_background():
         logging.error(f"Background directory not found at: {background_dir}")
         return None
 
+if os.environ.get("VLMS_MICROBATCH") == "1":
+    enable_microbatching()
+
+startup_report = startup_profiler.finish()
+logging.info(f"Worker started in {startup_report['startup_ms']} ms ({serving_profile} profile), "
+             f"RSS {startup_report['rss_mb']} MB, heavy packages: {startup_report['heavy_packages_loaded'] or 'none'}")
+
 if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run the vehicle load prediction server.")
+    parser.add_argument("--production", action="store_true",
+                        help="Threaded server without the debugger, with micro-batched predictions")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    args = parser.parse_args()
+    if args.production:
+        enable_microbatching()
+        app.run(host=args.host, port=args.port, debug=False, threaded=True)
+    else:
+        app.run(host=args.host, port=args.port, debug=True)
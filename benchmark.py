@@ -0,0 +1,495 @@
+"""Load tests and microbenchmarks for the prediction service.
+
+    python benchmark.py load --concurrency 1,8,32 --requests 2000
+    python benchmark.py load --source vehicles.jsonl --url http://127.0.0.1:5000
+    python benchmark.py micro
+    python benchmark.py replay --source vehicles.jsonl --rate 500
+    python benchmark.py compare benchmarks/old.json benchmarks/new.json
+
+`load` replays vehicle records from a JSONL file or generates them, and sends
+them to /predict through Flask's test client or to a running server, reporting p50/p95/p99 latency and
+requests per second at each concurrency level. `micro` times the feature
+encoder, the model call, the chart aggregates and every chart renderer on
+their own. `replay` streams records from a JSONL file (or generated ones) to
+/predict/stream at a fixed rate over one long-lived request and measures how
+long each verdict takes to come back.
+
+A replayed --source file holds one vehicle record per line: a JSON object with
+vehicle_type, weight, max_load_capacity, passenger_count and cargo_weight.
+Other lines are skipped, so a file such as requests.jsonl (change requests,
+not vehicle records) yields nothing; leave --source out to generate records.
+In-process runs use a temporary prediction history log with retraining off,
+so benchmark traffic never reaches the real history or the drift monitor.
+Every run is saved as JSON; `compare` flags regressions between two runs.
+"""
+import argparse
+import http.client
+import io
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from generate_dataset import generate_chunk
+
+vehicle_fields = ["vehicle_type", "weight", "max_load_capacity", "passenger_count", "cargo_weight"]
+results_dir = "benchmarks"
+
+
+def isolate_app_state(temp_dir):
+    """Points the in-process app at a scratch history log and turns retraining off; call before importing app."""
+    os.environ["VLMS_HISTORY_LOG"] = os.path.join(temp_dir, "predictions.ndjson")
+    os.environ["VLMS_RETRAIN"] = "0"
+
+
+def load_records(path):
+    """Reads vehicle records from a JSONL file, skipping lines that are not vehicle records."""
+    records = []
+    with open(path) as source:
+        for line in source:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(record, dict) and all(field in record for field in vehicle_fields):
+                records.append({field: record[field] for field in vehicle_fields})
+    return records
+
+
+def generate_records(count, seed, distinct=None):
+    """Generates synthetic vehicle records; with distinct set, requests repeat that many vehicles."""
+    rng = np.random.default_rng(seed)
+    df = generate_chunk(distinct or count, rng)
+    records = [
+        {"vehicle_type": str(row.vehicle_type), "weight": int(row.weight), "max_load_capacity": int(row.max_load_capacity),
+         "passenger_count": int(row.passenger_count), "cargo_weight": int(row.cargo_weight)}
+        for row in df.itertuples(index=False)
+    ]
+    if distinct:
+        records = [records[i] for i in rng.integers(0, distinct, size=count)]
+    return records
+
+
+def latency_summary(latencies_ms):
+    latencies = np.asarray(latencies_ms)
+    if latencies.size == 0:
+        return {}
+    return {
+        "mean_ms": round(float(latencies.mean()), 3),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+        "max_ms": round(float(latencies.max()), 3),
+    }
+
+
+class TestClientSender:
+    """Sends requests through Flask's test client (one client per thread)."""
+
+    def __init__(self, endpoint):
+        import app as app_module
+        self.app = app_module.app
+        self.endpoint = endpoint
+        self._local = threading.local()
+
+    def __call__(self, record):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        return client.post(self.endpoint, json=record).status_code
+
+
+class HttpSender:
+    """Sends requests to a running server over HTTP."""
+
+    def __init__(self, url, endpoint):
+        self.url = url.rstrip("/") + endpoint
+
+    def __call__(self, record):
+        request = urllib.request.Request(self.url, data=json.dumps(record).encode(),
+                                         headers={"Content-Type": "application/json"}, method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+        except (urllib.error.URLError, OSError):
+            return 0
+
+
+def run_load(send, records, concurrency):
+    """Sends every record with the given number of concurrent clients and summarizes the run."""
+    latencies = [0.0] * len(records)
+    statuses = [0] * len(records)
+
+    def send_one(position):
+        start = time.perf_counter()
+        statuses[position] = send(records[position])
+        latencies[position] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(send_one, range(len(records))))
+    elapsed = time.perf_counter() - start
+
+    status_counts = {}
+    for status in statuses:
+        status_counts[str(status)] = status_counts.get(str(status), 0) + 1
+    ok = [latency for latency, status in zip(latencies, statuses) if 200 <= status < 300]
+    return {
+        "concurrency": concurrency,
+        "requests": len(records),
+        "errors": len(records) - len(ok),
+        "status_counts": status_counts,
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_second": round(len(records) / elapsed, 1) if elapsed else None,
+        **latency_summary(ok),
+    }
+
+
+class IterableBody(io.RawIOBase):
+    """A readable stream over an iterator of byte strings, used as a streaming request body."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._pending = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if not self._pending:
+            self._pending = next(self._chunks, b"")
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+def paced_lines(lines, rate, sent_at):
+    """Yields NDJSON lines, rate per second (0: as fast as possible), noting when each one is sent."""
+    start = time.perf_counter()
+    for position, line in enumerate(lines):
+        if rate:
+            delay = start + position / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        sent_at[position] = time.perf_counter()
+        yield line
+
+
+def split_lines(chunks):
+    """Re-splits a response body that arrives in arbitrary chunks into lines."""
+    pending = b""
+    for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        yield from lines
+    if pending:
+        yield pending
+
+
+def stream_test_client(endpoint, lines):
+    """Streams lines to the in-process app and returns the status and an iterator over the response lines."""
+    import app as app_module
+    from werkzeug.test import EnvironBuilder, run_wsgi_app
+
+    # The test client needs a seekable body, so the environ is built by hand with an unbounded input stream
+    environ = EnvironBuilder(path=endpoint, method="POST", content_type="application/x-ndjson").get_environ()
+    environ.pop("CONTENT_LENGTH", None)
+    environ.update({"wsgi.input": IterableBody(lines), "wsgi.input_terminated": True})
+    app_iter, status, _ = run_wsgi_app(app_module.app, environ, buffered=False)
+    return int(status.split()[0]), split_lines(app_iter)
+
+
+def stream_http(url, endpoint, lines):
+    """Streams lines to a running server as a chunked request and returns the status and the response lines."""
+    target = urllib.parse.urlsplit(url)
+    connection = socket.create_connection((target.hostname, target.port or 80))
+    # Send each small line immediately instead of letting Nagle's algorithm hold it back
+    connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    head = (f"POST {endpoint} HTTP/1.1\r\nHost: {target.netloc}\r\nContent-Type: application/x-ndjson\r\n"
+            f"Accept: application/x-ndjson\r\nTransfer-Encoding: chunked\r\nConnection: close\r\n\r\n")
+
+    def send():
+        # Send on a separate thread so verdicts are read while the body is still being written
+        try:
+            connection.sendall(head.encode())
+            for line in lines:
+                connection.sendall(b"%x\r\n%s\r\n" % (len(line), line))
+            connection.sendall(b"0\r\n\r\n")
+        except OSError:
+            pass
+
+    threading.Thread(target=send, name="replay-sender", daemon=True).start()
+    response = http.client.HTTPResponse(connection)
+    response.begin()
+    return response.status, (line.rstrip(b"\n") for line in response)
+
+
+def run_replay(args):
+    """Streams records to /predict/stream over one request and measures per-verdict latency."""
+    if args.source and args.raw:
+        # Every non-empty line as it is; the server reports the ones that are not vehicle records
+        with open(args.source, "rb") as source:
+            lines = [line.rstrip(b"\r\n") + b"\n" for line in source if line.strip()]
+    elif args.source:
+        records = load_records(args.source)
+        if not records:
+            sys.exit(f"No vehicle records found in '{args.source}'; expected one JSON object per line with "
+                     f"{', '.join(vehicle_fields)} (use --raw to send every line)")
+        lines = [json.dumps(record).encode() + b"\n" for record in records]
+    else:
+        lines = [json.dumps(record).encode() + b"\n"
+                 for record in generate_records(args.requests or 1000, args.seed, distinct=args.distinct)]
+    if args.source and args.requests:
+        # Cycle through the file until the requested number of records is reached
+        lines = [lines[i % len(lines)] for i in range(args.requests)]
+
+    sent_at = [None] * len(lines)
+    paced = paced_lines(lines, args.rate, sent_at)
+    start = time.perf_counter()
+    if args.url:
+        status, response_lines = stream_http(args.url, args.endpoint, paced)
+    else:
+        status, response_lines = stream_test_client(args.endpoint, paced)
+    latencies = []
+    errors = 0
+    summary = None
+    for line in response_lines:
+        if not line.strip():
+            continue
+        message = json.loads(line)
+        if message.get("done"):
+            summary = message
+            continue
+        if "error" in message:
+            errors += 1
+        elif sent_at[message["index"]] is not None:
+            latencies.append((time.perf_counter() - sent_at[message["index"]]) * 1000)
+    elapsed = time.perf_counter() - start
+
+    result = {
+        "endpoint": args.endpoint,
+        "target": args.url or "test-client",
+        "source": args.source,
+        "status": status,
+        "rate": args.rate,
+        "records": len(lines),
+        "verdicts": len(latencies) + errors,
+        "errors": errors,
+        "completed": summary is not None,
+        "elapsed_s": round(elapsed, 3),
+        "verdicts_per_second": round((len(latencies) + errors) / elapsed, 1) if elapsed else None,
+        **latency_summary(latencies),
+    }
+    print(f"status {status}: {result['verdicts']} verdicts ({errors} errors) in {result['elapsed_s']} s, "
+          f"{result['verdicts_per_second']} verdicts/s, p50 {result.get('p50_ms')} ms, p99 {result.get('p99_ms')} ms")
+    return result
+
+
+def time_call(function, repeat):
+    """Runs function repeat times and summarizes the per-call latency."""
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return {"calls": repeat, "min_ms": round(min(latencies), 3), **latency_summary(latencies)}
+
+
+def run_micro(args):
+    """Times the prediction pipeline stages and chart renderers in isolation."""
+    import app as app_module
+    import graph_service
+    from prediction_history import ChartAggregates
+
+    records = [app_module.validate_record(record) for record in generate_records(args.batch_size, args.seed)]
+    single = records[:1]
+    results = {}
+
+    served = app_module.served_model
+    encoder = served.encoder
+    single_buffer = np.empty((1, encoder.n_features))
+    batch_buffer = np.empty((len(records), encoder.n_features))
+    results["encode_single"] = time_call(lambda: encoder.transform(single, out=single_buffer), args.repeat)
+    results["encode_batch"] = time_call(lambda: encoder.transform(records, out=batch_buffer), max(1, args.repeat // 10))
+    model = served.engine if served.engine is not None else served.model
+    single_features = encoder.transform(single)
+    features = encoder.transform(records)
+    results["model_predict_single"] = time_call(lambda: model.predict(single_features), args.repeat)
+    results["model_predict_batch"] = time_call(lambda: model.predict(features), max(1, args.repeat // 10))
+    results["predict_records_single"] = time_call(lambda: app_module.predict_records(single), args.repeat)
+
+    aggregates = ChartAggregates()
+    results["aggregate_fold"] = time_call(lambda: ChartAggregates().add(records), max(1, args.repeat // 10))
+    aggregates.add(records)
+    chart_data = aggregates.chart_data()
+    results["chart_data"] = time_call(aggregates.chart_data, args.repeat)
+    renderers = {f"render_{stem}": renderer for stem, renderer in graph_service.charts.values()}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for name, render in renderers.items():
+            path = os.path.join(temp_dir, f"{name}.png")
+            results[name] = time_call(lambda: render(chart_data, path), args.graph_repeat)
+    for name, summary in results.items():
+        print(f"{name}: median {summary['p50_ms']} ms over {summary['calls']} calls")
+    return {"batch_size": args.batch_size, "model_version": served.version, "benchmarks": results}
+
+
+def run_load_test(args):
+    if args.source:
+        records = load_records(args.source)
+        if not records:
+            sys.exit(f"No vehicle records found in '{args.source}'; expected one JSON object per line with "
+                     f"{', '.join(vehicle_fields)}")
+        # Cycle through the file until the requested number of requests is reached
+        records = [records[i % len(records)] for i in range(args.requests or len(records))]
+    else:
+        records = generate_records(args.requests or 1000, args.seed, distinct=args.distinct)
+
+    send = HttpSender(args.url, args.endpoint) if args.url else TestClientSender(args.endpoint)
+    # Warm up caches, lazy imports and connection setup before measuring
+    for record in records[:min(len(records), args.warmup)]:
+        send(record)
+    runs = []
+    for concurrency in args.concurrency:
+        summary = run_load(send, records, concurrency)
+        runs.append(summary)
+        print(f"concurrency {concurrency}: {summary['requests_per_second']} req/s, "
+              f"p50 {summary.get('p50_ms')} ms, p95 {summary.get('p95_ms')} ms, p99 {summary.get('p99_ms')} ms, "
+              f"{summary['errors']} errors")
+    return {"endpoint": args.endpoint, "target": args.url or "test-client", "source": args.source, "runs": runs}
+
+
+def compare(args):
+    """Compares two saved runs and exits non-zero if the second one regressed beyond the threshold."""
+    with open(args.baseline) as baseline_file, open(args.candidate) as candidate_file:
+        baseline, candidate = json.load(baseline_file), json.load(candidate_file)
+    regressions = []
+
+    def check(name, old, new, higher_is_better=False):
+        if not old or new is None:
+            return
+        change = (new - old) / old
+        worse = change < -args.threshold if higher_is_better else change > args.threshold
+        marker = "REGRESSION" if worse else "ok"
+        print(f"{marker:10} {name}: {old} -> {new} ({change:+.1%})")
+        if worse:
+            regressions.append(name)
+
+    if baseline["kind"] == "load" and candidate["kind"] == "load":
+        old_runs = {run["concurrency"]: run for run in baseline["runs"]}
+        for run in candidate["runs"]:
+            old = old_runs.get(run["concurrency"])
+            if old is None:
+                continue
+            prefix = f"concurrency {run['concurrency']}"
+            check(f"{prefix} requests_per_second", old["requests_per_second"], run["requests_per_second"], True)
+            for key in ["p50_ms", "p95_ms", "p99_ms"]:
+                check(f"{prefix} {key}", old.get(key), run.get(key))
+    elif baseline["kind"] == "replay" and candidate["kind"] == "replay":
+        check("verdicts_per_second", baseline["verdicts_per_second"], candidate["verdicts_per_second"], True)
+        for key in ["p50_ms", "p95_ms", "p99_ms"]:
+            check(key, baseline.get(key), candidate.get(key))
+    elif baseline["kind"] == "micro" and candidate["kind"] == "micro":
+        for name, summary in candidate["benchmarks"].items():
+            old = baseline["benchmarks"].get(name)
+            if old is not None:
+                check(f"{name} p50_ms", old["p50_ms"], summary["p50_ms"])
+    else:
+        sys.exit("Can only compare two runs of the same kind")
+    if regressions:
+        sys.exit(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}")
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count(),
+            "git_commit": commit}
+
+
+def save_results(kind, results, output):
+    results = {"kind": kind, "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "environment": environment(), **results}
+    if output is None:
+        os.makedirs(results_dir, exist_ok=True)
+        output = os.path.join(results_dir, f"{kind}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(output, "w") as output_file:
+        json.dump(results, output_file, indent=2)
+    print(f"Results saved to '{output}'.")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the vehicle load prediction service.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    load = subparsers.add_parser("load", help="Replay or generate /predict traffic and measure latency and throughput")
+    load.add_argument("--source", help="JSONL file of vehicle records to replay (one JSON object per line)")
+    load.add_argument("--requests", type=int, default=None, help="Requests per concurrency level (default: 1000 or the file length)")
+    load.add_argument("--distinct", type=int, default=None, help="Generate traffic that repeats this many distinct vehicles")
+    load.add_argument("--concurrency", type=lambda value: [int(part) for part in value.split(",")], default=[1, 8, 32],
+                      help="Comma-separated concurrency levels (default: 1,8,32)")
+    load.add_argument("--url", help="Base URL of a running server (default: in-process Flask test client)")
+    load.add_argument("--endpoint", default="/predict")
+    load.add_argument("--warmup", type=int, default=20, help="Requests sent before measuring")
+    load.add_argument("--seed", type=int, default=42)
+    load.add_argument("--output", help="Results file (default: benchmarks/load-<timestamp>.json)")
+
+    micro = subparsers.add_parser("micro", help="Time preprocessing, the model call and graph renderers in isolation")
+    micro.add_argument("--batch-size", type=int, default=1000)
+    micro.add_argument("--repeat", type=int, default=200)
+    micro.add_argument("--graph-repeat", type=int, default=3)
+    micro.add_argument("--seed", type=int, default=42)
+    micro.add_argument("--output", help="Results file (default: benchmarks/micro-<timestamp>.json)")
+
+    replay = subparsers.add_parser("replay", help="Stream records to /predict/stream and measure verdict latency")
+    replay.add_argument("--source", help="JSONL file of vehicle records to replay (one JSON object per line)")
+    replay.add_argument("--raw", action="store_true", help="Send every line of --source as it is, not just vehicle records")
+    replay.add_argument("--requests", type=int, default=None, help="Records to stream (default: 1000 or the file length)")
+    replay.add_argument("--distinct", type=int, default=None, help="Generate records that repeat this many distinct vehicles")
+    replay.add_argument("--rate", type=float, default=0, help="Records sent per second (default: 0, as fast as possible)")
+    replay.add_argument("--url", help="Base URL of a running server (default: in-process Flask test client)")
+    replay.add_argument("--endpoint", default="/predict/stream")
+    replay.add_argument("--seed", type=int, default=42)
+    replay.add_argument("--output", help="Results file (default: benchmarks/replay-<timestamp>.json)")
+
+    comparison = subparsers.add_parser("compare", help="Compare two saved runs and flag regressions")
+    comparison.add_argument("baseline")
+    comparison.add_argument("candidate")
+    comparison.add_argument("--threshold", type=float, default=0.10, help="Allowed relative slowdown (default: 0.10)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.command != "compare" and not getattr(args, "url", None):
+        # Kept until exit; the app holds the history log open
+        state_dir = tempfile.TemporaryDirectory(prefix="vlms-benchmark-")
+        isolate_app_state(state_dir.name)
+    if args.command == "load":
+        save_results("load", run_load_test(args), args.output)
+    elif args.command == "micro":
+        save_results("micro", run_micro(args), args.output)
+    elif args.command == "replay":
+        save_results("replay", run_replay(args), args.output)
+    else:
+        compare(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""Feature encoder shared by dataset generation, training and serving.
+
+A FeatureEncoder turns vehicle records into model features: the vehicle type
+one-hot encoded through a fixed lookup table (category -> column), followed by
+the numerical features standardized with the mean and scale fitted on the
+training data. The category order, the column names and the scaling
+parameters live in this one object, which is saved with the model (as
+vehicle_load_encoder.json next to the pickles and inside the model bundle
+manifest), so training and serving cannot drift apart.
+
+Unknown categories are rejected before anything is encoded. Features are
+written into a caller-supplied (or reusable per-thread) output buffer and
+scaled in place, so encoding a request allocates no DataFrames and no
+temporary arrays.
+"""
+import json
+import threading
+
+import numpy as np
+
+encoder_filename = "vehicle_load_encoder.json"
+
+# Vehicle types, in the order used for one-hot encoding
+vehicle_types = ["2-wheeler", "4-wheeler 5-seater", "4-wheeler 7-seater", "delivery vehicle", "heavy vehicle"]
+# Numerical features that get standardized
+numerical_features = ['weight', 'max_load_capacity', 'passenger_count', 'cargo_weight']
+
+
+class FeatureEncoder:
+    """One-hot category lookup plus standard scaling, fitted once and shared by training and serving."""
+
+    def __init__(self, categories=vehicle_types, numeric_columns=numerical_features, category_column="vehicle_type"):
+        self.categories = list(categories)
+        self.numeric_columns = list(numeric_columns)
+        self.category_column = category_column
+        self.category_index = {category: position for position, category in enumerate(self.categories)}
+        # Running statistics, merged batch by batch like StandardScaler.partial_fit
+        self.samples_seen = 0
+        self.mean = np.zeros(len(self.numeric_columns))
+        self.variance = np.zeros(len(self.numeric_columns))
+        self.scale = np.ones(len(self.numeric_columns))
+        self._buffers = threading.local()
+
+    @property
+    def one_hot_columns(self):
+        return [f"{self.category_column}_{category}" for category in self.categories]
+
+    @property
+    def scaled_columns(self):
+        return [f"{column}_scaled" for column in self.numeric_columns]
+
+    @property
+    def feature_names(self):
+        return self.one_hot_columns + self.scaled_columns
+
+    @property
+    def n_features(self):
+        return len(self.categories) + len(self.numeric_columns)
+
+    def partial_fit(self, numerical):
+        """Updates the scaling statistics with a batch of raw numerical rows. Returns self."""
+        numerical = np.asarray(numerical, dtype=np.float64)
+        batch_count = numerical.shape[0]
+        if not batch_count:
+            return self
+        batch_mean = numerical.mean(axis=0)
+        batch_variance = numerical.var(axis=0)
+        total = self.samples_seen + batch_count
+        delta = batch_mean - self.mean
+        self.variance = (self.variance * self.samples_seen + batch_variance * batch_count
+                         + delta ** 2 * self.samples_seen * batch_count / total) / total
+        self.mean = self.mean + delta * batch_count / total
+        self.samples_seen = total
+        scale = np.sqrt(self.variance)
+        # Constant columns are left unscaled, as StandardScaler does
+        self.scale = np.where(scale == 0.0, 1.0, scale)
+        return self
+
+    def codes(self, values):
+        """Maps category values to one-hot column indices. Raises ValueError on an unknown category."""
+        lookup = self.category_index
+        try:
+            return np.fromiter((lookup[value] for value in values), dtype=np.intp)
+        except (KeyError, TypeError):
+            unknown = next(value for value in values if not isinstance(value, str) or value not in lookup)
+            raise ValueError(f"Unknown {self.category_column.replace('_', ' ')}: {unknown}")
+
+    def transform_codes(self, codes, numerical, out=None):
+        """Encodes category codes and raw numerical rows into out (allocated when None) and returns it."""
+        rows = len(codes)
+        out = self._output(rows, out)
+        width = len(self.categories)
+        out[:, :width] = 0.0
+        out[np.arange(rows), codes] = 1.0
+        self.scale_numerical(numerical, out[:, width:])
+        return out
+
+    def scale_numerical(self, numerical, out=None):
+        """Standardizes raw numerical rows into out (allocated when None) and returns it."""
+        if out is None:
+            out = np.empty((len(numerical), len(self.numeric_columns)))
+        out[...] = numerical
+        # (x - mean) / scale in place, exactly as StandardScaler.transform computes it
+        np.subtract(out, self.mean, out=out)
+        np.divide(out, self.scale, out=out)
+        return out
+
+    def transform(self, records, out=None):
+        """Encodes a list of record dicts (category and numerical fields) into out and returns it."""
+        codes = self.codes([record[self.category_column] for record in records])
+        out = self._output(len(records), out)
+        out[:, len(self.categories):] = [[record[column] for column in self.numeric_columns] for record in records]
+        return self.transform_codes(codes, out[:, len(self.categories):], out)
+
+    def buffer(self, rows):
+        """Returns a reusable (rows x n_features) buffer owned by the calling thread.
+
+        The contents are only valid until the thread's next call to buffer().
+        """
+        buffer = getattr(self._buffers, "array", None)
+        if buffer is None or buffer.shape[0] < rows:
+            buffer = self._buffers.array = np.empty((max(rows, 64), self.n_features))
+        return buffer[:rows]
+
+    def check_feature_names(self, feature_names):
+        """Raises ValueError unless a model's expected feature order matches this encoder."""
+        if list(feature_names) != self.feature_names:
+            raise ValueError(f"Model feature order {list(feature_names)} does not match the encoder's {self.feature_names}")
+
+    def to_dict(self):
+        return {
+            "category_column": self.category_column,
+            "categories": self.categories,
+            "numeric_columns": self.numeric_columns,
+            "samples_seen": self.samples_seen,
+            "mean": self.mean.tolist(),
+            "variance": self.variance.tolist(),
+            "scale": self.scale.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        encoder = cls(data["categories"], data["numeric_columns"], data["category_column"])
+        encoder.samples_seen = data["samples_seen"]
+        encoder.mean = np.array(data["mean"], dtype=np.float64)
+        encoder.variance = np.array(data["variance"], dtype=np.float64)
+        encoder.scale = np.array(data["scale"], dtype=np.float64)
+        if not (encoder.mean.shape == encoder.scale.shape == (len(encoder.numeric_columns),)):
+            raise ValueError("Encoder scaling parameters do not match its numeric columns")
+        return encoder
+
+    def save(self, path=encoder_filename):
+        with open(path, "w") as encoder_file:
+            json.dump(self.to_dict(), encoder_file, indent=2)
+
+    @classmethod
+    def load(cls, path=encoder_filename):
+        with open(path) as encoder_file:
+            return cls.from_dict(json.load(encoder_file))
+
+    def _output(self, rows, out):
+        if out is None:
+            return np.empty((rows, self.n_features))
+        if out.shape != (rows, self.n_features):
+            raise ValueError(f"Output buffer has shape {out.shape}, expected {(rows, self.n_features)}")
+        return out
@@ -0,0 +1,129 @@
+"""Fleet-scale cargo assignment.
+
+Assigns N cargo loads to M vehicles so that no vehicle ends up overloaded,
+using the same overload rule as /predict (weight + passengers x 75 + cargo
+against max_load_capacity). The heuristic is best-fit decreasing: loads are
+placed heaviest first into the vehicle with the least remaining capacity that
+still fits them. Remaining capacities are kept in a sorted list, so finding
+the best fit is a bisection and each placement costs O(log M) comparisons
+plus a short list move, which handles tens of thousands of loads well under
+a second.
+"""
+import math
+import time
+from bisect import bisect_right
+
+from load_rules import total_load
+
+
+def _number(value, field, minimum=0):
+    if isinstance(value, bool):
+        raise ValueError(f"Field '{field}' must be a number")
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Field '{field}' must be a number")
+    # Rejects "nan" and "inf" too, which would otherwise come back as invalid JSON
+    if not math.isfinite(number):
+        raise ValueError(f"Field '{field}' must be a finite number")
+    if number < minimum:
+        raise ValueError(f"Field '{field}' must be at least {minimum}")
+    return number
+
+def _item_id(item, position, field):
+    """Returns the item's id (its position when it has none); ids must be strings or integers."""
+    item_id = item.get("id", position)
+    if isinstance(item_id, bool) or not isinstance(item_id, (str, int)):
+        raise ValueError(f"Field '{field}[{position}].id' must be a string or an integer")
+    return item_id
+
+def parse_loads(loads):
+    """Validates cargo loads ([{"id", "weight"}]) and returns (id, weight) pairs."""
+    if not isinstance(loads, list):
+        raise ValueError("'loads' must be a list")
+    parsed = []
+    seen = set()
+    for position, load in enumerate(loads):
+        if not isinstance(load, dict) or "weight" not in load:
+            raise ValueError(f"Load {position} must be an object with a 'weight'")
+        load_id = _item_id(load, position, "loads")
+        if load_id in seen:
+            raise ValueError(f"Duplicate load id: {load_id}")
+        seen.add(load_id)
+        parsed.append((load_id, _number(load["weight"], f"loads[{position}].weight")))
+    return parsed
+
+def parse_vehicles(vehicles):
+    """Validates vehicles and returns (id, remaining capacity) pairs.
+
+    Each vehicle needs weight and max_load_capacity; passenger_count and
+    cargo_weight (the load it already carries) default to 0.
+    """
+    if not isinstance(vehicles, list):
+        raise ValueError("'vehicles' must be a list")
+    parsed = []
+    seen = set()
+    for position, vehicle in enumerate(vehicles):
+        if not isinstance(vehicle, dict) or "weight" not in vehicle or "max_load_capacity" not in vehicle:
+            raise ValueError(f"Vehicle {position} must be an object with 'weight' and 'max_load_capacity'")
+        vehicle_id = _item_id(vehicle, position, "vehicles")
+        if vehicle_id in seen:
+            raise ValueError(f"Duplicate vehicle id: {vehicle_id}")
+        seen.add(vehicle_id)
+        current_load = total_load(_number(vehicle["weight"], f"vehicles[{position}].weight"),
+                                  _number(vehicle.get("passenger_count", 0), f"vehicles[{position}].passenger_count"),
+                                  _number(vehicle.get("cargo_weight", 0), f"vehicles[{position}].cargo_weight"))
+        capacity = _number(vehicle["max_load_capacity"], f"vehicles[{position}].max_load_capacity")
+        parsed.append((vehicle_id, capacity - current_load))
+    return parsed
+
+def assign_loads(loads, vehicles):
+    """Assigns loads to vehicles without overloading any of them.
+
+    loads is a list of (load id, weight) and vehicles a list of (vehicle id,
+    remaining capacity). Returns a dict with the assignment, a per-vehicle
+    summary, the loads that fit nowhere and the vehicles that were already
+    overloaded before any cargo was assigned.
+    """
+    start = time.perf_counter()
+    # Remaining capacities kept sorted as negated values, with the matching vehicle positions
+    # in a parallel list. The best fit (smallest capacity that still fits) then sits near the
+    # end of the list, and so does its new position, which keeps the list moves short.
+    keys = []
+    owners = []
+    overloaded = []
+    for position, (vehicle_id, remaining) in sorted(enumerate(vehicles), key=lambda item: item[1][1], reverse=True):
+        if remaining < 0:
+            overloaded.append(vehicle_id)
+        keys.append(-remaining)
+        owners.append(position)
+
+    assigned = [[] for _ in vehicles]
+    final_remaining = [remaining for _, remaining in vehicles]
+    assignments = []
+    unassigned = []
+    for load_id, weight in sorted(loads, key=lambda load: load[1], reverse=True):
+        slot = bisect_right(keys, -weight) - 1
+        if slot < 0:
+            unassigned.append(load_id)
+            continue
+        key = keys.pop(slot) + weight
+        position = owners.pop(slot)
+        slot = bisect_right(keys, key)
+        keys.insert(slot, key)
+        owners.insert(slot, position)
+        assigned[position].append(load_id)
+        final_remaining[position] = -key
+        assignments.append({"load_id": load_id, "vehicle_id": vehicles[position][0]})
+
+    return {
+        "assignments": assignments,
+        "vehicles": [
+            {"vehicle_id": vehicle_id, "load_ids": assigned[position],
+             "remaining_capacity": round(final_remaining[position], 3)}
+            for position, (vehicle_id, _) in enumerate(vehicles)
+        ],
+        "unassigned": unassigned,
+        "overloaded_vehicles": overloaded,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 3),
+    }
@@ -0,0 +1,161 @@
+"""Lightweight in-process inference engine for the trained RandomForestClassifier.
+
+The forest is flattened into a handful of NumPy arrays (one row per tree node,
+all trees concatenated), so prediction is a pure-array walk that never builds
+a DataFrame. It takes the features produced by the shared FeatureEncoder.
+Predictions are identical to sklearn's: inputs are cast to float32 like
+sklearn's tree code, and per-tree class probabilities are averaged in the
+same order.
+
+model_bundle.py stores the arrays on disk. Run this module directly to check
+the current bundle against the pickled model and print microbenchmarks for
+batches of 1 to 10000 rows.
+"""
+import numpy as np
+
+# Rows scored per traversal pass; small blocks keep the (trees x rows) working arrays in cache
+_block_size = 256
+# Levels walked between dropping the (tree, row) pairs that have reached their leaf
+_compact_every = 4
+
+
+class CompiledForest:
+    """A RandomForestClassifier flattened into NumPy arrays."""
+
+    def __init__(self, feature, threshold, children_left, children_right, leaf_value,
+                 roots, max_depth, classes):
+        self.feature = feature
+        self.threshold = threshold
+        self.children_left = children_left
+        self.children_right = children_right
+        self.leaf_value = leaf_value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.classes = classes
+        # Both children of node n at 2n (right) and 2n + 1 (left), so one lookup takes the branch
+        self._children = np.empty(2 * children_left.shape[0], dtype=np.intp)
+        self._children[0::2] = children_right
+        self._children[1::2] = children_left
+
+    def predict(self, X):
+        """Predicts class labels for encoded feature rows."""
+        return self.classes[np.argmax(self.predict_proba(X), axis=1)]
+
+    def predict_proba(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        # sklearn evaluates trees on float32 input
+        X = X.astype(np.float32)
+        proba = np.empty((X.shape[0], self.classes.shape[0]))
+        for start in range(0, X.shape[0], _block_size):
+            block = X[start:start + _block_size]
+            leaves = self._leaves(block)
+            # Accumulate tree by tree, as RandomForestClassifier.predict_proba does
+            proba[start:start + block.shape[0]] = np.add.reduce(self.leaf_value[leaves], axis=0) / self.roots.shape[0]
+        return proba
+
+    def _leaves(self, X):
+        # Every (tree, row) pair walks down from its tree's root. Leaves point back
+        # to themselves, so a pair that reached its leaf stays there; every few
+        # levels those pairs are dropped, and the walk ends when none is left.
+        rows, columns = X.shape
+        values = np.ascontiguousarray(X).ravel()
+        nodes = np.repeat(self.roots.astype(np.intp), rows)
+        offsets = np.tile(np.arange(0, rows * columns, columns), self.roots.shape[0])
+        leaves = np.empty_like(nodes)
+        walking = None  # Positions in leaves of the pairs still walking; None while that is all of them
+        level = 0
+        while True:
+            moved = self._children[2 * nodes + (values[offsets + self.feature[nodes]] <= self.threshold[nodes])]
+            level += 1
+            if level % _compact_every:
+                nodes = moved
+                continue
+            not_done = moved != nodes
+            if walking is None:
+                leaves[:] = moved
+                walking = np.flatnonzero(not_done)
+            else:
+                leaves[walking] = moved
+                walking = walking[not_done]
+            if not walking.size:
+                return leaves.reshape(-1, rows)
+            nodes, offsets = moved[not_done], offsets[not_done]
+
+
+def compile_forest(model):
+    """Flattens a fitted RandomForestClassifier into a CompiledForest."""
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    max_depth = 0
+    node_offset = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        node_ids = np.arange(tree.node_count)
+        is_leaf = tree.children_left == -1
+        features.append(np.where(is_leaf, 0, tree.feature))
+        thresholds.append(np.where(is_leaf, 0.0, tree.threshold))
+        lefts.append(np.where(is_leaf, node_ids, tree.children_left) + node_offset)
+        rights.append(np.where(is_leaf, node_ids, tree.children_right) + node_offset)
+        # Same normalization as DecisionTreeClassifier.predict_proba
+        value = tree.value[:, 0, :model.n_classes_].astype(np.float64)
+        normalizer = value.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+        values.append(value / normalizer)
+        roots.append(node_offset)
+        max_depth = max(max_depth, tree.max_depth)
+        node_offset += tree.node_count
+
+    return CompiledForest(
+        feature=np.concatenate(features).astype(np.int32),
+        threshold=np.concatenate(thresholds).astype(np.float64),
+        children_left=np.concatenate(lefts).astype(np.int32),
+        children_right=np.concatenate(rights).astype(np.int32),
+        leaf_value=np.concatenate(values),
+        roots=np.array(roots, dtype=np.int32),
+        max_depth=max_depth,
+        classes=np.asarray(model.classes_).astype(str),
+    )
+
+
+def main():
+    import os
+    import pickle
+    import timeit
+    import pandas as pd
+    from feature_encoder import FeatureEncoder
+    from model_bundle import load_bundle
+
+    with open("vehicle_load_model.pkl", "rb") as model_file:
+        model = pickle.load(model_file)
+    engine, manifest = load_bundle()
+    encoder = FeatureEncoder.from_dict(manifest["encoder"])
+    print(f"Loaded model bundle version {manifest['version']}")
+
+    df = pd.read_csv("vehicle_data.csv")
+    codes = df[encoder.one_hot_columns].to_numpy().argmax(axis=1)
+    numerical = df[encoder.numeric_columns].to_numpy(np.float64)
+
+    def sklearn_predict(rows):
+        return model.predict(encoder.transform_codes(codes[rows], numerical[rows]))
+
+    def engine_predict(rows):
+        return engine.predict(encoder.transform_codes(codes[rows], numerical[rows]))
+
+    every_row = slice(None)
+    print(f"Predictions identical on {len(df)} rows: {np.array_equal(sklearn_predict(every_row), engine_predict(every_row))}")
+
+    # app.py hands batches of at least this many rows to the pickled forest the bundle was compiled from (0: never)
+    sklearn_batch_rows = int(os.environ.get("VLMS_SKLEARN_BATCH_ROWS", 0))
+    for size, repeat in [(1, 200), (100, 50), (1000, 10), (10000, 3)]:
+        rows = slice(0, size)
+        sklearn_time = min(timeit.repeat(lambda: sklearn_predict(rows), number=1, repeat=repeat))
+        engine_time = min(timeit.repeat(lambda: engine_predict(rows), number=1, repeat=repeat))
+        served_time = sklearn_time if 0 < sklearn_batch_rows <= size else engine_time
+        print(f"batch of {size}: sklearn {sklearn_time * 1e3:.3f} ms, compiled {engine_time * 1e3:.3f} ms "
+              f"({sklearn_time / engine_time:.1f}x), served {served_time * 1e3:.3f} ms "
+              f"({sklearn_time / served_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
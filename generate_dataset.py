@@ -1,116 +1,195 @@
-# Import necessary libraries for data manipulation, numerical operations, randomization, and file operations
-import pandas as pd  # Data manipulation and analysis library
-import numpy as np  # Numerical computing library
-import random  # Random number and selection generation
+# Import necessary libraries for numerical operations, data manipulation, and file operations
+import argparse  # Command line options
 import os  # Operating system interactions for file and path operations
+import numpy as np  # Numerical computing library (vectorized random generation)
+import pandas as pd  # Data manipulation and analysis library
+from feature_encoder import FeatureEncoder, vehicle_types, numerical_features  # Encoding shared with training and serving
+from load_rules import dataset_overload_status  # The label rule, shared with retraining exports
 
-# Import specialized libraries for machine learning preprocessing
-from imblearn.over_sampling import SMOTE  # Synthetic Minority Over-sampling Technique for balancing datasets
-from sklearn.preprocessing import StandardScaler  # Feature scaling utility
-
-# Define the filename for the generated dataset
+# Define the default filename for the generated dataset
 dataset_filename = "vehicle_data.csv"
 
-# Check if the dataset file already exists to avoid regenerating
-if not os.path.exists(dataset_filename):
-    # Set the number of entries to generate in the dataset
-    num_entries = 10000
-    # Initialize an empty list to store generated data
-    data = []
-
-    # Generate synthetic vehicle data entries
-    for _ in range(num_entries):
-        # Randomly select a vehicle type with equal probability
-        vehicle_type = random.choice(["2-wheeler", "4-wheeler 5-seater", "4-wheeler 7-seater", "delivery vehicle", "heavy vehicle"])
-
-        # Generate data specific to each vehicle type with realistic constraints
-        if vehicle_type == "2-wheeler":
-            max_capacity = random.randint(200, 350)  # Maximum load capacity range
-            empty_weight = random.randint(80, 120)  # Vehicle's base weight
-            passenger_count = random.randint(1, 2)  # Number of passengers
-            passenger_weight = passenger_count * 75  # Assume 75kg per passenger
-            cargo_weight = random.randint(0, 50)  # Cargo weight range
-        elif vehicle_type == "4-wheeler 5-seater":
-            max_capacity = random.randint(800, 1200)
-            empty_weight = random.randint(600, 800)
-            passenger_count = random.randint(1, 5)
-            passenger_weight = passenger_count * 75
-            cargo_weight = random.randint(0, 150)
-        elif vehicle_type == "4-wheeler 7-seater":
-            max_capacity = random.randint(1000, 1500)
-            empty_weight = random.randint(800, 1000)
-            passenger_count = random.randint(1, 7)
-            passenger_weight = passenger_count * 75
-            cargo_weight = random.randint(0, 200)
-        elif vehicle_type == "delivery vehicle":
-            max_capacity = random.randint(1500, 2500)
-            empty_weight = random.randint(1000, 1500)
-            passenger_count = random.randint(1, 2)
-            passenger_weight = passenger_count * 75
-            cargo_weight = random.randint(0, 500)
-        elif vehicle_type == "heavy vehicle":
-            max_capacity = random.randint(10000, 30000)
-            empty_weight = random.randint(5000, 10000)
-            passenger_count = random.randint(1, 3)
-            passenger_weight = passenger_count * 75
-            cargo_weight = random.randint(0, max_capacity)
-
-        # Calculate total vehicle weight
-        weight = empty_weight + passenger_weight + cargo_weight
-        # Determine overload status based on weight exceeding max capacity
-        overload_status = "Overloaded" if weight > max_capacity else "Not Overloaded"
-        # Append generated data to the list
-        data.append([vehicle_type, weight, max_capacity, passenger_count, cargo_weight, overload_status])
-
-    # Convert generated data to a pandas DataFrame
-    df = pd.DataFrame(data, columns=["vehicle_type", "weight", "max_load_capacity", "passenger_count", "cargo_weight", "overload_status"])
-
-    # Perform initial data quality checks
-    print("NaNs in df (original):", df.isnull().any().any())  # Check for any NaN values
-    print("NaNs per column in df (original):\n", df.isnull().sum())  # Count NaNs per column
-    print("Data types in df (original):\n", df.dtypes)  # Display column data types
-
-    # Define numerical features for standardization
-    numerical_features = ['weight', 'max_load_capacity', 'passenger_count', 'cargo_weight']
-    # Initialize StandardScaler for feature normalization
-    scaler = StandardScaler()
+# One-hot vehicle type columns, in the encoder's fixed order
+one_hot_columns = FeatureEncoder().one_hot_columns
+# Assume 75kg per passenger
+passenger_weight = 75
+
+# Per-vehicle-type generation parameters, one row per entry in vehicle_types.
+# Each row is an inclusive (low, high) range for the realistic constraints of that vehicle type.
+max_capacity_range = np.array([[200, 350], [800, 1200], [1000, 1500], [1500, 2500], [10000, 30000]])  # Maximum load capacity
+empty_weight_range = np.array([[80, 120], [600, 800], [800, 1000], [1000, 1500], [5000, 10000]])  # Vehicle's base weight
+passenger_range = np.array([[1, 2], [1, 5], [1, 7], [1, 2], [1, 3]])  # Number of passengers
+cargo_range = np.array([[0, 50], [0, 150], [0, 200], [0, 500], [0, -1]])  # Cargo weight; -1 means up to the vehicle's max capacity
+
+
+def generate_chunk(num_rows, rng):
+    """Generates num_rows synthetic vehicles in one vectorized pass."""
+    # Randomly select a vehicle type with equal probability
+    type_codes = rng.integers(0, len(vehicle_types), size=num_rows)
+
+    # Draw every field from the parameter row of each vehicle's type
+    max_capacity = rng.integers(max_capacity_range[type_codes, 0], max_capacity_range[type_codes, 1], endpoint=True)
+    empty_weight = rng.integers(empty_weight_range[type_codes, 0], empty_weight_range[type_codes, 1], endpoint=True)
+    passenger_count = rng.integers(passenger_range[type_codes, 0], passenger_range[type_codes, 1], endpoint=True)
+    cargo_high = np.where(cargo_range[type_codes, 1] < 0, max_capacity, cargo_range[type_codes, 1])
+    cargo_weight = rng.integers(cargo_range[type_codes, 0], cargo_high, endpoint=True)
+
+    # Calculate total vehicle weight
+    weight = empty_weight + passenger_count * passenger_weight + cargo_weight
+    # Determine overload status based on weight exceeding max capacity
+    overload_status = dataset_overload_status(weight, max_capacity)
+
+    return pd.DataFrame({
+        "vehicle_type": pd.Categorical.from_codes(type_codes, categories=vehicle_types),
+        "weight": weight,
+        "max_load_capacity": max_capacity,
+        "passenger_count": passenger_count,
+        "cargo_weight": cargo_weight,
+        "overload_status": overload_status,
+    })
+
+
+def balance_chunk(X, y, random_state):
+    """Applies SMOTE to one chunk and samples it back down to its original size."""
+    # Import lazily so the generator also works without imbalanced-learn when SMOTE is disabled
+    from imblearn.over_sampling import SMOTE  # Synthetic Minority Over-sampling Technique for balancing datasets
+
+    try:
+        X_resampled, y_resampled = SMOTE(random_state=random_state).fit_resample(X, y)
+    except ValueError as e:
+        # Too few minority samples in this chunk for SMOTE's nearest neighbours
+        print(f"Skipping SMOTE for a chunk of {len(X)} rows: {e}")
+        return X, y
+    # SMOTE interpolates the one-hot columns too; snap each row back to its nearest vehicle type
+    codes = X_resampled[one_hot_columns].to_numpy(np.float64).argmax(axis=1)
+    X_resampled[one_hot_columns] = np.eye(len(one_hot_columns), dtype=bool)[codes]
+    # Keep the original column types (SMOTE interpolates in floating point)
+    X_resampled = X_resampled.astype(X.dtypes.to_dict())
+    # Randomly sample to keep the chunk size unchanged
+    sample = np.random.default_rng(random_state).choice(len(X_resampled), size=len(X), replace=False)
+    return X_resampled.iloc[sample].reset_index(drop=True), y_resampled.iloc[sample].reset_index(drop=True)
+
+
+def build_chunk(num_rows, seed_sequence, smote):
+    """Builds one chunk of model-ready features. The same seed sequence always gives the same chunk."""
+    rng = np.random.default_rng(seed_sequence)
+    df = generate_chunk(num_rows, rng)
 
     # Separate features (X) and target variable (y)
     X = df.drop("overload_status", axis=1)
     y = df["overload_status"]
 
-    # Perform one-hot encoding on categorical 'vehicle_type' column
-    X = pd.get_dummies(X, columns=["vehicle_type"])
-
-    # Apply SMOTE to balance the dataset and address class imbalance
-    smote = SMOTE(random_state=42)  # Use fixed random state for reproducibility
-    X_resampled, y_resampled = smote.fit_resample(X, y)
-
-    # Scale numerical features after SMOTE resampling
-    X_numerical_resampled = X_resampled[numerical_features]
-    X_scaled_resampled = scaler.fit_transform(X_numerical_resampled)
-    # Create a new DataFrame with scaled features
-    X_scaled_resampled_df = pd.DataFrame(X_scaled_resampled, columns=[f"{col}_scaled" for col in numerical_features], index=X_resampled.index)
-
-    # Concatenate original and scaled features
-    X_resampled = pd.concat([X_resampled, X_scaled_resampled_df], axis=1)
-
-    # Combine resampled features and target variable
-    df_balanced = pd.concat([X_resampled, y_resampled], axis=1)
-
-    # Randomly sample to ensure consistent dataset size
-    df_balanced = df_balanced.sample(n=10000, random_state=42, replace=False)
-
-    # Perform final data quality checks before saving
-    print("NaNs in df_balanced before saving:", df_balanced.isnull().any().any())  # Check for any NaN values
-    print("NaNs per column in df_balanced before saving:\n", df_balanced.isnull().sum())  # Count NaNs per column
-    print("Data types in df_balanced before saving:\n", df_balanced.dtypes)  # Display column data types
-
-    # Save the balanced and standardized dataset to a CSV file
-    df_balanced.to_csv(dataset_filename, index=False)
-    # Print confirmation message with dataset details
-    print(f"Balanced and standardized dataset '{dataset_filename}' created with {len(df_balanced)} rows.")
-
-else:
-    # If dataset already exists, print a message and skip generation
-    print(f"Dataset '{dataset_filename}' already exists. Skipping data generation.")
\ No newline at end of file
+    # One-hot encode 'vehicle_type' through the fixed column lookup (all categories, even if absent from the chunk)
+    codes = X.pop("vehicle_type").cat.codes.to_numpy()
+    one_hot = np.zeros((len(X), len(one_hot_columns)), dtype=bool)
+    one_hot[np.arange(len(X)), codes] = True
+    X = pd.concat([X, pd.DataFrame(one_hot, columns=one_hot_columns)], axis=1)
+
+    if smote:
+        # Balance the chunk to address class imbalance
+        X, y = balance_chunk(X, y, random_state=int(seed_sequence.generate_state(1)[0]))
+    return X, y
+
+
+def chunk_sizes(num_rows, chunk_size):
+    """Splits num_rows into chunks of at most chunk_size rows."""
+    return [min(chunk_size, num_rows - start) for start in range(0, num_rows, chunk_size)]
+
+
+class DatasetWriter:
+    """Writes chunks to a temporary CSV or Parquet file and moves it into place when closed."""
+
+    def __init__(self, path):
+        self.path = path
+        self.temp_path = f"{path}.tmp-{os.getpid()}"
+        self.parquet = path.endswith(".parquet")
+        self._writer = None
+        self._rows = 0
+
+    def write(self, df):
+        if self.parquet:
+            # Import lazily: pyarrow is only needed for Parquet output
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.temp_path, table.schema)
+            self._writer.write_table(table)
+        else:
+            df.to_csv(self.temp_path, mode="w" if self._rows == 0 else "a", header=self._rows == 0, index=False)
+        self._rows += len(df)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        os.replace(self.temp_path, self.path)
+        return self._rows
+
+
+def generate_dataset(path, num_rows, seed=None, chunk_size=100_000, smote=True, scale=True):
+    """Generates the dataset chunk by chunk, so memory stays bounded by chunk_size."""
+    sizes = chunk_sizes(num_rows, chunk_size)
+    # One child seed per chunk makes every chunk reproducible on its own
+    seed_sequences = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    encoder = None
+    if scale:
+        # First pass: fit the encoder's scaling incrementally over every chunk
+        encoder = FeatureEncoder()
+        for size, seed_sequence in zip(sizes, seed_sequences):
+            X, _ = build_chunk(size, seed_sequence, smote)
+            encoder.partial_fit(X[numerical_features].to_numpy(np.float64))
+
+    # Second pass: regenerate each chunk (identically, from its seed), scale it and write it out
+    writer = DatasetWriter(path)
+    class_counts = {}
+    try:
+        for size, seed_sequence in zip(sizes, seed_sequences):
+            X, y = build_chunk(size, seed_sequence, smote)
+            if encoder is not None:
+                X_scaled = encoder.scale_numerical(X[numerical_features].to_numpy(np.float64))
+                # Add the scaled features next to the original ones
+                X = pd.concat([X, pd.DataFrame(X_scaled, columns=encoder.scaled_columns)], axis=1)
+            # Combine features and target variable
+            chunk = pd.concat([X, y], axis=1)
+            # Perform data quality checks before saving
+            if chunk.isnull().any().any():
+                raise ValueError(f"NaNs in generated chunk:\n{chunk.isnull().sum()}")
+            for label, count in y.value_counts().items():
+                class_counts[label] = class_counts.get(label, 0) + int(count)
+            writer.write(chunk)
+    except BaseException:
+        # Remove the partial temporary file on any failure
+        if os.path.exists(writer.temp_path):
+            os.remove(writer.temp_path)
+        raise
+    rows = writer.close()
+    return rows, class_counts
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate the synthetic vehicle load dataset.")
+    parser.add_argument("--rows", type=int, default=10000, help="Number of rows to generate (default: 10000)")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for reproducible datasets")
+    parser.add_argument("--chunk-size", type=int, default=100_000, help="Rows generated and written per chunk")
+    parser.add_argument("--output", default=dataset_filename, help="Output file; a .parquet extension writes Parquet (needs pyarrow)")
+    parser.add_argument("--no-smote", dest="smote", action="store_false", help="Skip SMOTE balancing")
+    parser.add_argument("--no-scale", dest="scale", action="store_false", help="Skip writing the *_scaled columns")
+    parser.add_argument("--force", action="store_true", help="Overwrite the output file if it already exists")
+    args = parser.parse_args()
+    if args.rows <= 0 or args.chunk_size <= 0:
+        parser.error("--rows and --chunk-size must be positive")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    # Check if the dataset file already exists to avoid regenerating
+    if os.path.exists(args.output) and not args.force:
+        # If dataset already exists, print a message and skip generation
+        print(f"Dataset '{args.output}' already exists. Skipping data generation (use --force to overwrite).")
+    else:
+        rows, class_counts = generate_dataset(args.output, args.rows, seed=args.seed, chunk_size=args.chunk_size,
+                                              smote=args.smote, scale=args.scale)
+        # Print confirmation message with dataset details
+        print(f"Dataset '{args.output}' created with {rows} rows. Class counts: {class_counts}")
@@ -2,11 +2,34 @@ import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import seaborn as sns
+import numpy as np
+import pandas as pd
+import argparse
+import hashlib
+import json
 import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def generate_histogram(df, column, title, save_path):
+def save_figure(fig, save_path, dpi=None):
+    """Saves a figure atomically: it is written to a temporary file and moved into place.
+
+    Readers never see a half-written image. The format follows the file
+    extension (e.g. .png or .webp); dpi=None keeps the figure's own DPI.
+    """
+    directory, filename = os.path.split(save_path)
+    stem, extension = os.path.splitext(filename)
+    temp_path = os.path.join(directory, f".{stem}.{os.getpid()}.tmp{extension}")
+    try:
+        fig.savefig(temp_path, dpi=dpi or 'figure')
+        os.replace(temp_path, save_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def generate_histogram(df, column, title, save_path, dpi=None):
     """Generates a histogram for a given column in a DataFrame."""
     try:
         plt.figure(figsize=(10, 6))
@@ -14,7 +37,7 @@ def generate_histogram(df, column, title, save_path):
         plt.title(title)
         plt.xlabel(column.replace('_', ' ').title())  # Format the x-axis label
         plt.ylabel("Frequency")
-        plt.savefig(save_path)
+        save_figure(plt.gcf(), save_path, dpi)
         plt.close()
         logging.info(f"Histogram generated and saved to {save_path}")
         return True  # Indicate success
@@ -22,14 +45,14 @@ def generate_histogram(df, column, title, save_path):
         logging.error(f"Error generating histogram: {e}")
         return False  # Indicate failure
 
-def generate_boxplot(df, column, title, save_path):
+def generate_boxplot(df, column, title, save_path, dpi=None):
     """Generates a boxplot for a given column in a DataFrame."""
     try:
         plt.figure(figsize=(10, 6))
         sns.boxplot(x=df[column])
         plt.title(title)
         plt.xlabel(column.replace('_', ' ').title())  # Format the x-axis label
-        plt.savefig(save_path)
+        save_figure(plt.gcf(), save_path, dpi)
         plt.close()
         logging.info(f"Boxplot generated and saved to {save_path}")
         return True  # Indicate success
@@ -37,7 +60,7 @@ def generate_boxplot(df, column, title, save_path):
         logging.error(f"Error generating boxplot: {e}")
         return False  # Indicate failure
 
-def generate_scatter_plot(df, x_col, y_col, title, path):
+def generate_scatter_plot(df, x_col, y_col, title, path, dpi=None):
     """Generates a scatter plot and saves it to a file."""
     try:
         plt.figure(figsize=(8, 6))
@@ -45,39 +68,42 @@ def generate_scatter_plot(df, x_col, y_col, title, path):
         plt.title(title)
         plt.xlabel(x_col.replace('_', ' ').title())
         plt.ylabel(y_col.replace('_', ' ').title())
-        plt.savefig(path)
+        save_figure(plt.gcf(), path, dpi)
         plt.close()
         logging.info(f"Scatter plot generated and saved to {path}")
+        return True
     except Exception as e:
         logging.error(f"Error generating scatter plot: {e}")
+        return False
 
-def generate_heatmap(df, title, path):
+def generate_heatmap(df, title, path, dpi=None):
     """Generates a heatmap and saves it to a file."""
     try:
         plt.figure(figsize=(10, 8))
         sns.heatmap(df.corr(), annot=True, cmap='viridis')
         plt.title(title)
-        plt.savefig(path)
+        save_figure(plt.gcf(), path, dpi)
         plt.close()
         logging.info(f"Heatmap generated and saved to {path}")
+        return True
     except Exception as e:
         logging.error(f"Error generating heatmap: {e}")
+        return False
 
-def generate_pair_plot(df, title, save_path):
+def generate_pair_plot(df, title, save_path, dpi=None):
     """Generates a pair plot for a DataFrame."""
     try:
-        plt.figure(figsize=(12, 10))
-        sns.pairplot(df)
-        plt.suptitle(title, y=1.02)  # Adjust title position
-        plt.savefig(save_path)
-        plt.close()
-        logging.info(f"Pair plot generated and saved to {save_path}")
-        return True
+        # Drawn with plain matplotlib (plot_pair_grid): sns.pairplot takes twice as long on the same data
+        histograms = {}
+        for column in df.columns:
+            counts, edges = np.histogram(df[column].dropna().to_numpy(dtype=float), bins=20)
+            histograms[column] = {"edges": edges.tolist(), "counts": counts.tolist()}
+        return plot_pair_grid(list(df.columns), histograms, df.to_numpy(dtype=float), title, save_path, dpi)
     except Exception as e:
         logging.error(f"Error generating pair plot: {e}")
         return False
 
-def generate_count_plot(df, column, title, save_path):
+def generate_count_plot(df, column, title, save_path, dpi=None):
     """Generates a count plot for a given column in a DataFrame."""
     try:
         plt.figure(figsize=(10, 6))
@@ -85,10 +111,268 @@ def generate_count_plot(df, column, title, save_path):
         plt.title(title)
         plt.xlabel(column.replace('_', ' ').title())  # Format the x-axis label
         plt.ylabel("Count")
-        plt.savefig(save_path)
+        save_figure(plt.gcf(), save_path, dpi)
         plt.close()
         logging.info(f"Count plot generated and saved to {save_path}")
         return True
     except Exception as e:
         logging.error(f"Error generating count plot: {e}")
-        return False
\ No newline at end of file
+        return False
+
+
+# The functions below draw charts from precomputed aggregates (bin counts, box
+# statistics, samples, correlation matrices) instead of raw DataFrames.
+
+def plot_histogram(edges, counts, title, xlabel, save_path, dpi=None):
+    """Draws a histogram from bin edges and counts."""
+    try:
+        fig, ax = plt.subplots(figsize=(10, 6))
+        ax.bar(edges[:-1], counts, width=np.diff(edges), align='edge', edgecolor='white')
+        ax.set_title(title)
+        ax.set_xlabel(xlabel.replace('_', ' ').title())
+        ax.set_ylabel("Frequency")
+        save_figure(fig, save_path, dpi)
+        plt.close(fig)
+        logging.info(f"Histogram generated and saved to {save_path}")
+        return True
+    except Exception as e:
+        logging.error(f"Error generating histogram: {e}")
+        return False
+
+def plot_boxplot(stats, title, xlabel, save_path, dpi=None):
+    """Draws a horizontal boxplot from quartiles and whisker positions."""
+    try:
+        fig, ax = plt.subplots(figsize=(10, 6))
+        ax.bxp([{"med": stats["median"], "q1": stats["q1"], "q3": stats["q3"],
+                 "whislo": stats["whislo"], "whishi": stats["whishi"], "fliers": []}],
+               vert=False, showfliers=False)
+        ax.set_yticks([])
+        ax.set_title(title)
+        ax.set_xlabel(xlabel.replace('_', ' ').title())
+        save_figure(fig, save_path, dpi)
+        plt.close(fig)
+        logging.info(f"Boxplot generated and saved to {save_path}")
+        return True
+    except Exception as e:
+        logging.error(f"Error generating boxplot: {e}")
+        return False
+
+def plot_scatter(x, y, title, xlabel, ylabel, save_path, dpi=None):
+    """Draws a scatter plot of sampled points."""
+    try:
+        fig, ax = plt.subplots(figsize=(8, 6))
+        ax.scatter(x, y, s=12, alpha=0.6)
+        ax.set_title(title)
+        ax.set_xlabel(xlabel.replace('_', ' ').title())
+        ax.set_ylabel(ylabel.replace('_', ' ').title())
+        save_figure(fig, save_path, dpi)
+        plt.close(fig)
+        logging.info(f"Scatter plot generated and saved to {save_path}")
+        return True
+    except Exception as e:
+        logging.error(f"Error generating scatter plot: {e}")
+        return False
+
+def plot_heatmap(matrix, labels, title, save_path, dpi=None):
+    """Draws a correlation matrix as an annotated heatmap. None entries are left blank."""
+    try:
+        fig, ax = plt.subplots(figsize=(10, 8))
+        values = np.array([[np.nan if value is None else value for value in row] for row in matrix], dtype=float)
+        sns.heatmap(values, annot=True, cmap='viridis', xticklabels=labels, yticklabels=labels, ax=ax)
+        ax.set_title(title)
+        save_figure(fig, save_path, dpi)
+        plt.close(fig)
+        logging.info(f"Heatmap generated and saved to {save_path}")
+        return True
+    except Exception as e:
+        logging.error(f"Error generating heatmap: {e}")
+        return False
+
+def plot_pair_grid(columns, histograms, sample, title, save_path, dpi=None):
+    """Draws a pair plot: per-column histograms on the diagonal, sampled scatter plots elsewhere."""
+    try:
+        size = len(columns)
+        fig, axes = plt.subplots(size, size, figsize=(12, 10), squeeze=False)
+        values = np.array(sample, dtype=float).reshape(-1, size)
+        for row, y_column in enumerate(columns):
+            for col, x_column in enumerate(columns):
+                ax = axes[row][col]
+                if row == col:
+                    edges, counts = histograms[x_column]["edges"], histograms[x_column]["counts"]
+                    if counts:
+                        ax.bar(edges[:-1], counts, width=np.diff(edges), align='edge', edgecolor='white')
+                else:
+                    ax.scatter(values[:, col], values[:, row], s=4, alpha=0.5)
+                if row == size - 1:
+                    ax.set_xlabel(x_column)
+                if col == 0:
+                    ax.set_ylabel(y_column)
+        fig.suptitle(title)
+        fig.tight_layout()
+        save_figure(fig, save_path, dpi)
+        plt.close(fig)
+        logging.info(f"Pair plot generated and saved to {save_path}")
+        return True
+    except Exception as e:
+        logging.error(f"Error generating pair plot: {e}")
+        return False
+
+def plot_counts(labels, counts, title, xlabel, save_path, dpi=None):
+    """Draws a bar chart of category counts."""
+    try:
+        fig, ax = plt.subplots(figsize=(10, 6))
+        ax.bar(labels, counts)
+        ax.set_title(title)
+        ax.set_xlabel(xlabel.replace('_', ' ').title())
+        ax.set_ylabel("Count")
+        save_figure(fig, save_path, dpi)
+        plt.close(fig)
+        logging.info(f"Count plot generated and saved to {save_path}")
+        return True
+    except Exception as e:
+        logging.error(f"Error generating count plot: {e}")
+        return False
+
+# Batch rendering: one DataFrame, a list of chart specs, a process pool and a
+# per-chart cache of input hashes.
+
+# Chart kind -> (DataFrame renderer, spec keys passed to it before the title)
+chart_kinds = {
+    "histogram": (generate_histogram, ["column"]),
+    "boxplot": (generate_boxplot, ["column"]),
+    "scatter_plot": (generate_scatter_plot, ["x_col", "y_col"]),
+    "heatmap": (generate_heatmap, []),
+    "pair_plot": (generate_pair_plot, []),
+    "count_plot": (generate_count_plot, ["column"]),
+}
+
+numeric_columns = ['weight', 'max_load_capacity', 'passenger_count', 'cargo_weight']
+
+# The chart set the app used to draw, for a dataset with the generator's columns
+default_chart_specs = [
+    {"chart": "histogram", "name": "histogram_weight", "column": "weight", "title": "Histogram of Vehicle Weight"},
+    {"chart": "boxplot", "name": "boxplot_weight", "column": "weight", "title": "Boxplot of Vehicle Weight"},
+    {"chart": "scatter_plot", "name": "scatter_plot", "x_col": "weight", "y_col": "cargo_weight",
+     "title": "Scatter Plot of Weight vs. Cargo Weight"},
+    {"chart": "heatmap", "name": "heatmap", "columns": numeric_columns, "title": "Heatmap of Vehicle Features"},
+    {"chart": "pair_plot", "name": "pair_plot", "columns": numeric_columns, "title": "Pair Plot of Vehicle Features"},
+    {"chart": "count_plot", "name": "count_plot", "column": "vehicle_type", "title": "Count Plot of Vehicle Types"},
+]
+
+vehicle_type_prefix = "vehicle_type_"
+
+def with_vehicle_type(df):
+    """Returns df with a vehicle_type column, rebuilt from the one-hot vehicle_type_* columns if it is missing."""
+    if "vehicle_type" in df.columns:
+        return df
+    one_hot = [column for column in df.columns if column.startswith(vehicle_type_prefix)]
+    if not one_hot:
+        return df
+    return df.assign(vehicle_type=df[one_hot].idxmax(axis=1).str[len(vehicle_type_prefix):])
+
+hash_manifest_filename = ".chart_hashes.json"
+
+def spec_columns(spec, df):
+    """Returns the DataFrame columns a chart spec reads (all of them for heatmaps and pair plots without 'columns')."""
+    if "columns" in spec:
+        return list(spec["columns"])
+    _, keys = chart_kinds[spec["chart"]]
+    return [spec[key] for key in keys] or list(df.columns)
+
+def chart_input_hash(spec, data, dpi, image_format):
+    """Hashes everything a chart depends on: its spec, output settings and the data it reads."""
+    digest = hashlib.sha1(json.dumps([spec, dpi, image_format], sort_keys=True).encode())
+    digest.update(json.dumps(list(map(str, data.columns))).encode())
+    digest.update(pd.util.hash_pandas_object(data, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+def render_spec(spec, data, save_path, dpi=None):
+    """Renders one chart spec from the columns it reads. Runs in a worker process."""
+    renderer, keys = chart_kinds[spec["chart"]]
+    return renderer(data, *[spec[key] for key in keys], spec["title"], save_path, dpi=dpi)
+
+def _load_hashes(output_dir):
+    try:
+        with open(os.path.join(output_dir, hash_manifest_filename)) as manifest:
+            return json.load(manifest)
+    except (OSError, ValueError):
+        return {}
+
+def _save_hashes(output_dir, hashes):
+    path = os.path.join(output_dir, hash_manifest_filename)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as manifest:
+        json.dump(hashes, manifest, indent=2, sort_keys=True)
+    os.replace(temp_path, path)
+
+def render_charts(df, specs, output_dir, image_format="png", dpi=None, max_workers=None, force=False):
+    """Renders a list of chart specs from one DataFrame into output_dir, in parallel.
+
+    Each spec is a dict with "chart" (a key of chart_kinds), "name" (the file
+    stem), "title" and the columns the chart reads. Charts whose input hash
+    (spec, output settings and the data columns they read) matches the last
+    render are skipped unless force is set. Each worker receives only the
+    columns its chart reads. Returns {filename: "rendered", "unchanged" or "failed"}.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    previous = _load_hashes(output_dir)
+    hashes = dict(previous)
+    statuses = {}
+    jobs = []
+    for spec in specs:
+        filename = f"{spec['name']}.{image_format}"
+        data = df[spec_columns(spec, df)]
+        input_hash = chart_input_hash(spec, data, dpi, image_format)
+        if not force and previous.get(filename) == input_hash and os.path.exists(os.path.join(output_dir, filename)):
+            statuses[filename] = "unchanged"
+            continue
+        jobs.append((filename, input_hash, spec, data))
+
+    def finish(filename, input_hash, succeeded):
+        statuses[filename] = "rendered" if succeeded else "failed"
+        if succeeded:
+            hashes[filename] = input_hash
+        else:
+            hashes.pop(filename, None)
+
+    workers = min(len(jobs), max_workers or os.cpu_count() or 1)
+    if workers <= 1:
+        for filename, input_hash, spec, data in jobs:
+            finish(filename, input_hash, render_spec(spec, data, os.path.join(output_dir, filename), dpi))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # The slowest charts (pair plots) are submitted first so they do not end up last
+            futures = [(filename, input_hash,
+                        executor.submit(render_spec, spec, data, os.path.join(output_dir, filename), dpi))
+                       for filename, input_hash, spec, data in sorted(jobs, key=lambda job: job[2]["chart"] != "pair_plot")]
+            for filename, input_hash, future in futures:
+                try:
+                    succeeded = future.result()
+                except Exception as e:
+                    logging.error(f"Rendering {filename} failed: {e}")
+                    succeeded = False
+                finish(filename, input_hash, succeeded)
+    if jobs:
+        _save_hashes(output_dir, hashes)
+    return statuses
+
+def main():
+    parser = argparse.ArgumentParser(description="Render the chart set for a dataset in parallel.")
+    parser.add_argument("--data", default="vehicle_data.csv", help="Dataset (.csv or .parquet)")
+    parser.add_argument("--output", default=os.path.join("static", "graphs"), help="Directory for the chart files")
+    parser.add_argument("--format", default="png", choices=["png", "webp"], help="Image format (webp files are smaller)")
+    parser.add_argument("--dpi", type=int, default=None, help="Output resolution (default: matplotlib's 100)")
+    parser.add_argument("--workers", type=int, default=None, help="Rendering processes (default: one per CPU)")
+    parser.add_argument("--force", action="store_true", help="Re-render charts whose input has not changed")
+    args = parser.parse_args()
+
+    df = pd.read_parquet(args.data) if args.data.endswith(".parquet") else pd.read_csv(args.data)
+    # Generated datasets store the vehicle type one-hot encoded
+    df = with_vehicle_type(df)
+    statuses = render_charts(df, default_chart_specs, args.output, image_format=args.format, dpi=args.dpi,
+                             max_workers=args.workers, force=args.force)
+    for filename, status in statuses.items():
+        print(f"{status:>9}  {os.path.join(args.output, filename)}")
+
+if __name__ == "__main__":
+    main()
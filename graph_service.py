@@ -0,0 +1,104 @@
+"""PNG chart rendering from the prediction history aggregates.
+
+The web app draws charts in the browser from /charts/<name>.json and never
+loads matplotlib. This module renders the same charts as PNG files, for
+reports or for deployments that want static images:
+
+    python graph_service.py --history history/predictions.ndjson --output static/graphs
+
+Every filename embeds the data version, a hash of the chart data, so renders
+of different data never overwrite each other. graph.save_figure writes each
+file atomically, so readers never see one that a render is still writing.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+
+import graph
+from prediction_history import PredictionHistory
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def _render_histogram(data, path):
+    chart = data["histogram"]
+    return graph.plot_histogram(chart["edges"], chart["counts"], 'Histogram of Vehicle Weight', chart["column"], path)
+
+def _render_boxplot(data, path):
+    chart = data["boxplot"]
+    return graph.plot_boxplot(chart["stats"], 'Boxplot of Vehicle Weight', chart["column"], path)
+
+def _render_scatter(data, path):
+    chart = data["scatter_plot"]
+    return graph.plot_scatter(chart["x"], chart["y"], 'Scatter Plot of Weight vs. Cargo Weight',
+                              chart["x_column"], chart["y_column"], path)
+
+def _render_heatmap(data, path):
+    chart = data["heatmap"]
+    return graph.plot_heatmap(chart["matrix"], chart["columns"], 'Heatmap of Vehicle Features', path)
+
+def _render_pair_plot(data, path):
+    chart = data["pair_plot"]
+    return graph.plot_pair_grid(chart["columns"], chart["histograms"], chart["sample"],
+                                'Pair Plot of Vehicle Features', path)
+
+def _render_count_plot(data, path):
+    chart = data["count_plot"]
+    return graph.plot_counts(chart["labels"], chart["counts"], 'Count Plot of Vehicle Types', chart["column"], path)
+
+# Chart name -> (file stem, renderer)
+charts = {
+    "histogram": ("histogram_weight", _render_histogram),
+    "boxplot": ("boxplot_weight", _render_boxplot),
+    "scatter_plot": ("scatter_plot", _render_scatter),
+    "heatmap": ("heatmap", _render_heatmap),
+    "pair_plot": ("pair_plot", _render_pair_plot),
+    "count_plot": ("count_plot", _render_count_plot),
+}
+
+
+def data_version(chart_data):
+    """Returns a short content hash identifying a set of chart data."""
+    return hashlib.sha1(json.dumps(chart_data, sort_keys=True).encode()).hexdigest()[:12]
+
+def chart_filename(stem, version):
+    return f"{stem}.{version}.png"
+
+def render_chart_set(chart_data, graphs_dir, version):
+    """Renders every chart for one data version.
+
+    graph.save_figure writes each chart atomically, so a chart file is either
+    absent or complete. Returns {chart name: filename} for the charts that
+    rendered successfully.
+    """
+    rendered = {}
+    for name, (stem, renderer) in charts.items():
+        filename = chart_filename(stem, version)
+        if renderer(chart_data, os.path.join(graphs_dir, filename)):
+            rendered[name] = filename
+    return rendered
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render the chart PNGs from a prediction history log.")
+    parser.add_argument("--history", default=os.path.join("history", "predictions.ndjson"),
+                        help="Prediction history log written by app.py")
+    parser.add_argument("--output", default=os.path.join("static", "graphs"), help="Directory for the PNG files")
+    args = parser.parse_args()
+
+    history = PredictionHistory(args.history)
+    history.fold()
+    if not history.count():
+        sys.exit(f"No predictions recorded in '{args.history}'")
+    chart_data = history.chart_data()
+    os.makedirs(args.output, exist_ok=True)
+    rendered = render_chart_set(chart_data, args.output, data_version(chart_data))
+    for filename in rendered.values():
+        print(os.path.join(args.output, filename))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Deterministic load rules shared by /predict, the batch endpoints and the fleet optimizer."""
+from bisect import bisect_left
+
+import numpy as np
+
+passenger_weight = 75  # Assumed weight per passenger in kg, as in generate_dataset.py
+
+vehicle_limits = {
+    "2-wheeler": {"maxCargo": 50},
+    "4-wheeler 5-seater": {"maxCargo": 500},
+    "4-wheeler 7-seater": {"maxCargo": 750},
+    "delivery vehicle": {"maxCargo": 1500},
+    "heavy vehicle": {"maxCargo": 10000}
+}
+
+# Vehicle types ordered by cargo limit, with the limits in a parallel list for bisection
+_types_by_cargo = sorted(vehicle_limits, key=lambda vehicle_type: vehicle_limits[vehicle_type]["maxCargo"])
+_cargo_limits = [vehicle_limits[vehicle_type]["maxCargo"] for vehicle_type in _types_by_cargo]
+
+
+def total_load(weight, passenger_count, cargo_weight):
+    """Total load of a vehicle: its weight plus passengers and cargo. Works on scalars and NumPy arrays."""
+    return weight + passenger_count * passenger_weight + cargo_weight
+
+def calculate_overload(weight, passenger_count, cargo_weight, max_load_capacity):
+    """Returns how many kg the total load exceeds the capacity by (0 when within limits).
+
+    Works on scalars as well as NumPy arrays.
+    """
+    return np.maximum(0, total_load(weight, passenger_count, cargo_weight) - max_load_capacity)
+
+def dataset_overload_status(weight, max_load_capacity):
+    """Returns the overload_status label generate_dataset.py gives a vehicle. Works on scalars and NumPy arrays.
+
+    The dataset's weight is the total weight, passengers and cargo included, so it is compared
+    with the capacity directly; calculate_overload would count passengers and cargo twice.
+    """
+    return np.where(weight > max_load_capacity, "Overloaded", "Not Overloaded")
+
+def suggest_vehicles(vehicle_type, cargo_weight):
+    """Suggests lighter vehicle types that could carry the cargo, largest first."""
+    if vehicle_type not in vehicle_limits:
+        return []
+    # Lighter types sit below vehicle_type; those from the first limit >= cargo_weight upwards can carry it
+    lowest = bisect_left(_cargo_limits, cargo_weight)
+    current = _types_by_cargo.index(vehicle_type)
+    return [_types_by_cargo[position] for position in range(current - 1, lowest - 1, -1)]
+
+
+class OverloadRuleModel:
+    """The closed-form overload rule behind the model interface, so it can be compared with and served like a model.
+
+    predict() takes encoded feature rows (as built by a FeatureEncoder), undoes the
+    scaling of the numerical columns and labels a row Overloaded when calculate_overload
+    is positive.
+    """
+
+    def __init__(self, encoder):
+        self.columns = {column: position for position, column in enumerate(encoder.numeric_columns)}
+        self.offset = len(encoder.categories)
+        self.mean = encoder.mean.copy()
+        self.scale = encoder.scale.copy()
+        self.classes_ = np.array(["Not Overloaded", "Overloaded"])
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        # Inputs are whole kg and counts; rounding removes the float error of the round trip through scaling
+        raw = np.rint(X[:, self.offset:] * self.scale + self.mean)
+        overload = calculate_overload(raw[:, self.columns["weight"]], raw[:, self.columns["passenger_count"]],
+                                      raw[:, self.columns["cargo_weight"]], raw[:, self.columns["max_load_capacity"]])
+        return self.classes_[(overload > 0).astype(np.intp)]
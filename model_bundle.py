@@ -0,0 +1,156 @@
+"""Versioned model artifact bundle.
+
+A bundle is a directory holding a JSON manifest (feature order, class labels,
+the feature encoder, reference statistics for drift detection) and the compiled forest's tree arrays as raw .npy files:
+
+    model_bundle/
+        CURRENT                 name of the active version
+        <version>/manifest.json
+        <version>/feature.npy, threshold.npy, ...
+
+The tree arrays are memory-mapped on load, so startup time does not grow with
+the size of the forest and forked workers share the same pages. Nothing is
+unpickled. The version is a hash of the bundle contents; a new version is
+written to a temporary directory and published by atomically replacing
+CURRENT, so readers never see a half-written bundle.
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+from forest_engine import CompiledForest
+
+bundle_dir = "model_bundle"
+format_version = 2
+tree_arrays = ["feature", "threshold", "children_left", "children_right", "leaf_value", "roots"]
+versions_to_keep = 3
+
+
+def save_bundle(engine, encoder, directory=bundle_dir, formula_disagreement=None, sklearn_model_sha256=None):
+    """Writes engine and the FeatureEncoder that produces its inputs as a new bundle version.
+
+    formula_disagreement is the fraction of held-out rows on which the model
+    disagrees with the overload formula; servers report it next to the live
+    rate. sklearn_model_sha256 identifies the pickled forest the engine was
+    compiled from, which servers may use for large batches. Makes the new
+    version current and returns it.
+    """
+    manifest = {
+        "format_version": format_version,
+        "feature_names": encoder.feature_names,
+        "class_labels": engine.classes.tolist(),
+        "encoder": encoder.to_dict(),
+        "max_depth": engine.max_depth,
+        "formula_disagreement": formula_disagreement,
+        "sklearn_model_sha256": sklearn_model_sha256,
+        "arrays": {},
+    }
+    digest = hashlib.sha256()
+    for name in tree_arrays:
+        array = np.ascontiguousarray(getattr(engine, name))
+        digest.update(name.encode())
+        digest.update(str(array.dtype).encode())
+        digest.update(array.tobytes())
+        manifest["arrays"][name] = {"file": f"{name}.npy", "dtype": str(array.dtype), "shape": list(array.shape)}
+    digest.update(json.dumps(manifest, sort_keys=True).encode())
+    version = digest.hexdigest()[:12]
+    manifest["version"] = version
+    manifest["created_at"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+    os.makedirs(directory, exist_ok=True)
+    version_dir = os.path.join(directory, version)
+    if not os.path.exists(version_dir):
+        temp_dir = os.path.join(directory, f".tmp-{version}-{os.getpid()}")
+        os.makedirs(temp_dir)
+        for name in tree_arrays:
+            np.save(os.path.join(temp_dir, f"{name}.npy"), np.ascontiguousarray(getattr(engine, name)))
+        with open(os.path.join(temp_dir, "manifest.json"), "w") as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+        os.replace(temp_dir, version_dir)
+    set_current_version(version, directory)
+    _prune(directory, version)
+    return version
+
+def publish_bundle(source_directory, version, directory=bundle_dir):
+    """Copies a bundle version from another bundle directory, such as a scratch training run, and makes it current."""
+    os.makedirs(directory, exist_ok=True)
+    version_dir = os.path.join(directory, version)
+    if not os.path.exists(version_dir):
+        temp_dir = os.path.join(directory, f".tmp-{version}-{os.getpid()}")
+        shutil.copytree(os.path.join(source_directory, version), temp_dir)
+        os.replace(temp_dir, version_dir)
+    set_current_version(version, directory)
+    _prune(directory, version)
+    return version
+
+def file_sha256(path):
+    """Returns the sha256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        for block in iter(lambda: source.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def set_current_version(version, directory=bundle_dir):
+    """Atomically points CURRENT at an existing bundle version."""
+    temp_path = os.path.join(directory, f".CURRENT-{os.getpid()}")
+    with open(temp_path, "w") as current_file:
+        current_file.write(version)
+    os.replace(temp_path, os.path.join(directory, "CURRENT"))
+
+def clear_current_version(directory=bundle_dir):
+    """Removes the CURRENT pointer so servers fall back to the pickled model."""
+    try:
+        os.remove(os.path.join(directory, "CURRENT"))
+    except FileNotFoundError:
+        pass
+
+def current_version(directory=bundle_dir):
+    """Returns the active bundle version, or None if there is no bundle."""
+    try:
+        with open(os.path.join(directory, "CURRENT")) as current_file:
+            return current_file.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def load_bundle(directory=bundle_dir, version=None, mmap=True):
+    """Loads a bundle version (the current one by default).
+
+    Returns (engine, manifest). Raises FileNotFoundError if there is no bundle
+    and ValueError if the bundle has an unsupported format.
+    """
+    version = version or current_version(directory)
+    if version is None:
+        raise FileNotFoundError(f"No current model bundle in '{directory}'")
+    version_dir = os.path.join(directory, version)
+    with open(os.path.join(version_dir, "manifest.json")) as manifest_file:
+        manifest = json.load(manifest_file)
+    if manifest.get("format_version") != format_version:
+        raise ValueError(f"Unsupported model bundle format: {manifest.get('format_version')}")
+
+    arrays = {}
+    for name in tree_arrays:
+        spec = manifest["arrays"][name]
+        array = np.load(os.path.join(version_dir, spec["file"]), mmap_mode="r" if mmap else None, allow_pickle=False)
+        if str(array.dtype) != spec["dtype"] or list(array.shape) != spec["shape"]:
+            raise ValueError(f"Model bundle array '{name}' does not match the manifest")
+        arrays[name] = array
+
+    engine = CompiledForest(max_depth=manifest["max_depth"], classes=np.array(manifest["class_labels"]), **arrays)
+    return engine, manifest
+
+def _prune(directory, current):
+    versions = []
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name.startswith(".") or not os.path.isdir(path):
+            continue
+        versions.append((os.path.getmtime(path), name))
+    versions.sort()
+    stale = [name for _, name in versions if name != current][:max(0, len(versions) - versions_to_keep)]
+    for name in stale:
+        shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
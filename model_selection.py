@@ -0,0 +1,240 @@
+"""Model comparison and latency-aware selection.
+
+Trains several candidate models on the same split of the dataset: random
+forests over a grid of tree counts and depths, histogram gradient boosting,
+logistic regression and the closed-form overload rule the service already
+applies. For each one it records test accuracy, single-row and batch
+prediction latency, size on disk and load time, measured on the form the
+server would run (forests as the compiled model bundle, the others as
+pickles). Latency is the model call on encoded features; encoding costs the
+same for every candidate.
+
+The winner is the most accurate candidate whose single-row p95 latency fits
+the budget. Candidates within --accuracy-tolerance of that accuracy count as
+ties and the fastest of them wins, so no latency is spent on a negligible gain.
+Each candidate is dropped once measured, and the winner is fitted again (with
+the same seed) to be saved exactly like train_and_save_model.py saves its model.
+
+Only forests compile to a model bundle, and slim workers (VLMS_PROFILE=slim)
+serve nothing else. --bundle-only restricts the selection to forests. When a
+bundle is current and another kind of model wins, the script exits without
+saving unless --replace-bundle is given.
+
+    python model_selection.py --latency-budget-ms 0.5
+    python model_selection.py --forest-trees 10,50,100 --forest-depths 8,12,none --dry-run
+    python model_selection.py --bundle-only
+"""
+import argparse
+import json
+import os
+import pickle
+import sys
+import tempfile
+import time
+
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestClassifier, HistGradientBoostingClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import train_test_split
+
+from benchmark import time_call
+from forest_engine import CompiledForest, compile_forest
+from load_rules import OverloadRuleModel
+from model_bundle import save_bundle, load_bundle, current_version
+from train_and_save_model import StageReport, dataset_filename, load_features, save_artifacts
+
+
+def candidate_models(args, encoder):
+    """Returns (name, unfitted model) pairs; the overload rule needs no fitting and is already usable."""
+    candidates = []
+    for trees in args.forest_trees:
+        for depth in args.forest_depths:
+            candidates.append((f"random-forest-{trees}x{depth or 'full'}",
+                               RandomForestClassifier(n_estimators=trees, max_depth=depth, n_jobs=args.n_jobs,
+                                                      random_state=42)))
+    candidates.append(("hist-gradient-boosting", HistGradientBoostingClassifier(random_state=42)))
+    candidates.append(("logistic-regression", LogisticRegression(max_iter=1000)))
+    candidates.append(("overload-rule", OverloadRuleModel(encoder)))
+    return candidates
+
+
+def unfitted_copy(model):
+    """Returns a fresh copy of a candidate, so a fitted one can be dropped after measuring it."""
+    return model if isinstance(model, OverloadRuleModel) else clone(model)
+
+
+def _directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def _load_time_ms(load, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        load()
+        timings.append((time.perf_counter() - start) * 1000)
+    return round(min(timings), 3)
+
+
+def measure_storage(served, encoder):
+    """Saves the served form of a model to a scratch directory; returns its size in bytes and its load time."""
+    with tempfile.TemporaryDirectory() as scratch:
+        if isinstance(served, CompiledForest):
+            save_bundle(served, encoder, scratch)
+            return _directory_size(scratch), _load_time_ms(lambda: load_bundle(scratch))
+        path = os.path.join(scratch, "model.pkl")
+        with open(path, "wb") as model_file:
+            pickle.dump(served, model_file)
+
+        def load():
+            with open(path, "rb") as model_file:
+                pickle.load(model_file)
+        return os.path.getsize(path), _load_time_ms(load)
+
+
+def evaluate(name, model, encoder, X_train, y_train, X_test, y_test, args):
+    """Fits one candidate and measures its accuracy, latency, size and load time."""
+    start = time.perf_counter()
+    if not isinstance(model, OverloadRuleModel):
+        model.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+    # Forests are served as compiled bundles, everything else through its own predict()
+    served = compile_forest(model) if isinstance(model, RandomForestClassifier) else model
+
+    accuracy = float((served.predict(X_test) == y_test).mean())
+    single = X_test[:1]
+    batch = X_test[:args.batch_size]
+    single_latency = time_call(lambda: served.predict(single), args.repeat)
+    batch_latency = time_call(lambda: served.predict(batch), max(1, args.repeat // 10))
+    size_bytes, load_ms = measure_storage(served, encoder)
+    result = {
+        "name": name,
+        "bundle": isinstance(served, CompiledForest),
+        "accuracy": round(accuracy, 5),
+        "fit_seconds": round(fit_seconds, 3),
+        "single_p50_ms": single_latency["p50_ms"],
+        "single_p95_ms": single_latency["p95_ms"],
+        "batch_rows": len(batch),
+        "batch_p50_ms": batch_latency["p50_ms"],
+        "batch_us_per_row": round(batch_latency["p50_ms"] * 1000 / len(batch), 3),
+        "size_kb": round(size_bytes / 1024, 1),
+        "load_ms": load_ms,
+    }
+    print(f"{name}: accuracy {result['accuracy']}, single p95 {result['single_p95_ms']} ms, "
+          f"batch {result['batch_us_per_row']} us/row, {result['size_kb']} KB, load {load_ms} ms")
+    return result
+
+
+def select(results, latency_budget_ms, accuracy_tolerance, bundle_only=False):
+    """Picks the fastest of the most accurate candidates within the latency budget (None if nothing fits).
+
+    With bundle_only, only candidates served as a compiled model bundle are eligible.
+    """
+    eligible = [result for result in results
+                if result["single_p95_ms"] <= latency_budget_ms and (result["bundle"] or not bundle_only)]
+    if not eligible:
+        return None
+    best_accuracy = max(result["accuracy"] for result in eligible)
+    contenders = [result for result in eligible if result["accuracy"] >= best_accuracy - accuracy_tolerance]
+    return min(contenders, key=lambda result: result["single_p50_ms"])
+
+
+def print_table(results, selected, latency_budget_ms, bundle_only=False):
+    print(f"{'candidate':<28}{'accuracy':>10}{'1-row p95 ms':>14}{'us/row':>9}{'size KB':>10}{'load ms':>9}")
+    for result in sorted(results, key=lambda result: result["accuracy"], reverse=True):
+        if selected is result:
+            marker = "*"
+        elif result["single_p95_ms"] > latency_budget_ms:
+            marker = "-"
+        elif bundle_only and not result["bundle"]:
+            marker = "x"
+        else:
+            marker = " "
+        print(f"{marker}{result['name']:<27}{result['accuracy']:>10}{result['single_p95_ms']:>14}"
+              f"{result['batch_us_per_row']:>9}{result['size_kb']:>10}{result['load_ms']:>9}")
+    print(f"* selected, - over the {latency_budget_ms} ms single-row budget"
+          + (", x not servable as a model bundle" if bundle_only else ""))
+
+
+def _depth(value):
+    return None if value.lower() in ("none", "full") else int(value)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare candidate models and save the best one within a latency budget.")
+    parser.add_argument("--data", default=dataset_filename, help="Training dataset (.csv or .parquet)")
+    parser.add_argument("--chunksize", type=int, default=None, help="Rows read per chunk (default: whole file at once)")
+    parser.add_argument("--test-size", type=float, default=0.2, help="Fraction of rows held out for evaluation")
+    parser.add_argument("--forest-trees", type=lambda value: [int(part) for part in value.split(",")], default=[25, 100],
+                        help="Comma-separated tree counts for the random forest candidates (default: 25,100)")
+    parser.add_argument("--forest-depths", type=lambda value: [_depth(part) for part in value.split(",")],
+                        default=[8, 16, None], help="Comma-separated depths, 'none' for unlimited (default: 8,16,none)")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="CPU cores used to train forests (-1: all)")
+    parser.add_argument("--latency-budget-ms", type=float, default=1.0,
+                        help="Largest acceptable single-row p95 prediction latency (default: 1.0)")
+    parser.add_argument("--accuracy-tolerance", type=float, default=0.002,
+                        help="Accuracy difference treated as a tie, won by the faster model (default: 0.002)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows per batch latency measurement")
+    parser.add_argument("--repeat", type=int, default=300, help="Single-row predictions timed per candidate")
+    parser.add_argument("--report", help="Write every candidate's measurements to this JSON file")
+    parser.add_argument("--dry-run", action="store_true", help="Compare only; do not save the selected model")
+    parser.add_argument("--bundle-only", action="store_true",
+                        help="Only select forests, which compile to a model bundle that slim workers can serve")
+    parser.add_argument("--replace-bundle", action="store_true",
+                        help="Save a winner that is not a forest even though a bundle is current; this clears the "
+                             "bundle, and slim workers will not start")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if not os.path.exists(args.data):
+        print(f"Error: Dataset file '{args.data}' not found. Run generate_dataset.py first.")
+        sys.exit(1)
+
+    report = StageReport()
+    try:
+        X, y, encoder = load_features(args, report)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error loading the dataset: {e}")
+        sys.exit(1)
+    # One split shared by every candidate
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=args.test_size, random_state=42)
+    del X
+
+    # Unfitted candidates; each one is fitted on a copy that is dropped once measured
+    candidates = dict(candidate_models(args, encoder))
+    results = []
+    for name, model in candidates.items():
+        results.append(evaluate(name, unfitted_copy(model), encoder, X_train, y_train, X_test, y_test, args))
+
+    selected = select(results, args.latency_budget_ms, args.accuracy_tolerance, args.bundle_only)
+    print_table(results, selected, args.latency_budget_ms, args.bundle_only)
+    if args.report:
+        with open(args.report, "w") as report_file:
+            json.dump({"data": args.data, "test_rows": len(y_test), "latency_budget_ms": args.latency_budget_ms,
+                       "accuracy_tolerance": args.accuracy_tolerance, "bundle_only": args.bundle_only,
+                       "candidates": results, "selected": selected and selected["name"]}, report_file, indent=2)
+        print(f"Comparison report saved to '{args.report}'.")
+    if selected is None:
+        kind = "forest" if args.bundle_only else "candidate"
+        print(f"Error: no {kind} predicts a single row within {args.latency_budget_ms} ms (p95).")
+        sys.exit(1)
+
+    print(f"Selected '{selected['name']}'.")
+    if args.dry_run:
+        return
+    if not selected["bundle"] and current_version() is not None and not args.replace_bundle:
+        print(f"Error: '{selected['name']}' cannot be compiled to a model bundle. Saving it would clear the current "
+              f"bundle, and slim workers (VLMS_PROFILE=slim) would refuse to start. Rerun with --bundle-only to "
+              f"choose among forests, or with --replace-bundle to serve the pickle anyway.")
+        sys.exit(1)
+    # Fitted again with the same seed, which gives the model that was measured
+    model = unfitted_copy(candidates[selected["name"]])
+    if not isinstance(model, OverloadRuleModel):
+        model.fit(X_train, y_train)
+    save_artifacts(model, encoder, X_test)
+
+
+if __name__ == "__main__":
+    main()
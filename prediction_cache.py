@@ -0,0 +1,183 @@
+"""Bounded LRU/TTL cache for prediction results.
+
+Entries are keyed on the normalized vehicle input and tagged with the model
+version that produced them. When the serving model version changes, every
+cached result from the previous model is dropped, so a new model artifact
+never serves stale predictions.
+
+An optional SQLite file can back the cache so that several worker processes
+on the same host share hits. Local entries are checked first; on a local miss
+the shared store is consulted and a hit there is copied into the local LRU.
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class SharedStore:
+    """Prediction results shared between processes through a local SQLite file."""
+
+    # Prune expired and excess rows after this many writes
+    prune_interval = 1000
+
+    def __init__(self, path, max_entries):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS predictions ("
+                "key TEXT PRIMARY KEY, model_version TEXT NOT NULL, expires_at REAL NOT NULL, value TEXT NOT NULL)"
+            )
+
+    def _connection(self):
+        # sqlite3 connections cannot be shared between threads
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=1.0)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key, model_version):
+        row = self._connection().execute(
+            "SELECT value FROM predictions WHERE key = ? AND model_version = ? AND expires_at > ?",
+            (key, model_version, time.time()),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key, value, model_version, expires_at):
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO predictions (key, model_version, expires_at, value) VALUES (?, ?, ?, ?)",
+                (key, model_version, expires_at, json.dumps(value)),
+            )
+        self._writes += 1
+        if self._writes % self.prune_interval == 0:
+            self.prune(model_version)
+
+    def prune(self, model_version):
+        """Deletes expired rows, rows from other model versions and the oldest rows beyond max_entries."""
+        with self._connection() as connection:
+            connection.execute("DELETE FROM predictions WHERE expires_at <= ? OR model_version != ?",
+                               (time.time(), model_version))
+            connection.execute(
+                "DELETE FROM predictions WHERE rowid IN ("
+                "SELECT rowid FROM predictions ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+
+class PredictionCache:
+    """Thread-safe LRU cache with per-entry expiry, invalidated when the model version changes."""
+
+    def __init__(self, max_entries=10000, ttl_seconds=300.0, store_path=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._model_version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.shared_hits = 0
+        self._store = None
+        if store_path:
+            try:
+                self._store = SharedStore(store_path, max_entries)
+            except sqlite3.Error as e:
+                logging.warning(f"Shared prediction cache '{store_path}' unavailable, using a local cache only: {e}")
+
+    @staticmethod
+    def make_key(values):
+        """Builds a cache key from a tuple of normalized input values."""
+        return json.dumps(values, separators=(",", ":"))
+
+    def get(self, key, model_version):
+        """Returns the cached result for key, or None on a miss."""
+        now = time.monotonic()
+        with self._lock:
+            self._check_version(model_version)
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+                self.expirations += 1
+        value = self._get_shared(key, model_version)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.shared_hits += 1
+            self._store_local(key, value, now)
+        return value
+
+    def put(self, key, value, model_version):
+        now = time.monotonic()
+        with self._lock:
+            self._check_version(model_version)
+            self._store_local(key, value, now)
+        if self._store is not None:
+            try:
+                self._store.put(key, value, model_version, time.time() + self.ttl_seconds)
+            except sqlite3.Error as e:
+                logging.warning(f"Shared prediction cache write failed: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "shared_hits": self.shared_hits,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "model_version": self._model_version,
+                "shared_store": self._store.path if self._store is not None else None,
+            }
+
+    def _check_version(self, model_version):
+        # Caller holds self._lock
+        if model_version != self._model_version:
+            if self._entries:
+                self.invalidations += 1
+                logging.info(f"Model version changed to '{model_version}'; dropping {len(self._entries)} cached predictions")
+            self._entries.clear()
+            self._model_version = model_version
+
+    def _store_local(self, key, value, now):
+        # Caller holds self._lock
+        self._entries[key] = (now + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _get_shared(self, key, model_version):
+        if self._store is None:
+            return None
+        try:
+            return self._store.get(key, model_version)
+        except sqlite3.Error as e:
+            logging.warning(f"Shared prediction cache read failed: {e}")
+            return None
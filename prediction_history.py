@@ -0,0 +1,540 @@
+"""Prediction history and the chart aggregates maintained from it.
+
+Every scored vehicle is appended to an NDJSON log, one line per prediction.
+Workers on the same host share the file: each append is a single O_APPEND
+write, so lines from different processes never interleave. PredictionHistory
+folds new log lines into running aggregates:
+
+- fixed-width histogram bins per feature
+- a quantile sketch for the weight boxplot
+- streaming moments for the correlation matrix
+- a reservoir sample for the scatter and pair plots
+- vehicle type counts
+
+Charts are computed from the aggregates, so their cost does not grow with the
+size of the history. The JSON for each chart is built once per change of the
+aggregates and identified by a content hash, which /charts/<name>.json uses
+as its ETag. The aggregates and the log offset they cover are saved next to
+the log, so a restart only reads the lines written since.
+
+With max_bytes set, the log is rotated once it reaches that size: it moves to
+<log>.1 (replacing the previous one) and a new log is started, so the history
+takes at most about twice max_bytes on disk. The aggregates keep covering
+everything folded so far; fold() finishes the rotated file before it starts
+on the new one.
+"""
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import threading
+import time
+
+import numpy as np
+
+numeric_columns = ["weight", "max_load_capacity", "passenger_count", "cargo_weight"]
+
+# Width of the fine histogram bins kept per column; charts merge them into at most chart_bins bins
+bin_widths = {"weight": 50, "max_load_capacity": 50, "passenger_count": 1, "cargo_weight": 25}
+chart_bins = 20
+sample_size = 1000
+pair_sample_size = 300  # Rows of the sample sent with the pair plot, which draws every column pair
+# Entries with a numeric field outside [0, max_value] are not folded in; validation caps real records far below
+max_value = 1e9
+chart_names = ["histogram", "boxplot", "scatter_plot", "heatmap", "pair_plot", "count_plot"]
+fold_block_bytes = 1 << 20
+state_format_version = 1
+
+
+def rotated_log_path(log_path):
+    """Returns the path the log is moved to when it is rotated."""
+    return f"{log_path}.1"
+
+
+class StreamingHistogram:
+    """Counts values in fixed-width bins; any range, memory proportional to the occupied bins."""
+
+    def __init__(self, bin_width):
+        self.bin_width = bin_width
+        self.bins = {}
+
+    def add(self, values):
+        indices, counts = np.unique(np.floor(values / self.bin_width).astype(np.int64), return_counts=True)
+        for index, count in zip(indices.tolist(), counts.tolist()):
+            self.bins[index] = self.bins.get(index, 0) + count
+
+    def chart(self, max_bins=chart_bins):
+        """Returns {"edges", "counts"} with the fine bins merged into at most max_bins bins."""
+        if not self.bins:
+            return {"edges": [], "counts": []}
+        low, high = min(self.bins), max(self.bins)
+        # Integer ceiling divisions: float division loses precision on wide ranges and miscounts the bins
+        span = high - low + 1
+        factor = -(-span // max_bins)
+        counts = [0] * -(-span // factor)
+        for index, count in self.bins.items():
+            counts[(index - low) // factor] += count
+        edges = [(low + position * factor) * self.bin_width for position in range(len(counts) + 1)]
+        return {"edges": edges, "counts": counts}
+
+    def in_range(self, limit):
+        """Returns whether every occupied bin lies within [0, limit]."""
+        return not self.bins or (min(self.bins) >= 0 and max(self.bins) * self.bin_width <= limit)
+
+    def to_state(self):
+        return {"bin_width": self.bin_width, "bins": {str(index): count for index, count in self.bins.items()}}
+
+    @classmethod
+    def from_state(cls, state):
+        histogram = cls(state["bin_width"])
+        histogram.bins = {int(index): count for index, count in state["bins"].items()}
+        return histogram
+
+
+class QuantileSketch:
+    """Quantiles of non-negative values within a relative error, using logarithmic buckets."""
+
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.bins = {}
+        self.zero_count = 0
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, values):
+        if not len(values):
+            return
+        positive = values[values > 0]
+        self.zero_count += len(values) - len(positive)
+        self.count += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        indices, counts = np.unique(np.ceil(np.log(positive) / math.log(self.gamma)).astype(np.int64),
+                                    return_counts=True)
+        for index, count in zip(indices.tolist(), counts.tolist()):
+            self.bins[index] = self.bins.get(index, 0) + count
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0.0
+        seen = self.zero_count
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                value = 2 * self.gamma ** index / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def box(self):
+        """Returns boxplot statistics; whiskers reach 1.5 IQR, clipped to the observed range."""
+        if not self.count:
+            return None
+        q1, median, q3 = self.quantile(0.25), self.quantile(0.5), self.quantile(0.75)
+        iqr = q3 - q1
+        stats = {"min": self.min, "q1": q1, "median": median, "q3": q3, "max": self.max,
+                 "whislo": max(self.min, q1 - 1.5 * iqr), "whishi": min(self.max, q3 + 1.5 * iqr)}
+        return {"count": self.count, **{name: round(value, 2) for name, value in stats.items()}}
+
+    def to_state(self):
+        return {"relative_accuracy": self.relative_accuracy, "bins": {str(index): count for index, count in self.bins.items()},
+                "zero_count": self.zero_count, "count": self.count,
+                "min": self.min if self.count else None, "max": self.max if self.count else None}
+
+    @classmethod
+    def from_state(cls, state):
+        sketch = cls(state["relative_accuracy"])
+        sketch.bins = {int(index): count for index, count in state["bins"].items()}
+        sketch.zero_count = state["zero_count"]
+        sketch.count = state["count"]
+        if sketch.count:
+            sketch.min, sketch.max = state["min"], state["max"]
+        return sketch
+
+
+class StreamingMoments:
+    """Running means and co-moments of several columns, merged batch by batch."""
+
+    def __init__(self, columns):
+        self.count = 0
+        self.mean = np.zeros(columns)
+        self.comoments = np.zeros((columns, columns))
+
+    def add(self, values):
+        batch_count = len(values)
+        if not batch_count:
+            return
+        batch_mean = values.mean(axis=0)
+        centered = values - batch_mean
+        delta = batch_mean - self.mean
+        total = self.count + batch_count
+        self.comoments += centered.T @ centered + np.outer(delta, delta) * (self.count * batch_count / total)
+        self.mean += delta * (batch_count / total)
+        self.count = total
+
+    def correlation(self):
+        """Returns the correlation matrix as nested lists; None where a column is constant."""
+        spread = np.sqrt(np.diag(self.comoments))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            matrix = self.comoments / np.outer(spread, spread)
+        return [[round(float(value), 4) if np.isfinite(value) else None for value in row] for row in matrix]
+
+    def to_state(self):
+        return {"count": self.count, "mean": self.mean.tolist(), "comoments": self.comoments.tolist()}
+
+    @classmethod
+    def from_state(cls, state):
+        moments = cls(len(state["mean"]))
+        moments.count = state["count"]
+        moments.mean = np.array(state["mean"], dtype=float)
+        moments.comoments = np.array(state["comoments"], dtype=float)
+        return moments
+
+
+class Reservoir:
+    """A uniform random sample of fixed size over everything seen so far."""
+
+    def __init__(self, size):
+        self.size = size
+        self.seen = 0
+        self.rows = []
+        # Seeded from the count, so workers folding the same log from the same state keep the same sample
+        self._random = random.Random(self.seen)
+
+    def add(self, rows):
+        for row in rows:
+            self.seen += 1
+            if len(self.rows) < self.size:
+                self.rows.append(row)
+            else:
+                slot = self._random.randrange(self.seen)
+                if slot < self.size:
+                    self.rows[slot] = row
+
+    def to_state(self):
+        return {"size": self.size, "seen": self.seen, "rows": self.rows}
+
+    @classmethod
+    def from_state(cls, state):
+        reservoir = cls(state["size"])
+        reservoir.seen = state["seen"]
+        reservoir.rows = [list(row) for row in state["rows"]]
+        reservoir._random = random.Random(reservoir.seen)
+        return reservoir
+
+
+class ChartAggregates:
+    """The running aggregates behind every chart."""
+
+    def __init__(self):
+        self.count = 0
+        self.histograms = {column: StreamingHistogram(bin_widths[column]) for column in numeric_columns}
+        self.weight_quantiles = QuantileSketch()
+        self.moments = StreamingMoments(len(numeric_columns))
+        self.sample = Reservoir(sample_size)
+        self.vehicle_type_counts = {}
+
+    def add(self, entries):
+        """Folds a list of history entries (dicts with vehicle_type and the numeric columns) in.
+
+        Entries with a missing vehicle type, or a numeric field that is missing,
+        not finite or outside [0, max_value], are skipped.
+        """
+        rows = []
+        vehicle_types = []
+        for entry in entries:
+            try:
+                row = [float(entry[column]) for column in numeric_columns]
+            except (KeyError, TypeError, ValueError, OverflowError):
+                continue
+            vehicle_type = entry.get("vehicle_type")
+            # NaN fails both comparisons
+            if isinstance(vehicle_type, str) and all(0 <= value <= max_value for value in row):
+                rows.append(row)
+                vehicle_types.append(vehicle_type)
+        if not rows:
+            return
+        values = np.array(rows)
+        for position, column in enumerate(numeric_columns):
+            self.histograms[column].add(values[:, position])
+        self.weight_quantiles.add(values[:, numeric_columns.index("weight")])
+        self.moments.add(values)
+        self.sample.add(rows)
+        for vehicle_type in vehicle_types:
+            self.vehicle_type_counts[vehicle_type] = self.vehicle_type_counts.get(vehicle_type, 0) + 1
+        self.count += len(rows)
+
+    def in_range(self):
+        """Returns whether the aggregates only cover values that add() accepts."""
+        return all(histogram.in_range(max_value) for histogram in self.histograms.values())
+
+    def chart(self, name):
+        """Returns the numbers behind one chart (one of chart_names)."""
+        sample = self.sample.rows
+        if name == "histogram":
+            return {"column": "weight", **self.histograms["weight"].chart()}
+        if name == "boxplot":
+            return {"column": "weight", "stats": self.weight_quantiles.box()}
+        if name == "scatter_plot":
+            weight, cargo_weight = numeric_columns.index("weight"), numeric_columns.index("cargo_weight")
+            return {"x_column": "weight", "y_column": "cargo_weight",
+                    "x": [row[weight] for row in sample], "y": [row[cargo_weight] for row in sample]}
+        if name == "heatmap":
+            return {"columns": numeric_columns, "matrix": self.moments.correlation()}
+        if name == "pair_plot":
+            return {"columns": numeric_columns,
+                    "histograms": {column: self.histograms[column].chart() for column in numeric_columns},
+                    "sample": sample[:pair_sample_size]}
+        if name == "count_plot":
+            vehicle_types = sorted(self.vehicle_type_counts)
+            return {"column": "vehicle_type", "labels": vehicle_types,
+                    "counts": [self.vehicle_type_counts[vehicle_type] for vehicle_type in vehicle_types]}
+        raise KeyError(name)
+
+    def chart_data(self):
+        """Returns the numbers behind each chart, keyed by chart name."""
+        return {name: self.chart(name) for name in chart_names}
+
+    def to_state(self):
+        return {
+            "count": self.count,
+            "histograms": {column: histogram.to_state() for column, histogram in self.histograms.items()},
+            "weight_quantiles": self.weight_quantiles.to_state(),
+            "moments": self.moments.to_state(),
+            "sample": self.sample.to_state(),
+            "vehicle_type_counts": self.vehicle_type_counts,
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        aggregates = cls()
+        aggregates.count = state["count"]
+        aggregates.histograms = {column: StreamingHistogram.from_state(histogram)
+                                 for column, histogram in state["histograms"].items()}
+        aggregates.weight_quantiles = QuantileSketch.from_state(state["weight_quantiles"])
+        aggregates.moments = StreamingMoments.from_state(state["moments"])
+        aggregates.sample = Reservoir.from_state(state["sample"])
+        aggregates.vehicle_type_counts = dict(state["vehicle_type_counts"])
+        return aggregates
+
+
+class PredictionHistory:
+    """Append-only prediction log and the chart aggregates folded from it."""
+
+    def __init__(self, log_path, state_path=None, max_bytes=0):
+        self.log_path = log_path
+        self.state_path = state_path or f"{log_path}.state.json"
+        self.max_bytes = max_bytes  # Log size that triggers a rotation; 0 never rotates
+        self.aggregates = ChartAggregates()
+        self.offset = 0  # Bytes of the log already folded into the aggregates
+        self.log_inode = None  # Inode of the log file that offset refers to
+        self.revision = 0  # Bumped whenever the aggregates change
+        self._payloads = {}
+        self._payloads_revision = None
+        self._fd = None
+        self._write_lock = threading.Lock()
+        self._fold_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._refresher = None
+        self._load_state()
+
+    def append(self, entries):
+        """Appends history entries (vehicle record fields plus prediction fields) to the log."""
+        if not entries:
+            return
+        timestamp = round(time.time(), 3)
+        data = "".join(json.dumps({"ts": timestamp, **entry}, separators=(",", ":")) + "\n" for entry in entries)
+        with self._write_lock:
+            if self._fd is not None and self.max_bytes and self._rotated_away():
+                # Another worker rotated the log; our descriptor still points at the old file
+                os.close(self._fd)
+                self._fd = None
+            if self._fd is None:
+                self._open_log()
+            os.write(self._fd, data.encode())
+            if self.max_bytes and os.fstat(self._fd).st_size >= self.max_bytes:
+                self._rotate()
+
+    def _open_log(self):
+        # Caller holds self._write_lock
+        directory = os.path.dirname(self.log_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._fd = os.open(self.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def _rotated_away(self):
+        # Caller holds self._write_lock
+        try:
+            return os.stat(self.log_path).st_ino != os.fstat(self._fd).st_ino
+        except FileNotFoundError:
+            return True
+
+    def _rotate(self):
+        # Caller holds self._write_lock. Only the file we are writing to is moved, so two workers
+        # crossing the limit together do not rotate twice and drop the first rotated file.
+        if not self._rotated_away():
+            os.replace(self.log_path, rotated_log_path(self.log_path))
+            logging.info(f"Rotated prediction log '{self.log_path}'")
+        os.close(self._fd)
+        self._open_log()
+
+    def fold(self):
+        """Folds log lines written since the last call into the aggregates.
+
+        Returns True if the aggregates changed.
+        """
+        with self._fold_lock:
+            try:
+                log = open(self.log_path, "rb")
+            except FileNotFoundError:
+                return False
+            with log:
+                status = os.fstat(log.fileno())
+                folded = 0
+                rotated = self.log_inode is not None and status.st_ino != self.log_inode
+                if rotated:
+                    # The log was rotated: fold the rest of the previous file, then start the new one
+                    folded = self._fold_rotated()
+                    self.offset = 0
+                elif status.st_size < self.offset:
+                    logging.warning(f"Prediction log '{self.log_path}' shrank; rebuilding chart aggregates")
+                    self.aggregates = ChartAggregates()
+                    self.offset = 0
+                    self.revision += 1
+                self.log_inode = status.st_ino
+                folded += self._fold_from_offset(log)
+            if folded:
+                self.revision += 1
+            if folded or rotated:
+                self._save_state()
+            return folded > 0
+
+    def _fold_from_offset(self, log):
+        # Caller holds self._fold_lock
+        log.seek(self.offset)
+        folded = 0
+        while True:
+            block = log.read(fold_block_bytes)
+            end = block.rfind(b"\n")
+            if end < 0:
+                break  # Nothing new, or only a line that is still being written
+            entries = []
+            for line in block[:end].splitlines():
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+            self.aggregates.add(entries)
+            folded += len(entries)
+            self.offset += end + 1
+            log.seek(self.offset)
+        return folded
+
+    def _fold_rotated(self):
+        # Caller holds self._fold_lock
+        try:
+            with open(rotated_log_path(self.log_path), "rb") as log:
+                if os.fstat(log.fileno()).st_ino == self.log_inode:
+                    return self._fold_from_offset(log)
+        except FileNotFoundError:
+            pass
+        # Rotated twice (or replaced) since the last fold; the unfolded lines are not in the charts
+        logging.warning(f"Prediction log '{self.log_path}' was rotated before it was fully folded")
+        return 0
+
+    def follow(self, interval_seconds=5.0, on_change=None):
+        """Starts a thread that folds new log lines every interval_seconds.
+
+        on_change, if given, is called with the chart data after every change
+        of the aggregates (and once at start if there is any history).
+        """
+        def refresh():
+            first = True
+            while True:
+                try:
+                    if (self.fold() or first) and on_change is not None and self.count():
+                        on_change(self.chart_data())
+                    first = False
+                except Exception as e:
+                    logging.error(f"Prediction history refresh failed: {e}")
+                if self._stop.wait(interval_seconds):
+                    return
+
+        self._refresher = threading.Thread(target=refresh, name="history-refresh", daemon=True)
+        self._refresher.start()
+
+    def close(self):
+        self._stop.set()
+        if self._refresher is not None:
+            self._refresher.join()
+        with self._write_lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+    def chart_data(self):
+        with self._fold_lock:
+            return self.aggregates.chart_data()
+
+    def chart_payload(self, name):
+        """Returns (JSON bytes, version hash) for one chart, or None for an unknown chart name.
+
+        Each payload is serialized at most once per revision of the aggregates.
+        """
+        if name not in chart_names:
+            return None
+        with self._fold_lock:
+            if self._payloads_revision != self.revision:
+                self._payloads = {}
+                self._payloads_revision = self.revision
+            payload = self._payloads.get(name)
+            if payload is None:
+                body = json.dumps(self.aggregates.chart(name), separators=(",", ":")).encode()
+                payload = self._payloads[name] = (body, hashlib.sha1(body).hexdigest()[:16])
+            return payload
+
+    def count(self):
+        with self._fold_lock:
+            return self.aggregates.count
+
+    def _load_state(self):
+        try:
+            with open(self.state_path) as state_file:
+                state = json.load(state_file)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable chart state '{self.state_path}': {e}")
+            return
+        if state.get("format_version") != state_format_version:
+            return
+        try:
+            aggregates = ChartAggregates.from_state(state["aggregates"])
+        except (KeyError, TypeError, ValueError) as e:
+            logging.warning(f"Ignoring malformed chart state '{self.state_path}': {e}")
+            return
+        if not aggregates.in_range():
+            # Saved before out-of-range values were skipped; folding the log again leaves them out
+            logging.warning(f"Chart state '{self.state_path}' holds out-of-range values; rebuilding it from the log")
+            return
+        self.aggregates = aggregates
+        self.offset = state["offset"]
+        self.log_inode = state.get("log_inode")
+
+    def _save_state(self):
+        # Caller holds self._fold_lock
+        state = {"format_version": state_format_version, "offset": self.offset, "log_inode": self.log_inode,
+                 "aggregates": self.aggregates.to_state()}
+        temp_path = f"{self.state_path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, "w") as state_file:
+                json.dump(state, state_file, separators=(",", ":"))
+            os.replace(temp_path, self.state_path)
+        except OSError as e:
+            logging.warning(f"Could not save chart state '{self.state_path}': {e}")
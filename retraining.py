@@ -0,0 +1,482 @@
+"""Online drift detection, background retraining and model hot swap.
+
+DriftMonitor keeps lightweight running statistics over a window of scored
+vehicles:
+
+- the mean and spread of each numerical feature, in units of the training
+  data's standard deviation (taken from the served model's feature encoder)
+- how often the model disagrees with the deterministic overload formula,
+  shown next to the rate measured on the training run's test split
+
+Only feature drift counts: when a full window's features drift past a
+threshold it calls on_drift with its report. The disagreement rate is
+reported but not gated on. The training test split is class-balanced when
+the dataset was generated with SMOTE, so its rate is not comparable with
+live traffic, and undrifted traffic alone would trip a disagreement check.
+
+RetrainJob answers that in the background, when retraining is enabled. It
+exports the most recent prediction history as a training dataset, labelled
+the way generate_dataset.py labels the original training data (weight above
+max_load_capacity), holding back every holdout_every-th row.
+train_and_save_model.py trains a candidate on the rest in a scratch
+directory, so nothing the server reads is touched. The candidate is then
+compared with the current bundle on the held-out rows (and on an optional
+fixed reference dataset) and published only if it is at least as accurate
+on each. Every step runs as a subprocess, so the serving process never loads
+scikit-learn or competes with training for the GIL. A lock file allows one
+retrain per host at a time, and a shared cooldown keeps workers from
+retraining back to back.
+
+A published candidate becomes a new model bundle version. BundleWatcher polls
+the bundle's CURRENT pointer in every worker and hands each new version to
+the app, which loads it and swaps it in as one object. Requests already
+being scored finish on the model they started with.
+
+    python retraining.py --history history/predictions.ndjson --output retrain/training_data.csv
+    python retraining.py --compare retrain/candidate/model_bundle --data retrain/holdout.csv
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from contextlib import ExitStack
+
+import numpy as np
+
+from feature_encoder import FeatureEncoder, encoder_filename, numerical_features
+from load_rules import dataset_overload_status
+from model_bundle import bundle_dir, current_version, load_bundle, publish_bundle
+from prediction_history import rotated_log_path
+
+# A feature whose standard deviation halves or doubles against the training data counts as drifted
+spread_ratio_limit = 2.0
+tail_block_bytes = 1 << 20
+module_dir = os.path.dirname(os.path.abspath(__file__))
+# Every holdout_every-th exported row is held out of training and decides whether the candidate is published
+holdout_every = 5
+# Rows of a held-out dataset read for the comparison
+holdout_max_rows = 100_000
+# Written by train_and_save_model.py, which is not imported here because it loads scikit-learn
+model_filename = "vehicle_load_model.pkl"
+
+
+class DriftMonitor:
+    """Windowed feature and disagreement statistics, compared against the served model's training data."""
+
+    def __init__(self, encoder, reference_disagreement=None, window=5000, mean_shift_threshold=0.5, on_drift=None):
+        self.window = window
+        self.mean_shift_threshold = mean_shift_threshold
+        self.on_drift = on_drift
+        self.windows_checked = 0
+        self.drifted_windows = 0
+        self.last_report = None
+        self._lock = threading.Lock()
+        self.reset(encoder, reference_disagreement)
+
+    def reset(self, encoder, reference_disagreement=None):
+        """Compares future windows against a (new) model's training statistics and drops the current window."""
+        with self._lock:
+            self.columns = list(encoder.numeric_columns)
+            self.reference_mean = encoder.mean.copy()
+            self.reference_scale = encoder.scale.copy()
+            self.reference_disagreement = reference_disagreement
+            self._clear()
+
+    def observe(self, entries):
+        """Adds scored entries (record fields plus "predicted_status" and "overload_status")."""
+        if not entries:
+            return
+        with self._lock:
+            # Standardized against the training data, so the window statistics are drift measures directly
+            values = np.array([[entry[column] for column in self.columns] for entry in entries], dtype=np.float64)
+            np.subtract(values, self.reference_mean, out=values)
+            np.divide(values, self.reference_scale, out=values)
+            self.standardized_sum += values.sum(axis=0)
+            self.standardized_squares += np.square(values).sum(axis=0)
+            self.disagreements += sum(entry["predicted_status"] != entry["overload_status"] for entry in entries)
+            self.count += len(entries)
+            if self.count < self.window:
+                return
+            report = self._evaluate()
+            self._clear()
+        if report["drifted"] and self.on_drift is not None:
+            self.on_drift(report)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "window": self.window,
+                "rows_in_window": self.count,
+                "windows_checked": self.windows_checked,
+                "drifted_windows": self.drifted_windows,
+                "reference_disagreement": self.reference_disagreement,
+                "last_report": self.last_report,
+            }
+
+    def _clear(self):
+        self.count = 0
+        self.disagreements = 0
+        self.standardized_sum = np.zeros(len(self.columns))
+        self.standardized_squares = np.zeros(len(self.columns))
+
+    def _evaluate(self):
+        # Caller holds self._lock
+        mean = self.standardized_sum / self.count
+        spread = np.sqrt(np.maximum(self.standardized_squares / self.count - mean ** 2, 0.0))
+        features = {}
+        drifted_features = []
+        for position, column in enumerate(self.columns):
+            mean_shift, spread_ratio = float(mean[position]), float(spread[position])
+            features[column] = {"mean_shift": round(mean_shift, 4), "spread_ratio": round(spread_ratio, 4)}
+            if abs(mean_shift) > self.mean_shift_threshold or not 1 / spread_ratio_limit <= spread_ratio <= spread_ratio_limit:
+                drifted_features.append(column)
+        drifted = bool(drifted_features)
+        self.windows_checked += 1
+        self.drifted_windows += drifted
+        self.last_report = {
+            "checked_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "rows": self.count,
+            "features": features,
+            "drifted_features": drifted_features,
+            "disagreement": round(self.disagreements / self.count, 4),
+            "reference_disagreement": self.reference_disagreement,
+            "drifted": drifted,
+        }
+        return self.last_report
+
+
+def tail_lines(path, count):
+    """Returns the last count complete lines of a file, reading it backwards block by block."""
+    with open(path, "rb") as log:
+        position = log.seek(0, os.SEEK_END)
+        blocks = []
+        newlines = 0
+        # One extra line: the first one in the blocks read so far may be cut off
+        while position > 0 and newlines <= count:
+            step = min(tail_block_bytes, position)
+            position -= step
+            log.seek(position)
+            blocks.append(log.read(step))
+            newlines += blocks[-1].count(b"\n")
+    lines = b"".join(reversed(blocks)).split(b"\n")
+    if position > 0:
+        lines = lines[1:]
+    # The last element is empty, or a line that is still being written
+    return lines[:-1][-count:]
+
+
+def history_tail(history_log, count):
+    """Returns the last count lines of the history, reaching into the rotated log if the current one is shorter."""
+    lines = tail_lines(history_log, count)
+    rotated_path = rotated_log_path(history_log)
+    if len(lines) < count and os.path.exists(rotated_path):
+        lines = tail_lines(rotated_path, count - len(lines)) + lines
+    return lines
+
+
+def export_training_data(history_log, output_path, max_rows, holdout_path=None):
+    """Writes the newest history entries as a training dataset in generate_dataset.py's column layout.
+
+    Rows are labelled by generate_dataset.py's rule, not with the logged
+    overload_status: the /predict formula adds passengers and cargo on top of a
+    weight that already includes them, so a model trained on its verdicts would
+    drift away from the original training labels. With holdout_path, every
+    holdout_every-th row goes to that file instead. Returns the number of
+    training rows written per label.
+    """
+    encoder = FeatureEncoder()
+    label_counts = {}
+    paths = [output_path] + ([holdout_path] if holdout_path else [])
+    temp_paths = [f"{path}.{os.getpid()}.tmp" for path in paths]
+    with ExitStack() as stack:
+        writers = [csv.writer(stack.enter_context(open(path, "w", newline=""))) for path in temp_paths]
+        for writer in writers:
+            writer.writerow(numerical_features + encoder.one_hot_columns + ["overload_status"])
+        exported = 0
+        for line in history_tail(history_log, max_rows):
+            try:
+                entry = json.loads(line)
+                values = {column: int(entry[column]) for column in numerical_features}
+                code = encoder.category_index[entry["vehicle_type"]]
+            except (ValueError, KeyError, TypeError):
+                continue
+            label = str(dataset_overload_status(values["weight"], values["max_load_capacity"]))
+            row = list(values.values()) + [position == code for position in range(len(encoder.categories))] + [label]
+            exported += 1
+            if holdout_path and exported % holdout_every == 0:
+                writers[1].writerow(row)
+                continue
+            writers[0].writerow(row)
+            label_counts[label] = label_counts.get(label, 0) + 1
+    for temp_path, path in zip(temp_paths, paths):
+        os.replace(temp_path, path)
+    return label_counts
+
+
+def holdout_accuracy(data_path, directory=bundle_dir):
+    """Returns the current bundle's accuracy on a dataset in generate_dataset.py's column layout.
+
+    Returns None if the directory has no current bundle.
+    """
+    # Imported here: only the comparison subprocess reads datasets, the serving process never loads pandas
+    import pandas as pd
+
+    if current_version(directory) is None:
+        return None
+    engine, manifest = load_bundle(directory)
+    encoder = FeatureEncoder.from_dict(manifest["encoder"])
+    df = pd.read_csv(data_path, usecols=encoder.one_hot_columns + encoder.numeric_columns + ["overload_status"],
+                     nrows=holdout_max_rows)
+    codes = df[encoder.one_hot_columns].to_numpy().argmax(axis=1)
+    features = encoder.transform_codes(codes, df[encoder.numeric_columns].to_numpy(np.float64))
+    return round(float((engine.predict(features) == df["overload_status"].to_numpy().astype(str)).mean()), 5)
+
+
+class RetrainJob:
+    """Retrains the model on the prediction history in subprocesses, at most one run at a time per host.
+
+    A candidate is published only if it is at least as accurate as the current
+    bundle on the held-out history rows and, if given, on reference_data (a
+    fixed dataset in generate_dataset.py's layout, such as the original
+    training data), so a drift window full of unusual traffic cannot replace a
+    model that still serves normal traffic well.
+    """
+
+    def __init__(self, history_log, work_dir="retrain", min_rows=5000, max_rows=500_000, cooldown_seconds=3600.0,
+                 timeout_seconds=3600.0, train_args=("--n-jobs", "1"), reference_data=None):
+        self.history_log = history_log
+        self.work_dir = work_dir
+        self.reference_data = reference_data
+        self.min_rows = min_rows
+        self.max_rows = max_rows
+        self.cooldown_seconds = cooldown_seconds
+        self.timeout_seconds = timeout_seconds
+        self.train_args = list(train_args)
+        self.runs = 0
+        self.failures = 0
+        self.last_result = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self, reason):
+        """Starts a background retrain unless one is running or the cooldown has not passed. Returns True if started."""
+        with self._lock:
+            if self.running():
+                return False
+            if self._seconds_since_last_run() < self.cooldown_seconds:
+                return False
+            self._thread = threading.Thread(target=self._run, args=(reason,), name="retrain", daemon=True)
+            self._thread.start()
+            return True
+
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def stats(self):
+        return {"running": self.running(), "runs": self.runs, "failures": self.failures, "last_result": self.last_result}
+
+    def _run(self, reason):
+        os.makedirs(self.work_dir, exist_ok=True)
+        if not self._acquire_host_lock():
+            logging.info("Drift detected, but another worker is already retraining the model.")
+            return
+        started = time.perf_counter()
+        try:
+            logging.warning(f"Retraining the model in the background: {reason}")
+            result = self._retrain()
+        except (OSError, subprocess.SubprocessError) as e:
+            result = {"status": "failed", "detail": str(e)}
+        finally:
+            try:
+                os.remove(os.path.join(self.work_dir, "retrain.lock"))
+            except FileNotFoundError:
+                pass  # Another worker took the lock for stale and removed it
+        if result["status"] != "skipped":
+            # The stamp's mtime is the cooldown shared by every worker on the host
+            with open(os.path.join(self.work_dir, "last_retrain"), "w") as stamp:
+                stamp.write(reason)
+        result.update(reason=reason, seconds=round(time.perf_counter() - started, 1),
+                      finished_at=time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()))
+        self.runs += 1
+        self.failures += result["status"] == "failed"
+        self.last_result = result
+        if result["status"] == "published":
+            logging.info(f"Retrained model published as bundle version '{result['bundle_version']}'.")
+        elif result["status"] == "rejected":
+            logging.warning(f"Retrained model not published: {result['detail']}")
+        else:
+            logging.error(f"Retraining did not publish a model ({result['status']}): {result['detail']}")
+
+    def _retrain(self):
+        data_path = os.path.abspath(os.path.join(self.work_dir, "training_data.csv"))
+        holdout_path = os.path.abspath(os.path.join(self.work_dir, "holdout.csv"))
+        export = self._subprocess([os.path.join(module_dir, "retraining.py"), "--history", self.history_log,
+                                   "--output", data_path, "--holdout-output", holdout_path,
+                                   "--max-rows", str(self.max_rows), "--min-rows", str(self.min_rows)])
+        if export.returncode != 0:
+            return {"status": "skipped", "detail": _last_line(export)}
+
+        # The candidate's pickle, encoder and bundle go to a scratch directory until it is accepted
+        candidate_dir = os.path.abspath(os.path.join(self.work_dir, "candidate"))
+        shutil.rmtree(candidate_dir, ignore_errors=True)
+        os.makedirs(candidate_dir)
+        train = self._subprocess([os.path.join(module_dir, "train_and_save_model.py"), "--data", data_path,
+                                  "--report", os.path.abspath(os.path.join(self.work_dir, "training_report.json")),
+                                  *self.train_args], cwd=candidate_dir)
+        candidate_bundle = os.path.join(candidate_dir, bundle_dir)
+        version = current_version(candidate_bundle)
+        # Only forests compile to a bundle that workers can hot-swap
+        if train.returncode != 0 or version is None:
+            return {"status": "failed", "detail": _last_line(train)}
+
+        holdouts = [holdout_path] + ([self.reference_data] if self.reference_data else [])
+        compare = self._subprocess([os.path.join(module_dir, "retraining.py"), "--compare", candidate_bundle,
+                                    *[argument for path in holdouts for argument in ("--data", path)]])
+        if compare.returncode != 0:
+            return {"status": "failed", "detail": _last_line(compare)}
+        accuracy = json.loads(compare.stdout.strip().splitlines()[-1])
+        worse = [path for path, scores in accuracy.items()
+                 if scores["current"] is not None and scores["candidate"] < scores["current"]]
+        if worse:
+            return {"status": "rejected", "bundle_version": version, "holdout_accuracy": accuracy,
+                    "detail": f"less accurate than the current model on {', '.join(worse)}"}
+        if version == current_version():
+            return {"status": "rejected", "bundle_version": version, "holdout_accuracy": accuracy,
+                    "detail": "identical to the current model"}
+
+        # The pickle and encoder first, so workers that swap in the bundle find the pickle it was compiled from
+        for filename in (model_filename, encoder_filename):
+            temp_path = f"{filename}.{os.getpid()}.tmp"
+            shutil.copyfile(os.path.join(candidate_dir, filename), temp_path)
+            os.replace(temp_path, filename)
+        publish_bundle(candidate_bundle, version)
+        return {"status": "published", "bundle_version": version, "holdout_accuracy": accuracy,
+                "detail": _last_line(train)}
+
+    def _subprocess(self, command, cwd=None):
+        return subprocess.run([sys.executable, *command], capture_output=True, text=True, timeout=self.timeout_seconds,
+                              cwd=cwd)
+
+    def _acquire_host_lock(self):
+        path = os.path.join(self.work_dir, "retrain.lock")
+        for _ in range(2):
+            try:
+                fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+            except FileExistsError:
+                try:
+                    # A lock older than the timeout was left behind by a worker that died mid-retrain
+                    if time.time() - os.path.getmtime(path) < self.timeout_seconds * 2:
+                        return False
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                continue
+            with os.fdopen(fd, "w") as lock:
+                lock.write(str(os.getpid()))
+            return True
+        return False
+
+    def _seconds_since_last_run(self):
+        try:
+            return time.time() - os.path.getmtime(os.path.join(self.work_dir, "last_retrain"))
+        except FileNotFoundError:
+            return float("inf")
+
+
+def _last_line(completed):
+    lines = (completed.stdout + completed.stderr).strip().splitlines()
+    return lines[-1] if lines else f"exit code {completed.returncode}"
+
+
+class BundleWatcher:
+    """Polls the model bundle's CURRENT pointer and hands each newly published version to on_change.
+
+    on_change(version) loads and swaps in the model; if it raises, the
+    version is skipped until a newer one is published.
+    """
+
+    def __init__(self, on_change, loaded_version, interval_seconds=5.0, directory=bundle_dir):
+        self.on_change = on_change
+        self.loaded_version = loaded_version
+        self.interval_seconds = interval_seconds
+        self.directory = directory
+        self.swaps = 0
+        self._failed_version = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="bundle-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def check(self):
+        """Swaps in the current bundle version if it is new. Returns True if a swap happened."""
+        version = current_version(self.directory)
+        # A cleared CURRENT means a non-forest model was trained; keep serving what is loaded
+        if version is None or version in (self.loaded_version, self._failed_version):
+            return False
+        try:
+            self.on_change(version)
+        except (OSError, ValueError, KeyError) as e:
+            logging.error(f"Could not swap in model bundle version '{version}': {e}")
+            self._failed_version = version
+            return False
+        self.loaded_version = version
+        self.swaps += 1
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.check()
+            except Exception as e:
+                logging.error(f"Model bundle watcher failed: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the prediction history as a training dataset, "
+                                                 "or compare a retrained model bundle with the current one.")
+    parser.add_argument("--history", default=os.path.join("history", "predictions.ndjson"), help="Prediction history log")
+    parser.add_argument("--output", default=os.path.join("retrain", "training_data.csv"), help="Dataset to write (.csv)")
+    parser.add_argument("--holdout-output", help=f"Write every {holdout_every}th row to this held-out dataset instead")
+    parser.add_argument("--max-rows", type=int, default=500_000, help="Newest history entries to export")
+    parser.add_argument("--min-rows", type=int, default=5000,
+                        help="Exit with an error if fewer rows (or only one label) could be exported")
+    parser.add_argument("--compare", metavar="BUNDLE_DIR",
+                        help="Instead of exporting, print the accuracy of the current bundle in BUNDLE_DIR and of "
+                             f"the one in '{bundle_dir}' on each --data file, as JSON")
+    parser.add_argument("--data", action="append", default=[], help="Held-out dataset for --compare (repeatable)")
+    args = parser.parse_args()
+
+    if args.compare:
+        print(json.dumps({path: {"candidate": holdout_accuracy(path, args.compare), "current": holdout_accuracy(path)}
+                          for path in args.data}))
+        return
+    if not os.path.exists(args.history):
+        print(f"Error: Prediction history '{args.history}' not found.")
+        sys.exit(1)
+    for path in (args.output, args.holdout_output):
+        directory = os.path.dirname(path or "")
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+    label_counts = export_training_data(args.history, args.output, args.max_rows, args.holdout_output)
+    rows = sum(label_counts.values())
+    print(f"Exported {rows} rows to '{args.output}': {label_counts}")
+    if rows < args.min_rows or len(label_counts) < 2:
+        print(f"Error: need at least {args.min_rows} rows with both labels to retrain.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
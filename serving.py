@@ -0,0 +1,120 @@
+"""Micro-batching for concurrent prediction requests.
+
+Request threads submit single records to a MicroBatcher and wait on a Future.
+A dispatcher thread drains the bounded queue into micro-batches (up to
+max_batch_size records, waiting at most max_wait_ms after the first one) and
+hands each batch to a small pool of scoring threads, which run one vectorized
+model call and resolve every request's Future. Scoring threads are limited by
+a semaphore, so when they are all busy requests accumulate in the queue,
+batches grow, and once the queue is full new requests are rejected with
+QueueFullError instead of piling up.
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class QueueFullError(Exception):
+    """Raised when the micro-batching queue cannot accept another request."""
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-record requests into batched model calls."""
+
+    def __init__(self, score_batch, max_batch_size=64, max_wait_ms=2.0, max_queue_size=1024, workers=2):
+        self.score_batch = score_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="microbatch")
+        self._slots = threading.Semaphore(workers)
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.rejected = 0
+        self._closed = False
+        self._dispatcher = threading.Thread(target=self._dispatch, name="microbatch-dispatcher", daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, item):
+        """Queues one record for scoring and returns a Future for its result.
+
+        Raises QueueFullError if the queue is full.
+        """
+        if self._closed:
+            raise QueueFullError("Micro-batcher is shut down")
+        future = Future()
+        try:
+            self._queue.put_nowait((item, future))
+        except queue.Full:
+            with self._stats_lock:
+                self.rejected += 1
+            raise QueueFullError("Prediction queue is full")
+        return future
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+                "rejected": self.rejected,
+                "queue_depth": self._queue.qsize(),
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+            }
+
+    def close(self):
+        self._closed = True
+        self._queue.put((None, None))
+        self._dispatcher.join()
+        self._executor.shutdown(wait=True)
+
+    def _dispatch(self):
+        while True:
+            item, future = self._queue.get()
+            if future is None:
+                return
+            batch = [(item, future)]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item, future = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if future is None:
+                    # Shutting down: score what we have, then stop
+                    self._slots.acquire()
+                    self._executor.submit(self._score, batch)
+                    return
+                batch.append((item, future))
+            # Wait for a free scoring thread; meanwhile new requests queue up and form the next batch
+            self._slots.acquire()
+            self._executor.submit(self._score, batch)
+
+    def _score(self, batch):
+        try:
+            pending = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+            if not pending:
+                return
+            items = [item for item, _ in pending]
+            futures = [future for _, future in pending]
+            try:
+                results = self.score_batch(items)
+            except Exception as e:
+                logging.error(f"Micro-batch of {len(items)} failed: {e}")
+                for future in futures:
+                    future.set_exception(e)
+                return
+            for future, result in zip(futures, results):
+                future.set_result(result)
+            with self._stats_lock:
+                self.batches += 1
+                self.items += len(items)
+        finally:
+            self._slots.release()
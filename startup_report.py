@@ -0,0 +1,156 @@
+"""Worker start-up report: import time and resident memory per module.
+
+ImportProfiler wraps the import statement while a process starts. For every
+top-level package imported for the first time it records the wall time and
+the change in resident memory, both cumulative (including the packages it
+pulled in) and self (excluding them). Other start-up work, such as loading
+the model, is timed with stage(). app.py installs the profiler before its
+first import, logs the report once start-up is done and serves it on
+/startup.
+
+    python startup_report.py                 # cold-start report for the current profile
+    python startup_report.py --profile slim  # compare against the slim serving profile
+"""
+import argparse
+import builtins
+import json
+import os
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+try:
+    import resource  # Peak memory fallback where /proc is not available (not on Windows)
+except ImportError:
+    resource = None
+
+# Heavy packages the report calls out by name, to show which ones a profile avoided
+watched_packages = ["pandas", "sklearn", "scipy", "matplotlib", "seaborn", "imblearn"]
+
+
+def resident_memory_mb():
+    """Current resident memory of this process in MB (the peak where /proc is not available)."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return round(int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20, 1)
+    except (OSError, ValueError, AttributeError):
+        pass
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return round(max_rss / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+class ImportProfiler:
+    """Records per-package import cost and named start-up stages."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.started_rss_mb = resident_memory_mb()
+        self.imports = []
+        self.stages = []
+        self.finished = None
+        self._original_import = None
+        self._active = []  # Frames of the imports in progress: [child seconds, child MB]
+
+    def install(self):
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._import
+
+    def uninstall(self):
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    @contextmanager
+    def stage(self, name):
+        start, start_rss = time.perf_counter(), resident_memory_mb()
+        try:
+            yield
+        finally:
+            self.stages.append({"stage": name, "ms": round((time.perf_counter() - start) * 1000, 1),
+                                "rss_delta_mb": _delta(start_rss, resident_memory_mb())})
+
+    def finish(self):
+        """Stops recording imports and returns the report."""
+        self.uninstall()
+        self.finished = time.perf_counter()
+        return self.report()
+
+    def report(self):
+        end = self.finished or time.perf_counter()
+        return {
+            "pid": os.getpid(),
+            "profile": os.environ.get("VLMS_PROFILE", "full"),
+            "startup_ms": round((end - self.started) * 1000, 1),
+            "rss_mb": resident_memory_mb(),
+            "rss_at_start_mb": self.started_rss_mb,
+            "modules_loaded": len(sys.modules),
+            "heavy_packages_loaded": [name for name in watched_packages if name in sys.modules],
+            "stages": self.stages,
+            "imports": sorted(self.imports, key=lambda record: record["self_ms"], reverse=True),
+        }
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        top_level = name.partition(".")[0]
+        if level or top_level in sys.modules:
+            return self._original_import(name, globals, locals, fromlist, level)
+        start, start_rss = time.perf_counter(), resident_memory_mb()
+        self._active.append([0.0, 0.0])
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            child_seconds, child_mb = self._active.pop()
+            seconds = time.perf_counter() - start
+            rss_mb = _delta(start_rss, resident_memory_mb()) or 0.0
+            if self._active:
+                self._active[-1][0] += seconds
+                self._active[-1][1] += rss_mb
+            if top_level in sys.modules:
+                self.imports.append({"module": top_level,
+                                     "cumulative_ms": round(seconds * 1000, 1),
+                                     "self_ms": round((seconds - child_seconds) * 1000, 1),
+                                     "cumulative_rss_mb": round(rss_mb, 1),
+                                     "self_rss_mb": round(rss_mb - child_mb, 1)})
+
+
+def _delta(before, after):
+    if before is None or after is None:
+        return None
+    return round(after - before, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the cold start of a prediction service worker.")
+    parser.add_argument("--profile", choices=["full", "slim"], default=os.environ.get("VLMS_PROFILE", "full"))
+    parser.add_argument("--top", type=int, default=15, help="Number of imports to list")
+    parser.add_argument("--output", help="Also write the report to this JSON file")
+    args = parser.parse_args()
+
+    # A fresh interpreter, so nothing is imported before app.py starts its profiler
+    env = dict(os.environ, VLMS_PROFILE=args.profile, VLMS_CHART_REFRESH_SECONDS="3600")
+    completed = subprocess.run([sys.executable, "-c", "import json, app; print(json.dumps(app.startup_report))"],
+                               env=env, capture_output=True, text=True)
+    lines = completed.stdout.strip().splitlines()
+    if completed.returncode != 0 or not lines:
+        sys.exit(f"Importing app failed:\n{completed.stderr}")
+    report = json.loads(lines[-1])
+
+    print(f"profile {report['profile']}: start-up {report['startup_ms']} ms, RSS {report['rss_mb']} MB, "
+          f"{report['modules_loaded']} modules")
+    print(f"heavy packages loaded: {', '.join(report['heavy_packages_loaded']) or 'none'}")
+    for stage in report["stages"]:
+        print(f"  stage {stage['stage']}: {stage['ms']} ms, RSS change {stage['rss_delta_mb']} MB")
+    print(f"{'module':<24}{'self ms':>10}{'total ms':>10}{'self MB':>10}")
+    for record in report["imports"][:args.top]:
+        print(f"{record['module']:<24}{record['self_ms']:>10}{record['cumulative_ms']:>10}{record['self_rss_mb']:>10}")
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+        print(f"Report saved to '{args.output}'.")
+
+
+if __name__ == "__main__":
+    main()
@@ -82,6 +82,249 @@ maxLoadInput.addEventListener("input", validateInputs);
 passengerInput.addEventListener("input", validateInputs);
 cargoInput.addEventListener("input", validateInputs);
 
+// Chart name -> <canvas> id. The numbers come from /charts/<name>.json and are drawn here.
+const chartCanvases = {
+    histogram: "histogram",
+    boxplot: "boxplot",
+    scatter_plot: "scatter",
+    heatmap: "heatmap",
+    pair_plot: "pairplot",
+    count_plot: "countplot"
+};
+
+// ETag of the chart data each canvas currently shows
+const chartVersions = {};
+
+function formatLabel(column) {
+    return column.replace(/_/g, " ").replace(/\b\w/g, letter => letter.toUpperCase());
+}
+
+function formatNumber(value) {
+    return Math.abs(value) >= 1000 ? `${(value / 1000).toFixed(1)}k` : `${Math.round(value * 100) / 100}`;
+}
+
+// Returns a function mapping values in [min, max] onto pixels in [start, end]
+function linearScale(min, max, start, end) {
+    const span = max - min || 1;
+    return value => start + (value - min) / span * (end - start);
+}
+
+// Clears the canvas, draws the title and returns the context with the plot area
+function prepareCanvas(canvas, title) {
+    const ctx = canvas.getContext("2d");
+    ctx.fillStyle = "#ffffff";
+    ctx.fillRect(0, 0, canvas.width, canvas.height);
+    ctx.fillStyle = "#000000";
+    ctx.font = "14px sans-serif";
+    ctx.textAlign = "center";
+    ctx.fillText(title, canvas.width / 2, 18);
+    const area = { left: 60, right: canvas.width - 20, top: 30, bottom: canvas.height - 45 };
+    return { ctx, area };
+}
+
+function drawEmpty(canvas, title) {
+    const { ctx } = prepareCanvas(canvas, title);
+    ctx.fillStyle = "#666666";
+    ctx.fillText("No predictions recorded yet", canvas.width / 2, canvas.height / 2);
+}
+
+function drawAxes(ctx, area, xLabel, yLabel, xRange, yRange) {
+    ctx.strokeStyle = "#333333";
+    ctx.beginPath();
+    ctx.moveTo(area.left, area.top);
+    ctx.lineTo(area.left, area.bottom);
+    ctx.lineTo(area.right, area.bottom);
+    ctx.stroke();
+    ctx.fillStyle = "#000000";
+    ctx.font = "11px sans-serif";
+    ctx.textAlign = "center";
+    if (xRange) {
+        ctx.fillText(formatNumber(xRange[0]), area.left, area.bottom + 14);
+        ctx.fillText(formatNumber(xRange[1]), area.right, area.bottom + 14);
+    }
+    if (xLabel) {
+        ctx.fillText(xLabel, (area.left + area.right) / 2, area.bottom + 32);
+    }
+    if (yRange) {
+        ctx.textAlign = "right";
+        ctx.fillText(formatNumber(yRange[0]), area.left - 4, area.bottom);
+        ctx.fillText(formatNumber(yRange[1]), area.left - 4, area.top + 8);
+    }
+    if (yLabel) {
+        ctx.save();
+        ctx.translate(14, (area.top + area.bottom) / 2);
+        ctx.rotate(-Math.PI / 2);
+        ctx.textAlign = "center";
+        ctx.fillText(yLabel, 0, 0);
+        ctx.restore();
+    }
+}
+
+function drawBars(ctx, edges, counts, area) {
+    const x = linearScale(edges[0], edges[edges.length - 1], area.left, area.right);
+    const y = linearScale(0, Math.max(...counts), area.bottom, area.top);
+    ctx.fillStyle = "#4c72b0";
+    counts.forEach((count, i) => {
+        ctx.fillRect(x(edges[i]), y(count), Math.max(1, x(edges[i + 1]) - x(edges[i]) - 1), area.bottom - y(count));
+    });
+}
+
+function drawPoints(ctx, xs, ys, area, radius) {
+    const x = linearScale(Math.min(...xs), Math.max(...xs), area.left, area.right);
+    const y = linearScale(Math.min(...ys), Math.max(...ys), area.bottom, area.top);
+    ctx.fillStyle = "rgba(76, 114, 176, 0.6)";
+    xs.forEach((value, i) => {
+        ctx.beginPath();
+        ctx.arc(x(value), y(ys[i]), radius, 0, 2 * Math.PI);
+        ctx.fill();
+    });
+}
+
+function drawHistogram(canvas, chart) {
+    const title = "Histogram of Vehicle Weight";
+    if (!chart.counts.length) return drawEmpty(canvas, title);
+    const { ctx, area } = prepareCanvas(canvas, title);
+    drawBars(ctx, chart.edges, chart.counts, area);
+    drawAxes(ctx, area, formatLabel(chart.column), "Frequency",
+             [chart.edges[0], chart.edges[chart.edges.length - 1]], [0, Math.max(...chart.counts)]);
+}
+
+function drawBoxplot(canvas, chart) {
+    const title = "Boxplot of Vehicle Weight";
+    const stats = chart.stats;
+    if (!stats) return drawEmpty(canvas, title);
+    const { ctx, area } = prepareCanvas(canvas, title);
+    const x = linearScale(stats.whislo, stats.whishi, area.left + 10, area.right - 10);
+    const middle = (area.top + area.bottom) / 2;
+    const half = (area.bottom - area.top) / 6;
+    ctx.strokeStyle = "#000000";
+    ctx.fillStyle = "#4c72b0";
+    ctx.fillRect(x(stats.q1), middle - half, x(stats.q3) - x(stats.q1), 2 * half);
+    ctx.strokeRect(x(stats.q1), middle - half, x(stats.q3) - x(stats.q1), 2 * half);
+    ctx.beginPath();
+    ctx.moveTo(x(stats.whislo), middle);
+    ctx.lineTo(x(stats.q1), middle);
+    ctx.moveTo(x(stats.q3), middle);
+    ctx.lineTo(x(stats.whishi), middle);
+    for (const value of [stats.whislo, stats.whishi]) {
+        ctx.moveTo(x(value), middle - half / 2);
+        ctx.lineTo(x(value), middle + half / 2);
+    }
+    ctx.moveTo(x(stats.median), middle - half);
+    ctx.lineTo(x(stats.median), middle + half);
+    ctx.stroke();
+    drawAxes(ctx, area, formatLabel(chart.column), null, [stats.whislo, stats.whishi], null);
+}
+
+function drawScatter(canvas, chart) {
+    const title = "Scatter Plot of Weight vs. Cargo Weight";
+    if (!chart.x.length) return drawEmpty(canvas, title);
+    const { ctx, area } = prepareCanvas(canvas, title);
+    drawPoints(ctx, chart.x, chart.y, area, 2.5);
+    drawAxes(ctx, area, formatLabel(chart.x_column), formatLabel(chart.y_column),
+             [Math.min(...chart.x), Math.max(...chart.x)], [Math.min(...chart.y), Math.max(...chart.y)]);
+}
+
+function drawHeatmap(canvas, chart) {
+    const title = "Heatmap of Vehicle Features";
+    const { ctx } = prepareCanvas(canvas, title);
+    const size = chart.columns.length;
+    const left = 120, top = 40;
+    const cell = Math.min((canvas.width - left - 20) / size, (canvas.height - top - 20) / size);
+    ctx.font = "11px sans-serif";
+    chart.matrix.forEach((row, i) => {
+        row.forEach((value, j) => {
+            // -1 is dark purple, 0 teal, 1 yellow, like the viridis colormap used before
+            const t = value === null ? null : (value + 1) / 2;
+            ctx.fillStyle = t === null ? "#dddddd" : `hsl(${280 - 220 * t}, 70%, ${25 + 35 * t}%)`;
+            ctx.fillRect(left + j * cell, top + i * cell, cell - 1, cell - 1);
+            ctx.fillStyle = t !== null && t > 0.6 ? "#000000" : "#ffffff";
+            ctx.textAlign = "center";
+            ctx.fillText(value === null ? "" : value.toFixed(2), left + (j + 0.5) * cell, top + (i + 0.5) * cell + 4);
+        });
+        ctx.fillStyle = "#000000";
+        ctx.textAlign = "right";
+        ctx.fillText(chart.columns[i], left - 6, top + (i + 0.5) * cell + 4);
+    });
+}
+
+function drawPairPlot(canvas, chart) {
+    const title = "Pair Plot of Vehicle Features";
+    if (!chart.sample.length) return drawEmpty(canvas, title);
+    const { ctx } = prepareCanvas(canvas, title);
+    const size = chart.columns.length;
+    const left = 30, top = 30;
+    const cell = Math.min((canvas.width - left - 10) / size, (canvas.height - top - 10) / size);
+    chart.columns.forEach((yColumn, row) => {
+        chart.columns.forEach((xColumn, col) => {
+            const area = { left: left + col * cell + 6, right: left + (col + 1) * cell - 6,
+                           top: top + row * cell + 6, bottom: top + (row + 1) * cell - 6 };
+            ctx.strokeStyle = "#cccccc";
+            ctx.strokeRect(area.left, area.top, area.right - area.left, area.bottom - area.top);
+            if (row === col) {
+                const histogram = chart.histograms[xColumn];
+                if (histogram.counts.length) drawBars(ctx, histogram.edges, histogram.counts, area);
+            } else {
+                drawPoints(ctx, chart.sample.map(values => values[col]), chart.sample.map(values => values[row]), area, 1.2);
+            }
+        });
+        ctx.save();
+        ctx.fillStyle = "#000000";
+        ctx.font = "10px sans-serif";
+        ctx.textAlign = "center";
+        ctx.translate(left - 12, top + (row + 0.5) * cell);
+        ctx.rotate(-Math.PI / 2);
+        ctx.fillText(yColumn, 0, 0);
+        ctx.restore();
+    });
+}
+
+function drawCountPlot(canvas, chart) {
+    const title = "Count Plot of Vehicle Types";
+    if (!chart.counts.length) return drawEmpty(canvas, title);
+    const { ctx, area } = prepareCanvas(canvas, title);
+    const y = linearScale(0, Math.max(...chart.counts), area.bottom, area.top);
+    const slot = (area.right - area.left) / chart.counts.length;
+    chart.counts.forEach((count, i) => {
+        ctx.fillStyle = "#4c72b0";
+        ctx.fillRect(area.left + i * slot + slot * 0.1, y(count), slot * 0.8, area.bottom - y(count));
+        ctx.fillStyle = "#000000";
+        ctx.font = "11px sans-serif";
+        ctx.textAlign = "center";
+        ctx.fillText(chart.labels[i], area.left + (i + 0.5) * slot, area.bottom + 14);
+    });
+    drawAxes(ctx, area, formatLabel(chart.column), "Count", null, [0, Math.max(...chart.counts)]);
+}
+
+const chartDrawers = {
+    histogram: drawHistogram,
+    boxplot: drawBoxplot,
+    scatter_plot: drawScatter,
+    heatmap: drawHeatmap,
+    pair_plot: drawPairPlot,
+    count_plot: drawCountPlot
+};
+
+// Fetches the chart data and redraws the charts that changed
+function loadCharts() {
+    for (const [name, canvasId] of Object.entries(chartCanvases)) {
+        const canvas = document.getElementById(canvasId);
+        if (!canvas) continue;
+        // "no-cache" revalidates with If-None-Match, so unchanged chart data comes back as a 304
+        fetch(`/charts/${name}.json`, { cache: "no-cache" })
+            .then(response => {
+                if (!response.ok) throw new Error(`Chart ${name} failed with status ${response.status}`);
+                const version = response.headers.get("ETag");
+                if (version && chartVersions[name] === version) return;
+                return response.json().then(chart => {
+                    chartDrawers[name](canvas, chart);
+                    chartVersions[name] = version;
+                });
+            })
+            .catch(error => console.error('Error:', error));
+    }
+}
+
 // Prediction Function
 function predict() {
     const form = document.getElementById("predictionForm");
@@ -135,17 +378,9 @@ function predict() {
             // Show Graph Section
             const graphSection = document.getElementById('dataVisualizationSection');
             if (graphSection) {
-                graphSection.style.display = 'block'; // Corrected to 'block'
-                console.log("Graph section display:", graphSection.style.display);
+                graphSection.style.display = 'block';
             }
-
-            // Modal Logic (Assuming you have openModal defined)
-            const graphs = document.querySelectorAll('.graphs img');
-            graphs.forEach(graph => {
-                graph.onclick = function() {
-                    openModal(this.src);
-                };
-            });
+            loadCharts();
         }
     })
     .catch(error => console.error('Error:', error));
@@ -0,0 +1,150 @@
+"""Streaming ingestion of continuous vehicle readings.
+
+/predict/stream takes a long-lived NDJSON request body (chunked transfer
+encoding is fine) and answers with one verdict per record as soon as it is
+scored, as NDJSON or as server-sent events. A reader thread splits the body
+into lines and hands them over through a bounded queue. The response
+generator drains the queue into small batches (up to batch_size records,
+waiting at most max_wait_ms after the first one) and scores each batch with
+one call.
+
+Memory stays bounded however long the stream runs. Only the queue holds
+records, and it is bounded: when scoring falls behind, the reader stops
+reading and TCP flow control slows the sender down. Lines longer than
+max_line_bytes are skipped without being buffered.
+"""
+import json
+import logging
+import queue
+import threading
+import time
+
+# Marks the end of the request body in the queue
+_end = object()
+
+
+class StreamReader:
+    """Reads an NDJSON body on its own thread and queues (index, record, error) tuples."""
+
+    def __init__(self, stream, max_pending, max_line_bytes):
+        # Deliberately unbuffered: a buffered reader would hold complete lines back until its buffer fills
+        self.stream = stream
+        self.max_line_bytes = max_line_bytes
+        self.queue = queue.Queue(maxsize=max_pending)
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stream-reader", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _put(self, item):
+        # Block while the queue is full (backpressure), but give up once the response is closed
+        while not self._stopped.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self):
+        index = 0
+        try:
+            while not self._stopped.is_set():
+                line = self.stream.readline(self.max_line_bytes + 1)
+                if not line:
+                    break
+                if len(line) > self.max_line_bytes and not line.endswith(b"\n"):
+                    # Skip the rest of the over-long line without buffering it
+                    while line and not line.endswith(b"\n"):
+                        line = self.stream.readline(self.max_line_bytes)
+                    item = (index, None, f"Line exceeds {self.max_line_bytes} bytes")
+                elif not line.strip():
+                    continue
+                else:
+                    try:
+                        item = (index, json.loads(line), None)
+                    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                        item = (index, None, f"Invalid JSON: {getattr(e, 'msg', e)}")
+                if not self._put(item):
+                    return
+                index += 1
+        except (OSError, ValueError) as e:
+            # The client went away or the body was malformed; end the stream with what was read
+            logging.info(f"Stream input ended early: {e}")
+        self._put(_end)
+
+
+def score_stream(stream, score_batch, batch_size=32, max_wait_ms=20.0, max_line_bytes=16384, heartbeat_seconds=None):
+    """Scores an NDJSON stream in small batches and yields (event, payload) pairs.
+
+    score_batch takes a list of decoded records and returns one result dict
+    per record (with an "error" key for rejected ones). Yields ("verdicts",
+    results with their "index") per batch, so each batch goes out in one
+    write, ("heartbeat", None) after heartbeat_seconds without input (when
+    set) and finally ("end", summary).
+    """
+    reader = StreamReader(stream, max_pending=batch_size * 4, max_line_bytes=max_line_bytes)
+    reader.start()
+    max_wait = max_wait_ms / 1000.0
+    count = 0
+    error_count = 0
+    finished = False
+    try:
+        while not finished:
+            try:
+                item = reader.queue.get(timeout=heartbeat_seconds)
+            except queue.Empty:
+                yield "heartbeat", None
+                continue
+            # Collect a small batch: whatever arrives within max_wait of the first record
+            batch = []
+            deadline = time.perf_counter() + max_wait
+            while item is not _end:
+                batch.append(item)
+                if len(batch) >= batch_size:
+                    break
+                try:
+                    item = reader.queue.get(timeout=max(0.0, deadline - time.perf_counter()))
+                except queue.Empty:
+                    break
+            else:
+                finished = True
+
+            decoded = [(index, record) for index, record, error in batch if error is None]
+            results = {index: {"error": error} for index, _, error in batch if error is not None}
+            if decoded:
+                try:
+                    scored = score_batch([record for _, record in decoded])
+                except Exception as e:
+                    logging.error(f"Stream scoring error: {e}")
+                    scored = [{"error": "An error occurred during prediction."}] * len(decoded)
+                results.update((index, result) for (index, _), result in zip(decoded, scored))
+            if batch:
+                count += len(batch)
+                error_count += sum("error" in result for result in results.values())
+                yield "verdicts", [{"index": index, **results[index]} for index, _, _ in batch]
+        yield "end", {"count": count, "error_count": error_count}
+    finally:
+        reader.stop()
+
+
+def format_ndjson(event, payload):
+    """Formats a score_stream event as an NDJSON line (heartbeats are dropped)."""
+    if event == "heartbeat":
+        return ""
+    if event == "end":
+        return json.dumps({"done": True, **payload}) + "\n"
+    return "".join(json.dumps(verdict) + "\n" for verdict in payload)
+
+
+def format_sse(event, payload):
+    """Formats a score_stream event as a server-sent event."""
+    if event == "heartbeat":
+        return ": keep-alive\n\n"
+    if event == "end":
+        return f"event: end\ndata: {json.dumps(payload)}\n\n"
+    return "".join(f"id: {verdict['index']}\nevent: verdict\ndata: {json.dumps(verdict)}\n\n" for verdict in payload)
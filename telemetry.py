@@ -0,0 +1,179 @@
+"""Request telemetry: per-stage timers, Prometheus metrics and sampled JSON logs.
+
+Each request gets a RequestTimer that accumulates the time spent in named
+stages (parse, preprocess, predict, suggest, record, render). When the
+request finishes the durations feed latency histograms that /metrics exposes
+in the Prometheus text format, and a sampled fraction of requests (plus every
+slow one) is logged as a single structured JSON line. The JSON is only built
+if the line is actually emitted.
+
+Metrics are kept per process; with several workers, scrape each one or run a
+single worker per metrics endpoint.
+"""
+import json
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from sub-millisecond model calls to multi-second outliers
+default_buckets = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(label_names, label_values, extra=()):
+    pairs = list(zip(label_names, label_values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    """A monotonically increasing Prometheus counter with labels."""
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    """A Prometheus histogram with labels and fixed bucket boundaries."""
+
+    def __init__(self, name, help_text, label_names=(), buckets=default_buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for position, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[position] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = sorted((label_values, list(series)) for label_values, series in self._series.items())
+        for label_values, series in snapshot:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, series):
+                cumulative += bucket_count
+                labels = _format_labels(self.label_names, label_values, [("le", repr(float(bound)))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, label_values, [("le", "+Inf")])
+            lines.append(f"{self.name}_bucket{labels} {series[-1]}")
+            labels = _format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {series[-2]}")
+            lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+
+class _JsonLine:
+    """Defers JSON serialization until the logging framework formats the record."""
+
+    __slots__ = ("payload",)
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def __str__(self):
+        return json.dumps(self.payload, separators=(",", ":"), default=str)
+
+
+class RequestTimer:
+    """Accumulates stage durations for one request."""
+
+    __slots__ = ("endpoint", "started", "stages", "fields")
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.fields = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def annotate(self, **fields):
+        """Adds fields to this request's structured log line (only serialized if it is emitted)."""
+        self.fields.update(fields)
+
+
+class Telemetry:
+    """Collects request metrics and writes sampled structured request logs."""
+
+    def __init__(self, sample_rate=0.01, slow_request_seconds=1.0, logger_name="vlms.requests"):
+        self.sample_rate = sample_rate
+        self.slow_request_seconds = slow_request_seconds
+        self.logger = logging.getLogger(logger_name)
+        self.requests = Counter("vlms_requests_total", "Requests handled, by endpoint and status code.",
+                                ["endpoint", "status"])
+        self.request_seconds = Histogram("vlms_request_duration_seconds", "End-to-end request latency.",
+                                         ["endpoint"])
+        self.stage_seconds = Histogram("vlms_stage_duration_seconds", "Latency of each request stage.",
+                                       ["endpoint", "stage"])
+
+    def start(self, endpoint):
+        return RequestTimer(endpoint)
+
+    def finish(self, timer, status):
+        elapsed = time.perf_counter() - timer.started
+        self.requests.inc(timer.endpoint, str(status))
+        self.request_seconds.observe(elapsed, timer.endpoint)
+        for stage, seconds in timer.stages.items():
+            self.stage_seconds.observe(seconds, timer.endpoint, stage)
+
+        if (elapsed >= self.slow_request_seconds or random.random() < self.sample_rate) \
+                and self.logger.isEnabledFor(logging.INFO):
+            payload = {
+                "event": "request",
+                "endpoint": timer.endpoint,
+                "status": status,
+                "duration_ms": round(elapsed * 1000, 3),
+                "stages_ms": {stage: round(seconds * 1000, 3) for stage, seconds in timer.stages.items()},
+            }
+            payload.update(timer.fields)
+            self.logger.info("%s", _JsonLine(payload))
+
+    def render(self, extra_metrics=None):
+        """Returns all metrics in the Prometheus text exposition format.
+
+        extra_metrics maps metric name -> (type, help text, value) for values
+        owned by other components, such as the prediction cache counters.
+        """
+        lines = self.requests.render() + self.request_seconds.render() + self.stage_seconds.render()
+        for name, (metric_type, help_text, value) in (extra_metrics or {}).items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,64 @@
+"""Shared fixtures: a small trained model in a scratch directory, and the app serving it."""
+import importlib
+import os
+import pickle
+import sys
+
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from feature_encoder import FeatureEncoder, encoder_filename, numerical_features
+from forest_engine import compile_forest
+from generate_dataset import generate_chunk
+from model_bundle import bundle_dir, save_bundle
+
+
+@pytest.fixture(scope="session")
+def dataset():
+    """Raw generated vehicles (no SMOTE), as generate_dataset.py draws them."""
+    return generate_chunk(3000, np.random.default_rng(0))
+
+
+@pytest.fixture(scope="session")
+def trained_dir(tmp_path_factory, dataset):
+    """A directory holding a small forest as pickle, encoder and current model bundle."""
+    directory = tmp_path_factory.mktemp("served")
+    encoder = FeatureEncoder()
+    numerical = dataset[numerical_features].to_numpy(np.float64)
+    encoder.partial_fit(numerical)
+    features = encoder.transform_codes(encoder.codes(dataset["vehicle_type"].astype(str)), numerical)
+    model = RandomForestClassifier(n_estimators=10, max_depth=8, random_state=0)
+    model.fit(features, dataset["overload_status"].to_numpy())
+    with open(directory / "vehicle_load_model.pkl", "wb") as model_file:
+        pickle.dump(model, model_file)
+    encoder.save(str(directory / encoder_filename))
+    save_bundle(compile_forest(model), encoder, str(directory / bundle_dir))
+    return directory
+
+
+@pytest.fixture(scope="session")
+def app_module(trained_dir):
+    """The app module, imported inside trained_dir with retraining, hot swap and chart refresh off."""
+    previous_dir = os.getcwd()
+    os.environ.update({"VLMS_HISTORY_LOG": str(trained_dir / "history" / "predictions.ndjson"),
+                       "VLMS_RETRAIN": "0", "VLMS_MODEL_RELOAD_SECONDS": "0",
+                       "VLMS_CHART_REFRESH_SECONDS": "3600", "VLMS_TELEMETRY_SAMPLE_RATE": "0"})
+    os.chdir(trained_dir)
+    try:
+        yield importlib.import_module("app")
+    finally:
+        os.chdir(previous_dir)
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def vehicle():
+    return {"vehicle_type": "4-wheeler 5-seater", "weight": 1500, "max_load_capacity": 1800,
+            "passenger_count": 3, "cargo_weight": 200}
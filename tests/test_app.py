@@ -0,0 +1,97 @@
+"""Record validation and the /predict and /predict/batch endpoints."""
+import pytest
+
+
+@pytest.mark.parametrize("field, value, message", [
+    ("weight", True, "must be a number"),
+    ("weight", [1500], "must be a number"),
+    ("weight", 1500.5, "must be a whole number"),
+    ("weight", "heavy", "must be a whole number"),
+    ("weight", -1, "must be between 0 and"),
+    ("weight", 10 ** 20, "must be between 0 and"),
+    ("weight", 1e30, "must be between 0 and"),
+    ("vehicle_type", "spaceship", "Unknown vehicle type"),
+    ("vehicle_type", 3, "Unknown vehicle type"),
+])
+def test_validate_record_rejects(app_module, vehicle, field, value, message):
+    with pytest.raises(ValueError, match=message):
+        app_module.validate_record({**vehicle, field: value})
+
+
+def test_validate_record_converts_whole_numbers(app_module, vehicle):
+    record = app_module.validate_record({**vehicle, "weight": 1500.0, "cargo_weight": "200"})
+    assert record["weight"] == 1500 and record["cargo_weight"] == 200
+    assert all(type(record[field]) is int for field in ["weight", "max_load_capacity", "passenger_count", "cargo_weight"])
+
+
+def test_validate_record_reports_missing_fields(app_module):
+    with pytest.raises(ValueError, match="Missing fields: weight"):
+        app_module.validate_record({"vehicle_type": "2-wheeler", "max_load_capacity": 200,
+                                    "passenger_count": 1, "cargo_weight": 10})
+
+
+def test_predict(client, vehicle):
+    response = client.post("/predict", json=vehicle)
+    assert response.status_code == 200
+    result = response.get_json()
+    # 1500 + 3 x 75 + 200 against 1800
+    assert result["overload_amount"] == 125 and result["overload_status"] == "Overloaded"
+    assert result["predicted_status"] in ("Overloaded", "Not Overloaded")
+
+
+@pytest.mark.parametrize("body, content_type", [
+    ("{not json", "application/json"),
+    ('{"weight": 1}', "text/plain"),
+    ("", "application/json"),
+])
+def test_predict_rejects_unreadable_body(client, body, content_type):
+    response = client.post("/predict", data=body, content_type=content_type)
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+def test_predict_rejects_invalid_record(client, vehicle):
+    response = client.post("/predict", json={**vehicle, "weight": 1e30})
+    assert response.status_code == 400
+    assert "weight" in response.get_json()["error"]
+
+
+def test_predict_batch_reports_errors_per_row(client, vehicle):
+    response = client.post("/predict/batch", json=[vehicle, {**vehicle, "weight": True}, "nope", vehicle])
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["count"] == 4 and body["error_count"] == 2
+    results = body["results"]
+    assert [result["index"] for result in results] == [0, 1, 2, 3]
+    assert "must be a number" in results[1]["error"] and "error" in results[2]
+    assert results[0]["predicted_status"] == results[3]["predicted_status"]
+
+
+def test_predict_batch_matches_predict(client, vehicle):
+    single = client.post("/predict", json=vehicle).get_json()
+    batch = client.post("/predict/batch", json=[vehicle]).get_json()["results"][0]
+    assert {key: batch[key] for key in single} == single
+
+
+def test_predict_batch_accepts_ndjson(client, vehicle):
+    import json
+    body = json.dumps(vehicle) + "\n{broken\n"
+    response = client.post("/predict/batch", data=body, content_type="application/x-ndjson")
+    results = response.get_json()["results"]
+    assert "predicted_status" in results[0] and results[1]["error"].startswith("Invalid JSON")
+
+
+def test_predict_batch_rejects_non_list(client, vehicle):
+    assert client.post("/predict/batch", json=vehicle).status_code == 400
+
+
+def test_predict_batch_rejects_oversized_batch(app_module, client, vehicle, monkeypatch):
+    monkeypatch.setattr(app_module, "max_batch_size", 2)
+    assert client.post("/predict/batch", json=[vehicle] * 3).status_code == 413
+
+
+def test_large_batches_stay_on_the_compiled_forest_by_default(app_module, client, vehicle):
+    response = client.post("/predict/batch", json=[{**vehicle, "weight": weight} for weight in range(1500)])
+    assert response.status_code == 200
+    assert app_module.served_model.batch_model is None
+    assert not app_module.served_model._batch_model_requested
@@ -0,0 +1,92 @@
+"""Fitting, encoding and per-thread buffers of the FeatureEncoder."""
+import threading
+
+import numpy as np
+import pytest
+from sklearn.preprocessing import StandardScaler
+
+from feature_encoder import FeatureEncoder, numerical_features, vehicle_types
+
+
+@pytest.fixture(scope="module")
+def numerical(dataset):
+    return dataset[numerical_features].to_numpy(np.float64)
+
+
+@pytest.fixture(scope="module")
+def encoder(numerical):
+    return FeatureEncoder().partial_fit(numerical)
+
+
+def test_partial_fit_in_batches_matches_standard_scaler(numerical):
+    encoder = FeatureEncoder()
+    for batch in np.array_split(numerical, [1, 500, 501, 2200]):
+        encoder.partial_fit(batch)
+    encoder.partial_fit(numerical[:0])  # An empty batch changes nothing
+    scaler = StandardScaler().fit(numerical)
+    assert encoder.samples_seen == len(numerical)
+    assert np.allclose(encoder.mean, scaler.mean_)
+    assert np.allclose(encoder.scale, scaler.scale_)
+    assert np.allclose(encoder.scale_numerical(numerical), scaler.transform(numerical))
+
+
+def test_constant_columns_are_left_unscaled():
+    encoder = FeatureEncoder().partial_fit([[1500, 1800, 0, 200], [1600, 1800, 0, 300]])
+    assert encoder.scale[2] == 1.0 and encoder.scale[1] == 1.0
+
+
+def test_transform_matches_transform_codes(encoder, dataset):
+    records = dataset.head(50).astype({"vehicle_type": str}).to_dict("records")
+    codes = encoder.codes([record["vehicle_type"] for record in records])
+    numerical = dataset.head(50)[numerical_features].to_numpy(np.float64)
+    expected = encoder.transform_codes(codes, numerical)
+    assert np.array_equal(encoder.transform(records), expected)
+    # One-hot columns first, in vehicle_types order, then the scaled numbers
+    assert np.array_equal(expected[:, :len(vehicle_types)].argmax(axis=1), codes)
+    assert np.array_equal(expected[:, :len(vehicle_types)].sum(axis=1), np.ones(50))
+    out = np.empty((50, encoder.n_features))
+    assert encoder.transform(records, out) is out
+
+
+@pytest.mark.parametrize("vehicle_type", ["spaceship", None, 3])
+def test_unknown_vehicle_types_are_rejected(encoder, vehicle, vehicle_type):
+    with pytest.raises(ValueError, match="Unknown vehicle type"):
+        encoder.transform([vehicle, {**vehicle, "vehicle_type": vehicle_type}])
+
+
+def test_wrong_output_shape_is_rejected(encoder, vehicle):
+    with pytest.raises(ValueError, match="Output buffer has shape"):
+        encoder.transform([vehicle], np.empty((2, encoder.n_features)))
+
+
+def test_buffers_are_separate_per_thread(encoder, vehicle):
+    own = encoder.buffer(4)
+    assert np.shares_memory(encoder.buffer(2), own)  # Reused within a thread
+    buffers = {}
+    barrier = threading.Barrier(2)
+
+    def encode(name, weight):
+        out = encoder.transform([{**vehicle, "weight": weight}], encoder.buffer(1))
+        barrier.wait()  # Both threads have encoded before either reads its result
+        buffers[name] = (out, out.copy())
+
+    threads = [threading.Thread(target=encode, args=(name, weight)) for name, weight in [("a", 1000), ("b", 4000)]]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not np.shares_memory(buffers["a"][0], buffers["b"][0])
+    assert not any(np.shares_memory(own, out) for out, _ in buffers.values())
+    assert np.array_equal(buffers["a"][1], encoder.transform([{**vehicle, "weight": 1000}]))
+    assert np.array_equal(buffers["b"][1], encoder.transform([{**vehicle, "weight": 4000}]))
+
+
+def test_round_trips_through_json(encoder, tmp_path, vehicle):
+    path = str(tmp_path / "encoder.json")
+    encoder.save(path)
+    loaded = FeatureEncoder.load(path)
+    assert loaded.feature_names == encoder.feature_names
+    assert np.array_equal(loaded.transform([vehicle]), encoder.transform([vehicle]))
+    encoder.check_feature_names(loaded.feature_names)
+    with pytest.raises(ValueError, match="does not match"):
+        encoder.check_feature_names(list(reversed(loaded.feature_names)))
@@ -0,0 +1,80 @@
+"""Best-fit decreasing assignment and input validation for /optimize/assignments."""
+import pytest
+
+from fleet_optimizer import assign_loads, parse_loads, parse_vehicles
+
+
+def test_loads_go_heaviest_first_to_the_tightest_vehicle():
+    result = assign_loads([("small", 100), ("large", 400), ("medium", 250)],
+                          [("roomy", 1000), ("tight", 420), ("mid", 300)])
+    placement = {item["load_id"]: item["vehicle_id"] for item in result["assignments"]}
+    assert [item["load_id"] for item in result["assignments"]] == ["large", "medium", "small"]
+    # 400 only leaves 20 in "tight"; 250 fits "mid" best; 100 then only fits "roomy"
+    assert placement == {"large": "tight", "medium": "mid", "small": "roomy"}
+    remaining = {item["vehicle_id"]: item["remaining_capacity"] for item in result["vehicles"]}
+    assert remaining == {"roomy": 900, "tight": 20, "mid": 50}
+    assert result["unassigned"] == [] and result["overloaded_vehicles"] == []
+
+
+def test_loads_that_fit_no_vehicle_are_unassigned():
+    result = assign_loads([("a", 500), ("b", 150), ("c", 150)], [("van", 300), ("full", -50)])
+    assert result["unassigned"] == ["a"]
+    assert sorted(item["load_id"] for item in result["assignments"]) == ["b", "c"]
+    assert result["overloaded_vehicles"] == ["full"]
+    assert {item["vehicle_id"]: item["load_ids"] for item in result["vehicles"]}["full"] == []
+
+
+def test_vehicle_capacity_uses_the_overload_rule():
+    # 1000 + 2 x 75 + 100 already on board leaves 250 of 1500
+    assert parse_vehicles([{"id": "van", "weight": 1000, "passenger_count": 2,
+                            "cargo_weight": 100, "max_load_capacity": 1500}]) == [("van", 250)]
+
+
+def test_missing_ids_default_to_positions():
+    assert parse_loads([{"weight": 5}, {"weight": 7}]) == [(0, 5), (1, 7)]
+
+
+@pytest.mark.parametrize("loads, message", [
+    ([{"id": "a", "weight": 1}, {"id": "a", "weight": 2}], "Duplicate load id: a"),
+    ([{"id": 1.5, "weight": 1}], "must be a string or an integer"),
+    ([{"weight": -1}], "must be at least 0"),
+    ([{"weight": "nan"}], "must be a finite number"),
+    ([{"weight": True}], "must be a number"),
+    ([5], "must be an object with a 'weight'"),
+])
+def test_invalid_loads_are_rejected(loads, message):
+    with pytest.raises(ValueError, match=message):
+        parse_loads(loads)
+
+
+def test_duplicate_vehicle_ids_are_rejected():
+    vehicle = {"id": "van", "weight": 1000, "max_load_capacity": 1500}
+    with pytest.raises(ValueError, match="Duplicate vehicle id: van"):
+        parse_vehicles([vehicle, vehicle])
+
+
+def test_endpoint_assigns_loads(client):
+    response = client.post("/optimize/assignments", json={
+        "loads": [{"id": "crate", "weight": 200}],
+        "vehicles": [{"id": "van", "weight": 1000, "max_load_capacity": 1500}]})
+    assert response.status_code == 200
+    assert response.get_json()["assignments"] == [{"load_id": "crate", "vehicle_id": "van"}]
+
+
+@pytest.mark.parametrize("body", [
+    [1, 2],
+    {"loads": {"weight": 1}, "vehicles": []},
+    {"loads": [], "vehicles": "van"},
+    {"loads": [{"id": "a", "weight": 1}, {"id": "a", "weight": 1}], "vehicles": []},
+    {"loads": [{"weight": "heavy"}], "vehicles": []},
+    {"loads": [], "vehicles": [{"weight": 1000}]},
+])
+def test_endpoint_rejects_invalid_input(client, body):
+    response = client.post("/optimize/assignments", json=body)
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+def test_endpoint_rejects_unreadable_bodies(client):
+    response = client.post("/optimize/assignments", data="{", content_type="application/json")
+    assert response.status_code == 400
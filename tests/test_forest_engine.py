@@ -0,0 +1,37 @@
+"""Checks that the compiled forest predicts exactly what the sklearn forest does."""
+import numpy as np
+import pytest
+from sklearn.datasets import make_classification
+from sklearn.ensemble import RandomForestClassifier
+
+import forest_engine
+from forest_engine import compile_forest
+
+
+@pytest.fixture(scope="module")
+def forest():
+    X, y = make_classification(n_samples=2000, n_features=8, n_informative=5, n_classes=3, random_state=0)
+    labels = np.array(["Normal", "Overloaded", "Underloaded"])[y]
+    model = RandomForestClassifier(n_estimators=20, random_state=0).fit(X[:1500], labels[:1500])
+    return model, X[1500:]
+
+
+@pytest.mark.parametrize("rows", [1, 7, forest_engine._block_size, forest_engine._block_size + 1, 500])
+def test_predictions_match_sklearn(forest, rows):
+    model, X = forest
+    engine = compile_forest(model)
+    assert np.array_equal(engine.predict_proba(X[:rows]), model.predict_proba(X[:rows]))
+    assert np.array_equal(engine.predict(X[:rows]), model.predict(X[:rows]))
+
+
+def test_single_row_vector(forest):
+    model, X = forest
+    engine = compile_forest(model)
+    assert np.array_equal(engine.predict(X[0]), model.predict(X[:1]))
+
+
+def test_shallow_trees_stop_early(forest):
+    model, X = forest
+    shallow = RandomForestClassifier(n_estimators=5, max_depth=2, random_state=0).fit(X, model.predict(X))
+    engine = compile_forest(shallow)
+    assert np.array_equal(engine.predict_proba(X), shallow.predict_proba(X))
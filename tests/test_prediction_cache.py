@@ -0,0 +1,80 @@
+"""LRU eviction, expiry, model version invalidation and the shared SQLite store."""
+import time
+
+from prediction_cache import PredictionCache
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = PredictionCache(max_entries=2)
+    cache.put("a", 1, "v1")
+    cache.put("b", 2, "v1")
+    assert cache.get("a", "v1") == 1  # "b" is now the least recently used
+    cache.put("c", 3, "v1")
+    assert cache.get("b", "v1") is None
+    assert cache.get("a", "v1") == 1 and cache.get("c", "v1") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire_after_the_ttl():
+    cache = PredictionCache(ttl_seconds=0.05)
+    cache.put("a", 1, "v1")
+    assert cache.get("a", "v1") == 1
+    time.sleep(0.1)
+    assert cache.get("a", "v1") is None
+    stats = cache.stats()
+    assert stats["expirations"] == 1 and stats["entries"] == 0
+
+
+def test_model_version_change_drops_entries():
+    cache = PredictionCache()
+    cache.put("a", 1, "v1")
+    assert cache.get("a", "v2") is None
+    # The old version's entries are gone, not just hidden
+    assert cache.get("a", "v1") is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_hit_rate_counts_hits_and_misses():
+    cache = PredictionCache()
+    cache.put("a", 1, "v1")
+    cache.get("a", "v1")
+    cache.get("b", "v1")
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+
+def test_shared_store_serves_other_workers(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    writer = PredictionCache(store_path=path)
+    reader = PredictionCache(store_path=path)
+    writer.put("a", {"predicted_status": "Overloaded"}, "v1")
+    assert reader.get("a", "v1") == {"predicted_status": "Overloaded"}
+    assert reader.stats()["shared_hits"] == 1
+    # Copied into the reader's local LRU
+    assert reader.stats()["entries"] == 1
+
+
+def test_shared_store_respects_model_version_and_expiry(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    writer = PredictionCache(ttl_seconds=0.05, store_path=path)
+    writer.put("a", 1, "v1")
+    assert PredictionCache(store_path=path).get("a", "v2") is None
+    time.sleep(0.1)
+    assert PredictionCache(store_path=path).get("a", "v1") is None
+
+
+def test_shared_store_prunes_other_versions_and_excess_rows(tmp_path):
+    cache = PredictionCache(max_entries=2, store_path=str(tmp_path / "cache.sqlite"))
+    cache.put("old", 0, "v1")
+    for key in "abc":
+        cache.put(key, key, "v2")
+    cache._store.prune("v2")
+    rows = cache._store._connection().execute("SELECT key FROM predictions ORDER BY key").fetchall()
+    assert len(rows) == 2 and ("old",) not in rows
+
+
+def test_unusable_store_falls_back_to_local_cache(tmp_path):
+    cache = PredictionCache(store_path=str(tmp_path / "missing" / "cache.sqlite"))
+    assert cache.stats()["shared_store"] is None
+    cache.put("a", 1, "v1")
+    assert cache.get("a", "v1") == 1
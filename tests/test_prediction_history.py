@@ -0,0 +1,136 @@
+"""Streaming chart aggregates, the history log and /charts/<name>.json."""
+import json
+import os
+
+import numpy as np
+import pytest
+
+from prediction_history import ChartAggregates, PredictionHistory, chart_names, rotated_log_path
+
+
+def entry(weight=1500, vehicle_type="4-wheeler 5-seater", **fields):
+    return {"vehicle_type": vehicle_type, "weight": weight, "max_load_capacity": 1800,
+            "passenger_count": 3, "cargo_weight": 200, **fields}
+
+
+def test_aggregates_count_every_entry(dataset):
+    aggregates = ChartAggregates()
+    entries = dataset.astype({"vehicle_type": str}).to_dict("records")
+    aggregates.add(entries[:1000])
+    aggregates.add(entries[1000:])
+    assert aggregates.count == len(entries)
+    counts = aggregates.chart("count_plot")
+    assert dict(zip(counts["labels"], counts["counts"])) == dataset["vehicle_type"].astype(str).value_counts().to_dict()
+    assert sum(aggregates.chart("histogram")["counts"]) == len(entries)
+    matrix = np.array(aggregates.chart("heatmap")["matrix"])
+    expected = np.corrcoef(dataset[["weight", "max_load_capacity", "passenger_count", "cargo_weight"]].to_numpy(float),
+                           rowvar=False)
+    assert np.allclose(matrix, expected, atol=1e-3)
+    stats = aggregates.chart("boxplot")["stats"]
+    assert stats["count"] == len(entries)
+    assert stats["median"] == pytest.approx(dataset["weight"].median(), rel=0.02)
+
+
+@pytest.mark.parametrize("bad", [
+    entry(weight=-1), entry(weight=2e9), entry(weight=float("nan")), entry(weight="heavy"),
+    entry(vehicle_type=None), {"vehicle_type": "4-wheeler 5-seater", "weight": 1500},
+])
+def test_out_of_range_and_malformed_entries_are_skipped(bad):
+    aggregates = ChartAggregates()
+    aggregates.add([entry(), bad])
+    assert aggregates.count == 1
+    assert aggregates.in_range()
+    assert sum(aggregates.chart("histogram")["counts"]) == 1
+
+
+def test_fold_reads_only_new_lines_and_survives_restarts(tmp_path):
+    log_path = str(tmp_path / "predictions.ndjson")
+    history = PredictionHistory(log_path)
+    history.append([entry(), entry(weight=900)])
+    assert history.fold() and history.count() == 2
+    assert not history.fold()
+    history.append([entry()])
+    with open(log_path, "a") as log:
+        log.write('{"not json\n{"vehicle_type": "4-wheeler 5-seater", "weight": 10')  # torn last line
+    assert history.fold() and history.count() == 3
+    history.close()
+    # A new process resumes from the saved offset instead of refolding the log
+    restarted = PredictionHistory(log_path)
+    assert restarted.count() == 3 and restarted.offset == history.offset
+    assert not restarted.fold()
+
+
+def test_saved_state_with_out_of_range_values_is_rebuilt(tmp_path):
+    log_path = str(tmp_path / "predictions.ndjson")
+    history = PredictionHistory(log_path)
+    history.append([entry()])
+    history.fold()
+    with open(history.state_path) as state_file:
+        state = json.load(state_file)
+    state["aggregates"]["histograms"]["weight"]["bins"]["-5"] = 1
+    with open(history.state_path, "w") as state_file:
+        json.dump(state, state_file)
+    restarted = PredictionHistory(log_path)
+    assert restarted.count() == 0 and restarted.offset == 0
+    restarted.fold()
+    assert restarted.count() == 1
+
+
+def test_log_is_rotated_without_losing_chart_counts(tmp_path):
+    log_path = str(tmp_path / "predictions.ndjson")
+    history = PredictionHistory(log_path, max_bytes=2000)
+    rotations = 0
+    for _ in range(10):
+        history.append([entry() for _ in range(5)])
+        rotations += history.log_inode not in (None, os.stat(log_path).st_ino)
+        history.fold()
+    assert rotations > 1 and history.count() == 50
+    assert os.path.getsize(log_path) < 2000 and os.path.getsize(rotated_log_path(log_path)) < 3000
+    history.close()
+    # The saved state points into the current log, so a restart does not count the rotated lines again
+    restarted = PredictionHistory(log_path, max_bytes=2000)
+    assert not restarted.fold() and restarted.count() == 50
+
+
+def test_rotated_lines_written_since_the_last_fold_are_folded(tmp_path):
+    log_path = str(tmp_path / "predictions.ndjson")
+    history = PredictionHistory(log_path, max_bytes=1000)
+    history.append([entry()])
+    history.fold()
+    history.append([entry() for _ in range(8)])  # Rotates before these lines are folded
+    history.append([entry()])
+    assert history.fold() and history.count() == 10
+    history.close()
+
+
+def test_writer_follows_a_rotation_by_another_worker(tmp_path):
+    log_path = str(tmp_path / "predictions.ndjson")
+    rotating = PredictionHistory(log_path, max_bytes=500)
+    other = PredictionHistory(log_path, max_bytes=500)
+    other.append([entry()])
+    rotating.append([entry() for _ in range(5)])  # Crosses the limit and rotates
+    other.append([entry(weight=900)])
+    with open(log_path) as log:
+        assert [json.loads(line)["weight"] for line in log] == [900]
+    rotating.close()
+    other.close()
+
+
+def test_chart_payloads_use_etags(app_module, client, vehicle):
+    client.post("/predict", json=vehicle)
+    app_module.history.fold()
+    response = client.get("/charts/count_plot.json")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert json.loads(response.data)["column"] == "vehicle_type"
+    assert client.get("/charts/count_plot.json", headers={"If-None-Match": etag}).status_code == 304
+    client.post("/predict", json=vehicle)
+    app_module.history.fold()
+    response = client.get("/charts/count_plot.json", headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.headers["ETag"] != etag
+
+
+def test_every_chart_is_served_and_unknown_names_are_not(app_module, client):
+    for name in chart_names:
+        assert client.get(f"/charts/{name}.json").status_code == 200
+    assert client.get("/charts/bubble.json").status_code == 404
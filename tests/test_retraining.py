@@ -0,0 +1,168 @@
+"""Drift detection, background retraining and bundle hot swap."""
+import json
+import os
+import time
+
+import numpy as np
+import pytest
+
+from feature_encoder import FeatureEncoder, numerical_features
+from generate_dataset import generate_chunk
+from model_bundle import current_version, load_bundle, save_bundle
+from retraining import BundleWatcher, DriftMonitor, RetrainJob, export_training_data, history_tail
+
+fast_training = ("--n-jobs", "1", "--n-estimators", "10", "--max-depth", "8")
+
+
+def history_entries(rows, seed, **shift):
+    """Generated vehicles as app.py logs them, with the formula's (double-counting) overload_status."""
+    df = generate_chunk(rows, np.random.default_rng(seed))
+    entries = []
+    for record in df.astype({"vehicle_type": str}).to_dict("records"):
+        entry = {"vehicle_type": record["vehicle_type"],
+                 **{column: int(record[column]) + shift.get(column, 0) for column in numerical_features}}
+        formula_load = entry["weight"] + entry["passenger_count"] * 75 + entry["cargo_weight"]
+        entry["overload_status"] = "Overloaded" if formula_load > entry["max_load_capacity"] else "Not Overloaded"
+        entry["predicted_status"] = record["overload_status"]
+        entries.append(entry)
+    return entries
+
+
+def write_history(path, entries):
+    with open(path, "w") as log:
+        log.writelines(json.dumps(entry) + "\n" for entry in entries)
+
+
+@pytest.fixture(scope="module")
+def encoder(dataset):
+    return FeatureEncoder().partial_fit(dataset[numerical_features].to_numpy(np.float64))
+
+
+def test_generator_traffic_does_not_drift(encoder):
+    reports = []
+    # The formula disagrees with most of this traffic's labels far above the reference rate; that alone is not drift
+    monitor = DriftMonitor(encoder, reference_disagreement=0.0, window=2000, on_drift=reports.append)
+    monitor.observe(history_entries(2000, seed=1))
+    assert reports == []
+    report = monitor.stats()["last_report"]
+    assert not report["drifted"] and report["drifted_features"] == []
+    assert report["disagreement"] > 0.1 and report["reference_disagreement"] == 0.0
+
+
+def test_shifted_features_drift(encoder):
+    reports = []
+    monitor = DriftMonitor(encoder, window=1000, on_drift=reports.append)
+    entries = history_entries(1000, seed=2, weight=20000)
+    monitor.observe(entries[:600])
+    assert reports == [] and monitor.stats()["rows_in_window"] == 600
+    monitor.observe(entries[600:])
+    assert len(reports) == 1 and reports[0]["drifted_features"] == ["weight"]
+    assert reports[0]["features"]["weight"]["mean_shift"] > 0.5
+    stats = monitor.stats()
+    assert (stats["windows_checked"], stats["drifted_windows"], stats["rows_in_window"]) == (1, 1, 0)
+
+
+def test_reset_drops_the_current_window(encoder):
+    monitor = DriftMonitor(encoder, window=1000)
+    monitor.observe(history_entries(500, seed=3))
+    monitor.reset(encoder, 0.1)
+    stats = monitor.stats()
+    assert stats["rows_in_window"] == 0 and stats["reference_disagreement"] == 0.1
+
+
+def test_export_labels_rows_like_the_generator(tmp_path):
+    entries = history_entries(500, seed=4)
+    write_history(tmp_path / "history.ndjson", entries)
+    counts = export_training_data(str(tmp_path / "history.ndjson"), str(tmp_path / "train.csv"), 1000,
+                                  str(tmp_path / "holdout.csv"))
+    expected = {}
+    for entry in entries:
+        label = "Overloaded" if entry["weight"] > entry["max_load_capacity"] else "Not Overloaded"
+        expected[label] = expected.get(label, 0) + 1
+    with open(tmp_path / "holdout.csv") as holdout:
+        held_out = [line.rstrip("\n").rsplit(",", 1)[1] for line in holdout][1:]
+    assert len(held_out) == 100
+    for label in held_out:
+        expected[label] -= 1
+    assert counts == expected
+
+
+def test_history_tail_reaches_into_the_rotated_log(tmp_path):
+    log_path = tmp_path / "history.ndjson"
+    (tmp_path / "history.ndjson.1").write_text("".join(f"{n}\n" for n in range(5)))
+    log_path.write_text("5\n6\n")
+    assert history_tail(str(log_path), 4) == [b"3", b"4", b"5", b"6"]
+    assert history_tail(str(log_path), 1) == [b"6"]
+
+
+def test_retrain_publishes_then_rejects_an_identical_candidate(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_history("history.ndjson", history_entries(3000, seed=5))
+    job = RetrainJob("history.ndjson", work_dir="retrain", min_rows=1000, train_args=fast_training)
+    job._run("test")
+    result = job.stats()["last_result"]
+    assert result["status"] == "published", result
+    assert current_version() == result["bundle_version"]
+    assert os.path.exists("vehicle_load_model.pkl") and os.path.exists("vehicle_load_encoder.json")
+    assert not os.path.exists(os.path.join("retrain", "retrain.lock"))
+    # The same history trains the same candidate, which is not published again
+    job._run("test again")
+    result = job.stats()["last_result"]
+    assert result["status"] == "rejected" and result["detail"] == "identical to the current model"
+    assert job.stats()["runs"] == 2 and job.stats()["failures"] == 0
+    # Both runs started the cooldown
+    assert not job.start("too soon")
+
+
+def test_retrain_skips_short_histories_without_a_cooldown(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_history("history.ndjson", history_entries(100, seed=6))
+    job = RetrainJob("history.ndjson", work_dir="retrain", min_rows=1000, train_args=fast_training)
+    job._run("test")
+    assert job.stats()["last_result"]["status"] == "skipped"
+    assert not os.path.exists(os.path.join("retrain", "last_retrain"))
+    assert current_version() is None
+
+
+def test_host_lock_allows_one_retrain_and_expires(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    job = RetrainJob("history.ndjson", work_dir="retrain", timeout_seconds=60)
+    os.makedirs("retrain")
+    lock_path = os.path.join("retrain", "retrain.lock")
+    with open(lock_path, "w") as lock:
+        lock.write("12345")
+    job._run("locked")
+    assert job.stats()["runs"] == 0
+    # A lock older than twice the timeout was left by a dead worker and is taken over
+    stale = time.time() - 600
+    os.utime(lock_path, (stale, stale))
+    job._run("stale lock")
+    assert job.stats()["last_result"]["status"] == "skipped"  # No history to export
+    assert not os.path.exists(lock_path)
+
+
+def test_bundle_watcher_swaps_new_versions_and_skips_failed_ones(trained_dir, tmp_path):
+    engine, manifest = load_bundle(str(trained_dir / "model_bundle"), mmap=False)
+    encoder = FeatureEncoder.from_dict(manifest["encoder"])
+    directory = str(tmp_path / "model_bundle")
+    first = save_bundle(engine, encoder, directory, formula_disagreement=0.1)
+    swapped = []
+    failing = set()
+
+    def on_change(version):
+        if version in failing:
+            raise ValueError("corrupt bundle")
+        swapped.append(version)
+
+    watcher = BundleWatcher(on_change, loaded_version=first, directory=directory)
+    assert not watcher.check()
+    second = save_bundle(engine, encoder, directory, formula_disagreement=0.2)
+    assert watcher.check() and swapped == [second] and watcher.loaded_version == second
+    assert not watcher.check()
+    third = save_bundle(engine, encoder, directory, formula_disagreement=0.3)
+    failing.add(third)
+    assert not watcher.check() and watcher.loaded_version == second
+    failing.clear()
+    # A version that failed to load is not retried until a newer one is published
+    assert not watcher.check() and swapped == [second]
+    assert watcher.swaps == 1
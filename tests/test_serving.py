@@ -0,0 +1,94 @@
+"""Batching, backpressure and error propagation in the MicroBatcher."""
+import threading
+
+import pytest
+
+from serving import MicroBatcher, QueueFullError
+
+
+def test_concurrent_requests_share_a_batch():
+    sizes = []
+    release = threading.Event()
+
+    def score_batch(items):
+        sizes.append(len(items))
+        release.wait(5)
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(score_batch, max_batch_size=8, max_wait_ms=1.0, workers=1)
+    try:
+        # The first batch holds the only scoring thread, so the rest queue up behind it
+        first = batcher.submit(0)
+        futures = [batcher.submit(item) for item in range(1, 6)]
+        release.set()
+        assert first.result(5) == 0
+        assert [future.result(5) for future in futures] == [2, 4, 6, 8, 10]
+        assert sum(sizes) == 6 and max(sizes) > 1
+        stats = batcher.stats()
+        assert stats["items"] == 6 and stats["batches"] == len(sizes)
+    finally:
+        batcher.close()
+
+
+def test_requests_from_many_threads_all_resolve():
+    batcher = MicroBatcher(lambda items: [item + 1 for item in items], max_batch_size=16)
+    results = {}
+
+    def request(item):
+        results[item] = batcher.submit(item).result(5)
+
+    threads = [threading.Thread(target=request, args=(item,)) for item in range(50)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        batcher.close()
+    assert results == {item: item + 1 for item in range(50)}
+
+
+def test_full_queue_rejects_new_requests():
+    release = threading.Event()
+
+    def score_batch(items):
+        release.wait(5)
+        return items
+
+    batcher = MicroBatcher(score_batch, max_batch_size=1, max_wait_ms=0.0, max_queue_size=1, workers=1)
+    accepted = []
+    try:
+        with pytest.raises(QueueFullError):
+            # One batch scoring, one held by the dispatcher, one queued; a later one must bounce
+            for item in range(10):
+                accepted.append(batcher.submit(item))
+                threading.Event().wait(0.05)
+        assert batcher.stats()["rejected"] == 1
+        release.set()
+        assert [future.result(5) for future in accepted] == list(range(len(accepted)))
+    finally:
+        release.set()
+        batcher.close()
+
+
+def test_scoring_errors_reach_every_caller():
+    def score_batch(items):
+        raise RuntimeError("model unavailable")
+
+    batcher = MicroBatcher(score_batch, max_wait_ms=5.0)
+    try:
+        futures = [batcher.submit(item) for item in range(3)]
+        for future in futures:
+            with pytest.raises(RuntimeError, match="model unavailable"):
+                future.result(5)
+        assert batcher.stats()["batches"] == 0
+    finally:
+        batcher.close()
+
+
+def test_closed_batcher_rejects_requests():
+    batcher = MicroBatcher(lambda items: items)
+    assert batcher.submit(1).result(5) == 1
+    batcher.close()
+    with pytest.raises(QueueFullError):
+        batcher.submit(2)
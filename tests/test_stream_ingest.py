@@ -0,0 +1,89 @@
+"""Line handling, batching and framing of /predict/stream."""
+import io
+import json
+
+from stream_ingest import format_ndjson, format_sse, score_stream
+
+
+def run(body, score_batch=None, **options):
+    score_batch = score_batch or (lambda records: [{"seen": record} for record in records])
+    return list(score_stream(io.BytesIO(body), score_batch, **options))
+
+
+def verdicts(events):
+    return [verdict for event, payload in events if event == "verdicts" for verdict in payload]
+
+
+def test_every_line_gets_a_verdict_in_order():
+    body = b"".join(json.dumps({"n": n}).encode() + b"\n" for n in range(10)) + b"\n  \n"
+    events = run(body, batch_size=4)
+    assert [verdict["index"] for verdict in verdicts(events)] == list(range(10))
+    assert [verdict["seen"]["n"] for verdict in verdicts(events)] == list(range(10))
+    assert max(len(payload) for event, payload in events if event == "verdicts") <= 4
+    assert events[-1] == ("end", {"count": 10, "error_count": 0})
+
+
+def test_a_last_line_without_newline_is_scored():
+    assert verdicts(run(b'{"n": 1}\n{"n": 2}'))[-1]["seen"] == {"n": 2}
+
+
+def test_over_long_lines_are_rejected_without_stopping_the_stream():
+    body = b'{"n": 1}\n' + b'{"pad": "' + b"x" * 100 + b'"}\n' + b'{"n": 3}\n'
+    results = verdicts(run(body, max_line_bytes=64))
+    assert results[0]["seen"] == {"n": 1}
+    assert results[1] == {"index": 1, "error": "Line exceeds 64 bytes"}
+    assert results[2]["seen"] == {"n": 3}
+
+
+def test_invalid_json_is_a_per_line_error():
+    events = run(b'{"n": 1}\n{not json}\n\xff\xfe\n{"n": 4}\n')
+    results = verdicts(events)
+    assert [("error" in verdict) for verdict in results] == [False, True, True, False]
+    assert results[1]["error"].startswith("Invalid JSON")
+    assert events[-1][1] == {"count": 4, "error_count": 2}
+
+
+def test_scoring_failure_fails_only_that_batch():
+    def score_batch(records):
+        if any(record.get("boom") for record in records):
+            raise RuntimeError("model error")
+        return [{"ok": True} for _ in records]
+
+    body = b'{"boom": true}\n'
+    results = verdicts(run(body, score_batch))
+    assert results == [{"index": 0, "error": "An error occurred during prediction."}]
+
+
+def test_formatters_frame_events():
+    payload = [{"index": 0, "predicted_status": "Overloaded"}, {"index": 1, "error": "bad"}]
+    assert format_ndjson("verdicts", payload).splitlines() == [json.dumps(verdict) for verdict in payload]
+    assert format_ndjson("heartbeat", None) == ""
+    assert json.loads(format_ndjson("end", {"count": 2, "error_count": 1})) == {"done": True, "count": 2, "error_count": 1}
+    sse = format_sse("verdicts", payload)
+    assert sse.split("\n\n")[:2] == [f"id: 0\nevent: verdict\ndata: {json.dumps(payload[0])}",
+                                     f"id: 1\nevent: verdict\ndata: {json.dumps(payload[1])}"]
+    assert format_sse("heartbeat", None) == ": keep-alive\n\n"
+    assert format_sse("end", {"count": 2}) == 'event: end\ndata: {"count": 2}\n\n'
+
+
+def test_endpoint_streams_ndjson_with_per_record_errors(client, vehicle):
+    body = "\n".join([json.dumps(vehicle), "[1, 2]", "42", json.dumps({**vehicle, "vehicle_type": "boat"}), "{"]) + "\n"
+    response = client.post("/predict/stream", data=body, content_type="application/x-ndjson")
+    assert response.status_code == 200 and response.mimetype == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert lines[0]["predicted_status"] == client.post("/predict", json=vehicle).get_json()["predicted_status"]
+    assert [line["error"] for line in lines[1:3]] == ["Record must be a JSON object"] * 2
+    assert lines[3]["error"] == "Unknown vehicle type: boat"
+    assert lines[4]["error"].startswith("Invalid JSON")
+    assert lines[-1] == {"done": True, "count": 5, "error_count": 4}
+
+
+def test_endpoint_streams_server_sent_events(client, vehicle):
+    response = client.post("/predict/stream", data=json.dumps(vehicle) + "\n",
+                           content_type="application/x-ndjson", headers={"Accept": "text/event-stream"})
+    assert response.mimetype == "text/event-stream"
+    frames = response.get_data(as_text=True).split("\n\n")
+    assert frames[0].startswith("id: 0\nevent: verdict\ndata: {")
+    assert "predicted_status" in json.loads(frames[0].split("data: ", 1)[1])
+    assert frames[1] == 'event: end\ndata: {"count": 1, "error_count": 0}'
+    assert frames[2] == ""
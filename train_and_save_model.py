@@ -1,96 +1,308 @@
 # Import necessary libraries for data manipulation, machine learning, and serialization
-import pandas as pd  # Data manipulation and analysis library
+import argparse  # Command line options
+import json  # Writing the training report
+import os  # Operating system interactions for file and path operations
 import pickle  # Object serialization for saving models
+import sys  # Platform checks for memory reporting
+import time  # Stage timing
+import tracemalloc  # Optional per-stage peak memory tracing
+from contextlib import contextmanager  # Stage timer context manager
+import numpy as np  # Numerical computing library
+import pandas as pd  # Data manipulation and analysis library
 from sklearn.model_selection import train_test_split  # Splitting data into training and testing sets
-from sklearn.ensemble import RandomForestClassifier  # Random Forest machine learning algorithm
+from sklearn.ensemble import RandomForestClassifier, HistGradientBoostingClassifier  # Tree ensemble algorithms
+from sklearn.linear_model import SGDClassifier  # Incremental learner for data that does not fit in memory
 from sklearn.metrics import classification_report, confusion_matrix  # Model performance evaluation metrics
-from sklearn.preprocessing import StandardScaler  # Feature scaling utility
-import os  # Operating system interactions for file and path operations
+from feature_encoder import FeatureEncoder, encoder_filename, numerical_features  # Encoder shared with the app
+from forest_engine import compile_forest  # Array-based inference engine for the trained forest
+from model_bundle import save_bundle, clear_current_version, file_sha256  # Versioned, memory-mappable model artifacts
+from load_rules import OverloadRuleModel  # The overload formula, for the drift reference rate
+
+try:
+    import resource  # Process peak memory (not available on Windows)
+except ImportError:
+    resource = None
 
 # Define the filename for the dataset to be used for training
 dataset_filename = "vehicle_data.csv"
+# Define the filename for saving the model (the encoder is saved as encoder_filename)
+model_filename = "vehicle_load_model.pkl"
 
-# Check if the dataset file exists before proceeding
-if not os.path.exists(dataset_filename):
-    # Print error message if dataset is missing
-    print(f"Error: Dataset file '{dataset_filename}' not found. Run generate_dataset.py first.")
-    # Exit the script if dataset is not found
-    exit()
+# Columns read from the dataset (everything else, e.g. precomputed *_scaled columns, is skipped)
+one_hot_columns = FeatureEncoder().one_hot_columns
+target_column = "overload_status"
+# Explicit dtypes so pandas does not have to infer them chunk by chunk
+column_dtypes = {**{col: "bool" for col in one_hot_columns}, **{col: "float64" for col in numerical_features},
+                 target_column: "category"}
 
-try:
-    # Attempt to load the dataset from CSV
-    df = pd.read_csv(dataset_filename)
-    # Print confirmation message upon successful loading
-    print(f"Dataset '{dataset_filename}' loaded.")
-except Exception as e:
-    # Print error message if dataset loading fails
-    print(f"Error loading dataset: {e}")
-    # Exit the script if loading fails
-    exit()
-
-# Separate features (X) and target variable (y)
-X = df.drop("overload_status", axis=1)  # All columns except target
-y = df["overload_status"]  # Target variable
-
-# Print columns before scaling for verification
-print("Columns before scaling:", X.columns)
-
-# Note: One-hot encoding is commented out, likely already done in previous preprocessing
-# Uncomment if vehicle_type needs to be one-hot encoded
-#X = pd.get_dummies(X, columns=["vehicle_type"])
-
-# Define numerical features to be scaled
-numerical_features = ['weight', 'max_load_capacity', 'passenger_count', 'cargo_weight']
-# Initialize StandardScaler for feature normalization
-scaler = StandardScaler()
-# Apply scaling to numerical features
-X[numerical_features] = scaler.fit_transform(X[numerical_features])
-
-# Remove original numerical columns after scaling to prevent duplicate information
-X.drop(numerical_features, axis=1, inplace=True)
-
-# Create a list of columns to be used for training
-X_train_cols = X.columns.tolist()
-
-# Print training columns for verification
-print("X_train_cols:", X_train_cols)
-
-# Split data into training and testing sets
-# 80% training, 20% testing, with a fixed random state for reproducibility
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-
-# Initialize Random Forest Classifier
-# Random state ensures reproducibility of results
-model = RandomForestClassifier(random_state=42)
-# Train the model on the training data
-model.fit(X_train, y_train)
-
-# Make predictions on the test set
-y_pred = model.predict(X_test)
-
-# Print detailed classification report
-# Shows precision, recall, f1-score for each class
-print(classification_report(y_test, y_pred))
-
-# Print confusion matrix
-# Shows correct and incorrect predictions for each class
-print(confusion_matrix(y_test, y_pred))
-
-# Define filenames for saving the model and scaler
-model_filename = "vehicle_load_model.pkl"
-scaler_filename = "vehicle_load_scaler.pkl"
+class_labels = np.array(["Not Overloaded", "Overloaded"])
+
+# Learners that need the whole training set in memory, and the ones trained chunk by chunk
+in_memory_models = ["random-forest", "hist-gradient-boosting"]
+incremental_models = ["sgd"]
+
+
+class StageReport:
+    """Records the wall time and peak memory of each training stage."""
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.stages = []
+        if trace_memory:
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name):
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        yield
+        record = {"stage": name, "seconds": round(time.perf_counter() - start, 3), "max_rss_mb": max_rss_mb()}
+        if self.trace_memory:
+            record["peak_traced_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 1)
+        self.stages.append(record)
+        # Print the stage summary as it finishes
+        print(", ".join(f"{key}={value}" for key, value in record.items()))
+
+    def write(self, path, **details):
+        with open(path, "w") as report_file:
+            json.dump({"stages": self.stages, **details}, report_file, indent=2)
+        print(f"Training report saved to '{path}'.")
+
+
+def max_rss_mb():
+    """Peak resident memory of this process so far, in MB (None where unsupported)."""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return round(max_rss / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+def iter_chunks(path, chunksize=None):
+    """Yields the projected dataset columns as DataFrames (one DataFrame for the whole file when chunksize is None)."""
+    columns = one_hot_columns + numerical_features + [target_column]
+    if path.endswith(".parquet"):
+        # Import lazily: pyarrow is only needed for Parquet datasets
+        import pyarrow.parquet as pq
+        if chunksize is None:
+            yield pq.read_table(path, columns=columns).to_pandas().astype(column_dtypes)
+        else:
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+                yield batch.to_pandas().astype(column_dtypes)
+    elif chunksize is None:
+        yield pd.read_csv(path, usecols=columns, dtype=column_dtypes)
+    else:
+        yield from pd.read_csv(path, usecols=columns, dtype=column_dtypes, chunksize=chunksize)
+
+
+def split_chunk(chunk):
+    """Splits a dataset chunk into vehicle type codes, raw numerical features and labels."""
+    one_hot = chunk[one_hot_columns].to_numpy()
+    # Every row needs exactly one vehicle type, otherwise its code would be ambiguous
+    if not (one_hot.sum(axis=1) == 1).all():
+        raise ValueError("Every row must have exactly one vehicle_type_* column set")
+    return one_hot.argmax(axis=1), chunk[numerical_features].to_numpy(np.float64), chunk[target_column].to_numpy(str)
+
+
+def build_features(codes, numerical, encoder):
+    """Assembles the model's feature matrix (one-hot columns, scaled numerical features) as float32.
+
+    The encoder scales in float64 before the cast, exactly as it does in the app,
+    followed by sklearn's own float32 conversion, so the compiled forest sees the same inputs.
+    """
+    return encoder.transform_codes(codes, numerical).astype(np.float32)
+
+
+def build_model(args):
+    """Creates the learner selected on the command line."""
+    if args.model == "random-forest":
+        # Random state ensures reproducibility of results; n_jobs=-1 trains trees on all cores
+        return RandomForestClassifier(n_estimators=args.n_estimators, max_depth=args.max_depth,
+                                      n_jobs=args.n_jobs, random_state=42)
+    if args.model == "hist-gradient-boosting":
+        # Histogram-based boosting bins features, so it handles millions of rows in modest memory
+        return HistGradientBoostingClassifier(max_depth=args.max_depth, random_state=42)
+    # Linear model trained with partial_fit, one chunk at a time
+    return SGDClassifier(loss="log_loss", random_state=42)
+
+
+def load_features(args, report):
+    """Loads the projected dataset chunk by chunk and encodes it.
+
+    Returns the float32 feature matrix, the labels and the fitted encoder.
+    """
+    encoder = FeatureEncoder()
+    code_parts, numerical_parts, label_parts = [], [], []
+    with report.stage("load"):
+        for chunk in iter_chunks(args.data, args.chunksize):
+            codes, numerical, labels = split_chunk(chunk)
+            # Fit the encoder's scaling incrementally while loading
+            encoder.partial_fit(numerical)
+            code_parts.append(codes)
+            numerical_parts.append(numerical)
+            label_parts.append(labels)
+        y = np.concatenate(label_parts)
+        codes = np.concatenate(code_parts)
+        numerical = np.concatenate(numerical_parts)
+        del code_parts, numerical_parts, label_parts
+    print(f"Dataset '{args.data}' loaded: {len(y)} rows.")
+
+    with report.stage("encode"):
+        X = build_features(codes, numerical, encoder)
+        del codes, numerical
+    return X, y, encoder
+
+
+def train_in_memory(args, report):
+    """Loads the whole projected dataset, then fits the model on all of it at once."""
+    X, y, encoder = load_features(args, report)
+
+    # Split data into training and testing sets
+    # 80% training, 20% testing, with a fixed random state for reproducibility
+    with report.stage("split"):
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=args.test_size, random_state=42)
+        del X
+
+    model = build_model(args)
+    with report.stage("fit"):
+        model.fit(X_train, y_train)
+    return model, encoder, X_test, y_test
+
+
+def train_incremental(args, report):
+    """Trains chunk by chunk in two passes over the dataset, so memory stays bounded by the chunk size."""
+    chunksize = args.chunksize or 100_000
+    # First pass: fit the encoder's scaling incrementally
+    encoder = FeatureEncoder()
+    rows = 0
+    with report.stage("fit_encoder"):
+        for chunk in iter_chunks(args.data, chunksize):
+            encoder.partial_fit(chunk[numerical_features].to_numpy(np.float64))
+            rows += len(chunk)
+    print(f"Dataset '{args.data}' scanned: {rows} rows.")
+
+    # Second pass: hold out a random test sample and feed the rest to the model
+    model = build_model(args)
+    rng = np.random.default_rng(42)
+    test_parts, test_labels = [], []
+    test_rows = 0
+    with report.stage("fit"):
+        for chunk in iter_chunks(args.data, chunksize):
+            codes, numerical, labels = split_chunk(chunk)
+            X = build_features(codes, numerical, encoder)
+            is_test = rng.random(len(X)) < args.test_size
+            # Keep at most max_test_rows held-out rows in memory
+            if test_rows < args.max_test_rows and is_test.any():
+                keep = np.flatnonzero(is_test)[:args.max_test_rows - test_rows]
+                test_parts.append(X[keep])
+                test_labels.append(labels[keep])
+                test_rows += len(keep)
+            if not is_test.all():
+                model.partial_fit(X[~is_test], labels[~is_test], classes=class_labels)
+    X_test = np.concatenate(test_parts)
+    y_test = np.concatenate(test_labels)
+    return model, encoder, X_test, y_test
+
+
+def save_artifacts(model, encoder, X_test):
+    """Saves the pickles and, for random forests, publishes the compiled model bundle."""
+    # Save the trained model using pickle
+    with open(model_filename, "wb") as file:
+        pickle.dump(model, file)
+
+    # Save the encoder the app uses to build the model's features
+    encoder.save(encoder_filename)
+
+    # Print confirmation messages for model and encoder saving
+    print(f"Model saved to '{model_filename}'.")
+    print(f"Encoder saved to '{encoder_filename}'.")
+
+    if not isinstance(model, RandomForestClassifier):
+        # Only forests can be compiled; make sure the server does not keep serving a stale bundle
+        clear_current_version()
+        print("Model bundle cleared; the server will use the pickled model.")
+        return None
+
+    # Compile the forest into compact NumPy arrays for fast in-process inference
+    compiled_model = compile_forest(model)
+
+    # Only publish the compiled model bundle if it reproduces the sklearn predictions exactly on the test split
+    predictions = compiled_model.predict(X_test)
+    if np.array_equal(predictions, model.predict(X_test)):
+        # Reported next to the live rate by the server's drift monitor (informational: this split may be SMOTE-balanced)
+        formula_disagreement = float((predictions != OverloadRuleModel(encoder).predict(X_test)).mean())
+        # The digest lets servers hand large batches to this exact pickled forest
+        bundle_version = save_bundle(compiled_model, encoder, formula_disagreement=round(formula_disagreement, 5),
+                                     sklearn_model_sha256=file_sha256(model_filename))
+        print(f"Model bundle version '{bundle_version}' saved and made current.")
+        return bundle_version
+    print("Warning: compiled model predictions differ from the sklearn model; model bundle not saved.")
+    # Make sure the server does not keep serving a stale bundle; it falls back to the pickles
+    clear_current_version()
+    return None
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train the vehicle load model and save its artifacts.")
+    parser.add_argument("--data", default=dataset_filename, help="Training dataset (.csv or .parquet)")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="Rows read per chunk (default: whole file at once; 100000 for incremental models)")
+    parser.add_argument("--model", choices=in_memory_models + incremental_models, default="random-forest",
+                        help="Learner; use 'sgd' when the dataset does not fit in memory")
+    parser.add_argument("--n-estimators", type=int, default=100, help="Trees in the random forest")
+    parser.add_argument("--max-depth", type=int, default=None, help="Maximum tree depth")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="CPU cores used for training (-1: all)")
+    parser.add_argument("--test-size", type=float, default=0.2, help="Fraction of rows held out for evaluation")
+    parser.add_argument("--max-test-rows", type=int, default=200_000,
+                        help="Held-out rows kept in memory by incremental training")
+    parser.add_argument("--report", default=None, help="Write per-stage timings and peak memory to this JSON file")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Also trace the peak Python/NumPy allocation of each stage (slower)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    # Check if the dataset file exists before proceeding
+    if not os.path.exists(args.data):
+        # Print error message if dataset is missing
+        print(f"Error: Dataset file '{args.data}' not found. Run generate_dataset.py first.")
+        # Exit the script if dataset is not found
+        sys.exit(1)
+
+    report = StageReport(trace_memory=args.trace_memory)
+    try:
+        if args.model in incremental_models:
+            model, encoder, X_test, y_test = train_incremental(args, report)
+        else:
+            model, encoder, X_test, y_test = train_in_memory(args, report)
+    except (OSError, ValueError, KeyError) as e:
+        # Print error message if the dataset cannot be loaded or training fails
+        print(f"Error during training: {e}")
+        sys.exit(1)
+
+    with report.stage("evaluate"):
+        # Make predictions on the test set
+        y_pred = model.predict(X_test)
+    # Print detailed classification report
+    # Shows precision, recall, f1-score for each class
+    print(classification_report(y_test, y_pred))
+    # Print confusion matrix
+    # Shows correct and incorrect predictions for each class
+    print(confusion_matrix(y_test, y_pred))
+
+    with report.stage("save"):
+        bundle_version = save_artifacts(model, encoder, X_test)
 
-# Save the trained model using pickle
-with open(model_filename, "wb") as file:
-    pickle.dump(model, file)
+    if args.report:
+        report.write(args.report, model=args.model, data=args.data, test_rows=len(y_test),
+                     accuracy=float(np.mean(y_pred == y_test)), bundle_version=bundle_version)
 
-# Save the scaler used for feature scaling
-with open(scaler_filename, "wb") as file:
-    pickle.dump(scaler, file)
+    # Print final completion message
+    print("Training complete.")
 
-# Print confirmation messages for model and scaler saving
-print(f"Model saved to '{model_filename}'.")
-print(f"Scaler saved to '{scaler_filename}'.")
 
-# Print final completion message
-print("Training complete.")
\ No newline at end of file
+if __name__ == "__main__":
+    main()